@@ -4,20 +4,71 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
 
+# Python engine (scriptscope package) used by default; SCRIPTSCOPE_ENGINE=shell
+# falls back to the original modules/monitor.sh.
+ENGINE="${SCRIPTSCOPE_ENGINE:-python}"
+if ! command -v python3 >/dev/null 2>&1; then
+  ENGINE="shell"
+fi
+export SCRIPTSCOPE_ENGINE="$ENGINE"
+export PYTHONPATH="$PROJECT_ROOT${PYTHONPATH:+:$PYTHONPATH}"
+
+PID_FILE="$PROJECT_ROOT/scriptscope.pid"
+
+# Start the monitor daemon in the background unless one is already running, so
+# ui, alert and export all read the snapshots of a single sampling loop.
+ensure_daemon() {
+  [[ "$ENGINE" == "python" ]] || return 0
+  if [[ -f "$PID_FILE" ]] && kill -0 "$(cat "$PID_FILE")" 2>/dev/null; then
+    return 0
+  fi
+  nohup python3 -m scriptscope daemon >/dev/null 2>&1 &
+  # Give the first snapshot time to be published.
+  for _ in 1 2 3 4 5 6 7 8 9 10; do
+    [[ -f "$PID_FILE" ]] && break
+    sleep 0.1
+  done
+}
+
 case "$1" in
   monitor)
-    "$PROJECT_ROOT/modules/monitor.sh"
+    if [[ "$ENGINE" == "python" ]]; then
+      python3 -m scriptscope monitor "${@:2}"
+    else
+      "$PROJECT_ROOT/modules/monitor.sh"
+    fi
+    ;;
+  daemon)
+    if [[ "$ENGINE" != "python" ]]; then
+      echo "The daemon requires python3" >&2
+      exit 1
+    fi
+    exec python3 -m scriptscope daemon "${@:2}"
+    ;;
+  launch)
+    exec python3 -m scriptscope launch "${@:2}"
     ;;
   ui)
+    ensure_daemon
     "$PROJECT_ROOT/modules/ui.sh"
     ;;
   alert)
+    ensure_daemon
     "$PROJECT_ROOT/modules/alert.sh"
     ;;
   export)
-    "$PROJECT_ROOT/modules/exporter.sh"
+    ensure_daemon
+    "$PROJECT_ROOT/modules/exporter.sh" "${@:2}"
+    ;;
+  replay|analyze)
+    # Recordings are read by the python engine; no daemon is needed.
+    if [[ "$ENGINE" != "python" ]]; then
+      echo "$1 requires python3" >&2
+      exit 1
+    fi
+    exec python3 -m scriptscope "$@"
     ;;
   *)
-    echo "Usage: $0 {monitor|ui|alert|export}"
+    echo "Usage: $0 {monitor|daemon|launch|ui|alert|export|replay <file>|analyze <file>...}"
     ;;
 esac
@@ -0,0 +1,385 @@
+"""
+===========================================================================================
+ScriptScope GUI charts
+-------------------------------------------------------------------------------------------
+Live line charts for the "CPU Usage" and "RAM Usage" panels: one series per script over
+the last hour, fed with every snapshot and backfilled from the history rollups.
+
+Samples are not kept. Each series folds them into min/max buckets one pixel column wide
+(min/max decimation), so memory and drawing cost depend on the width of the panel, not
+on the number of samples or the sampling rate. A column is drawn as a vertical segment
+from its min to its max, joined to its neighbour, which keeps every spike visible.
+
+Drawing is incremental. The grid and labels are rendered once into a cached background
+pixmap, the series into a second, transparent pixmap. When time advances, that pixmap is
+scrolled left and only the new columns (and the still-open last one) are painted, so a
+tick costs a few segments per series. paintEvent only blits the two pixmaps. Everything
+is redrawn when the scale changes, the panel is resized or a series is shown or hidden.
+===========================================================================================
+"""
+
+import math
+import zlib
+from array import array
+
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPixmap, QPolygonF
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+WINDOW_SECONDS = 3600.0
+# Check whether the scale can shrink every that many updates.
+RESCALE_EVERY = 60
+LEFT_MARGIN = 34
+BOTTOM_MARGIN = 16
+GRID_LINES = 4
+
+PALETTE = (
+    "#4e9af1", "#f18f4e", "#5cc98a", "#e05d6f", "#b98cf0", "#e6c84f",
+    "#4fd1d9", "#f07ab8", "#9ab04e", "#d98f6a", "#7d8cf0", "#c9c9c9",
+)
+GRID_COLOR = "#2c3440"
+LABEL_COLOR = "#919ead"
+
+_NICE_STEPS = (1.0, 2.0, 2.5, 5.0, 10.0)
+
+
+def nice_ceiling(value):
+    """
+    ================================================================================
+    Round value up to 1, 2, 2.5 or 5 times a power of ten.
+    ================================================================================
+    """
+    if value <= 0:
+        return 1.0
+    magnitude = 10 ** math.floor(math.log10(value))
+    for step in _NICE_STEPS:
+        if value <= step * magnitude * (1 + 1e-9):
+            return step * magnitude
+    return 10 * magnitude
+
+
+def series_color(name):
+    return PALETTE[zlib.crc32(name.encode("utf-8")) % len(PALETTE)]
+
+
+def _draw_polyline(painter, pen, coords):
+    """
+    ================================================================================
+    Draw the polyline through the points (x0, y0, x1, y1, ...), copying the
+    coordinates straight into the QPolygonF buffer instead of making a QPointF
+    per point.
+    ================================================================================
+    """
+    polygon = QPolygonF(len(coords) // 2)
+    buffer = polygon.data()
+    buffer.setsize(8 * len(coords))
+    memoryview(buffer)[:] = array("d", coords).tobytes()
+    painter.setPen(pen)
+    painter.drawPolyline(polygon)
+
+
+class ColumnSeries:
+    """
+    ================================================================================
+    The min and max of one series per column of `seconds`, for the last `count`
+    columns. Columns are numbered from the epoch (timestamp // seconds) and kept
+    in a ring, so adding a sample is O(1) and old columns are overwritten.
+    ================================================================================
+    """
+    __slots__ = ("name", "pen", "seconds", "count", "ids", "mins", "maxs")
+
+    def __init__(self, name, seconds, count, pen=None):
+        self.name = name
+        self.seconds = seconds
+        self.count = count
+        self.ids = array("q", [-1]) * count
+        self.mins = array("d", bytes(8 * count))
+        self.maxs = array("d", bytes(8 * count))
+        if pen is None:
+            # Width 0: a cosmetic pen, one pixel wide whatever the transform.
+            pen = QPen(QColor(series_color(name)), 0)
+        self.pen = pen
+
+    def add(self, timestamp, low, high=None):
+        column = int(timestamp // self.seconds)
+        slot = column % self.count
+        high = low if high is None else high
+        current = self.ids[slot]
+        if current == column:
+            if low < self.mins[slot]:
+                self.mins[slot] = low
+            if high > self.maxs[slot]:
+                self.maxs[slot] = high
+        elif current < column:
+            self.ids[slot] = column
+            self.mins[slot] = low
+            self.maxs[slot] = high
+
+    def get(self, column):
+        slot = column % self.count
+        if self.ids[slot] != column:
+            return None
+        return self.mins[slot], self.maxs[slot]
+
+    def peak(self, first, last):
+        """
+        ================================================================================
+        The largest max of the columns first..last, or 0.0.
+        ================================================================================
+        """
+        return max((high for column, high in zip(self.ids, self.maxs)
+                    if first <= column <= last), default=0.0)
+
+    def rebucket(self, seconds, count):
+        """
+        ================================================================================
+        Return a copy folded into `count` columns of `seconds` (after a resize).
+        ================================================================================
+        """
+        copy = ColumnSeries(self.name, seconds, count, self.pen)
+        for column, low, high in zip(self.ids, self.mins, self.maxs):
+            if column >= 0:
+                copy.add(column * self.seconds, low, high)
+        return copy
+
+
+class LiveChart(QWidget):
+    """
+    ================================================================================
+    Chart of many series over the last `window` seconds. add_samples() appends
+    one value per series at a timestamp; set_visible() shows or hides a series.
+    The scale starts at `minimum_scale` and follows the largest visible value.
+    ================================================================================
+    """
+
+    def __init__(self, unit="%", minimum_scale=1.0, window=WINDOW_SECONDS, parent=None):
+        super().__init__(parent)
+        self.unit = unit
+        self.window = window
+        self.minimum_scale = minimum_scale
+        self.scale = minimum_scale
+        self.series = {}
+        self.hidden = set()
+        self._background = None
+        self._plot = None
+        self._right = None
+        self._updates = 0
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def _plot_rect(self):
+        return QRect(LEFT_MARGIN, 4, max(self.width() - LEFT_MARGIN, 1),
+                     max(self.height() - BOTTOM_MARGIN - 4, 1))
+
+    @property
+    def columns(self):
+        return self._plot_rect().width()
+
+    @property
+    def column_seconds(self):
+        return self.window / self.columns
+
+    def _visible(self):
+        return [series for name, series in self.series.items() if name not in self.hidden]
+
+    def set_visible(self, name, visible):
+        if (name not in self.hidden) == visible:
+            return
+        (self.hidden.discard if visible else self.hidden.add)(name)
+        self._rescale(force=True)
+        self.redraw()
+
+    def add_samples(self, timestamp, values):
+        """
+        ================================================================================
+        Add {name: value} sampled at timestamp (None values are skipped), then
+        paint the new columns.
+        ================================================================================
+        """
+        seconds, count = self.column_seconds, self.columns
+        column = int(timestamp // seconds)
+        if self._right is not None and column < self._right:
+            # Time went back (a replay was sought or looped): start over.
+            self.series = {}
+            self._right = None
+        peak = 0.0
+        for name, value in values.items():
+            if value is None:
+                continue
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = ColumnSeries(name, seconds, count)
+            series.add(timestamp, value)
+            if value > peak and name not in self.hidden:
+                peak = value
+        self._advance(column, peak)
+
+    def backfill(self, rows_by_name):
+        """
+        ================================================================================
+        Add past buckets, {name: [(time_ms, mean, min, max), ...]} as returned by
+        HistoryStore.query(), and redraw.
+        ================================================================================
+        """
+        seconds, count = self.column_seconds, self.columns
+        latest = None
+        for name, rows in rows_by_name.items():
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = ColumnSeries(name, seconds, count)
+            for time_ms, _, low, high in rows:
+                series.add(time_ms / 1000.0, low, high)
+                latest = time_ms if latest is None else max(latest, time_ms)
+        if latest is not None:
+            column = int(latest / 1000.0 // seconds)
+            self._right = column if self._right is None else max(self._right, column)
+        self._rescale(force=True)
+        self.redraw()
+
+    def _advance(self, column, peak):
+        if self._right is None or column > self._right + self.columns:
+            self._right = column
+            self._rescale(force=True)
+            self.redraw()
+            return
+        shift = max(column - self._right, 0)
+        self._right += shift
+        self._updates += 1
+        if peak > self.scale or self._updates % RESCALE_EVERY == 0:
+            if self._rescale(force=peak > self.scale):
+                self.redraw()
+                return
+        if self._plot is None:
+            return
+        if shift:
+            self._plot.scroll(-shift, 0, self._plot.rect())
+        # The previously open column may have grown too.
+        self._paint_columns(self._right - shift - 1, self._right)
+        self.update(self._plot_rect())
+
+    def _rescale(self, force=False):
+        """
+        ================================================================================
+        Fit the scale to the largest visible value in the window: grow at once,
+        shrink only below a quarter of the scale (or when forced). Returns True
+        when the scale changed.
+        ================================================================================
+        """
+        if self._right is None:
+            return False
+        first = self._right - self.columns + 1
+        peak = max((series.peak(first, self._right) for series in self._visible()),
+                   default=0.0)
+        scale = max(nice_ceiling(peak), self.minimum_scale)
+        if scale == self.scale or (not force and scale < self.scale and
+                                   peak > self.scale / 4):
+            return False
+        self.scale = scale
+        self._background = None
+        return True
+
+    def _paint_columns(self, first, last):
+        """
+        ================================================================================
+        Clear and repaint the columns first..last of the plot pixmap.
+        ================================================================================
+        """
+        first = max(first, self._right - self.columns + 1)
+        if first > last:
+            return
+        height = self._plot.height()
+        factor = (height - 1) / self.scale
+        bottom = height - 1
+        offset = self.columns - 1 - self._right
+        painter = QPainter(self._plot)
+        painter.setCompositionMode(QPainter.CompositionMode_Clear)
+        painter.fillRect(QRect(first + offset, 0, last - first + 1, height), Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        for series in self._visible():
+            ids, mins, maxs, count = series.ids, series.mins, series.maxs, series.count
+            # Start from the column before, so the strip joins the painted part.
+            coords = []
+            for column in range(first - 1, last + 1):
+                slot = column % count
+                if ids[slot] != column:
+                    if coords:
+                        _draw_polyline(painter, series.pen, coords)
+                        coords = []
+                    continue
+                x = column + offset
+                low = bottom - mins[slot] * factor
+                high = bottom - maxs[slot] * factor
+                # Odd columns go down, even ones up: neighbours join at their
+                # min or their max, which stays inside the min-max envelope.
+                if column & 1:
+                    coords += (x, high, x, low)
+                else:
+                    coords += (x, low, x, high)
+            if coords:
+                _draw_polyline(painter, series.pen, coords)
+        painter.end()
+
+    def redraw(self):
+        self._build_plot()
+        self.update()
+
+    def _build_plot(self):
+        """
+        ================================================================================
+        Repaint every column of the plot pixmap.
+        ================================================================================
+        """
+        rect = self._plot_rect()
+        if self._plot is None or self._plot.size() != rect.size():
+            self._plot = QPixmap(rect.size())
+        self._plot.fill(Qt.transparent)
+        if self._right is not None:
+            self._paint_columns(self._right - self.columns + 1, self._right)
+
+    def _render_background(self):
+        pixmap = QPixmap(self.size())
+        pixmap.fill(Qt.transparent)
+        rect = self._plot_rect()
+        painter = QPainter(pixmap)
+        font = QFont(self.font())
+        font.setPixelSize(10)
+        painter.setFont(font)
+        painter.setPen(QPen(QColor(GRID_COLOR)))
+        for i in range(GRID_LINES + 1):
+            y = rect.top() + round(i * (rect.height() - 1) / GRID_LINES)
+            painter.drawLine(rect.left(), y, rect.right(), y)
+        painter.setPen(QPen(QColor(LABEL_COLOR)))
+        for i in range(0, GRID_LINES + 1, 2):
+            y = rect.top() + round(i * (rect.height() - 1) / GRID_LINES)
+            value = self.scale * (GRID_LINES - i) / GRID_LINES
+            painter.drawText(QRect(0, y - 6, LEFT_MARGIN - 4, 12),
+                             Qt.AlignRight | Qt.AlignVCenter, f"{value:g}{self.unit}")
+        minutes = round(self.window / 60)
+        labels = ((rect.left(), Qt.AlignLeft, f"-{minutes}m"),
+                  (rect.center().x() - 20, Qt.AlignHCenter, f"-{minutes // 2}m"),
+                  (rect.right() - 40, Qt.AlignRight, "now"))
+        for x, align, text in labels:
+            painter.drawText(QRect(x, rect.bottom() + 2, 40, BOTTOM_MARGIN - 2),
+                             align | Qt.AlignTop, text)
+        painter.end()
+        return pixmap
+
+    def resizeEvent(self, event):
+        seconds, count = self.column_seconds, self.columns
+        self.series = {name: series.rebucket(seconds, count)
+                       for name, series in self.series.items()}
+        if self._right is not None:
+            latest = max((max(series.ids) for series in self.series.values()), default=-1)
+            self._right = latest if latest >= 0 else None
+        self._background = None
+        self._build_plot()
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        if self._background is None or self._background.size() != self.size():
+            self._background = self._render_background()
+        if self._plot is None:
+            self._build_plot()
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._background)
+        painter.drawPixmap(self._plot_rect().topLeft(), self._plot)
+        painter.end()
@@ -0,0 +1,423 @@
+"""
+===========================================================================================
+ScriptScope GUI loader
+-------------------------------------------------------------------------------------------
+Background loading of snapshots for the main window. A SnapshotLoader lives in its own
+QThread: it reads the daemon's shared map when it publishes one (see
+scriptscope/sharedmap.py), otherwise subscribes to the stream socket, or polls stats.json
+when no daemon is listening. A map that has not been updated for a few publishing
+intervals is left by a daemon that was killed: it is then ignored until it changes
+again. It parses each snapshot and normalizes it into ready-to-render table rows and
+execution-time bars. The GUI thread never touches the disk or the socket.
+
+Results are coalesced: while the GUI has not picked up the previous result, newer ones
+replace it instead of piling up in the event queue, and a slow read simply delays the
+next poll rather than queuing more of them.
+
+The daemon's own record ("self") is appended as the "ScriptScope self" row, together with
+the time the GUI takes to render a snapshot.
+
+When the daemon publishes run statistics (stats.json and the stream do, the shared map
+does not), each bar is the mean duration of a script's finished runs, with its p50, p95
+and p99, run count and supervisor state as tooltip; a script with no finished run yet
+shows its current elapsed time.
+
+Each snapshot also carries the CPU and memory of every script (summed over its processes)
+for the live charts. The first one with records also carries the last hour of those
+metrics from the history rollups, read once on the loader thread to backfill the charts.
+===========================================================================================
+"""
+
+import os
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QSocketNotifier, QTimer, pyqtSignal, pyqtSlot
+
+from scriptscope.history import HistoryStore
+from scriptscope.metrics import Metrics
+from scriptscope.publish import SnapshotReader
+from scriptscope.sampler import format_etime
+from scriptscope.sharedmap import SharedMapReader
+from scriptscope.snapshot import (
+    display_name, format_rate, safe_div, safe_float, time_to_seconds,
+)
+from scriptscope.stream import StreamClient
+
+POLL_INTERVAL_MS = 1000
+MAP_POLL_INTERVAL_MS = 100
+MAP_STALE_INTERVALS = 3
+MAP_STALE_MIN_SECONDS = 3.0
+CHART_METRICS = ("cpu", "mem")
+BACKFILL_SECONDS = 3600
+BACKFILL_RESOLUTION_MS = 10000
+
+
+class PreparedSnapshot:
+    """
+    ================================================================================
+    A snapshot normalized for rendering: the raw records, the (key, values,
+    colors) rows of the stats table, the (script_name, seconds, tooltip) bars of
+    the execution-times panel, the average execution time in seconds (None
+    when there is nothing to average), the timestamp of the snapshot, the
+    {script_name: value} series of each of CHART_METRICS and, once, the history
+    to backfill the charts with ({metric: {script_name: rows}}).
+    ================================================================================
+    """
+    __slots__ = ("records", "rows", "bars", "average", "timestamp", "series", "history")
+
+    def __init__(self, records, rows, bars, average=None, timestamp=None, series=None,
+                 history=None):
+        self.records = records
+        self.rows = rows
+        self.bars = bars
+        self.average = average
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.series = series or {metric: {} for metric in CHART_METRICS}
+        self.history = history
+
+
+def _pid(entry):
+    # Recordings read back from jsonl or columnar files carry None for a script
+    # that is not running, where the daemon publishes "-".
+    pid = entry.get("pid")
+    return "-" if pid in (None, "", "-") else str(pid)
+
+
+def _table_row(entry, cpu_count, label=None):
+    """
+    ================================================================================
+    Build the display values and text colors of one stats table row.
+    ================================================================================
+    """
+    cpu = safe_float(entry.get("cpu", "0"))
+    if "cpu_total" in entry:
+        cpu_total = safe_float(entry["cpu_total"])
+    else:
+        cpu_total = safe_div(cpu, cpu_count)
+    mem = safe_float(entry.get("mem", "0"))
+    etime = entry.get("etime", "")
+    if not isinstance(etime, str):
+        etime = "-" if etime is None else format_etime(etime)
+    syscr, syscw = entry.get("syscr_rate"), entry.get("syscw_rate")
+    syscalls = "-" if syscr in (None, "-") else f"{safe_float(syscr) + safe_float(syscw):.1f}"
+
+    values = (
+        display_name(entry) if label is None else label, _pid(entry),
+        f"{cpu:.2f}", f"{cpu_total:.2f}", f"{mem:.2f}", etime,
+        format_rate(entry.get("read_rate")), format_rate(entry.get("write_rate")),
+        syscalls, format_rate(entry.get("cancelled_write_rate")),
+        entry.get("cmd") or "",
+    )
+    colors = (
+        None, None,
+        "red" if cpu >= 10 else "green",
+        "red" if cpu_total >= 10 else "green",
+        "red" if mem >= 10 else "green",
+        None, None, None, None, None, None,
+    )
+    return values, colors
+
+
+def _run_tooltip(name, stats, state):
+    parts = [name]
+    quantiles = [f"{q} {format_etime(stats[q]) if stats[q] >= 60 else f'{stats[q]:.2f}s'}"
+                 for q in ("p50", "p95", "p99") if stats.get(q) is not None]
+    if quantiles:
+        parts.append(", ".join(quantiles))
+    runs = f"{stats['runs']} run" + ("" if stats["runs"] == 1 else "s")
+    if stats.get("failures"):
+        runs += f", {stats['failures']} failed"
+    parts.append(runs)
+    if state:
+        parts.append(state)
+    return "\n".join(parts)
+
+
+def load_history(directory, names, end, seconds=BACKFILL_SECONDS):
+    """
+    ================================================================================
+    Read the CHART_METRICS rollups of the named scripts over the `seconds` before
+    end from the history directory: {metric: {script_name: [(time_ms, mean,
+    min, max), ...]}}, without the scripts that have no history.
+    ================================================================================
+    """
+    history = {metric: {} for metric in CHART_METRICS}
+    store = HistoryStore(directory, readonly=True)
+    try:
+        end_ms = int(end * 1000)
+        start_ms = end_ms - seconds * 1000
+        for name in names:
+            for metric in CHART_METRICS:
+                rows = store.query(name, metric, start_ms, end_ms, BACKFILL_RESOLUTION_MS)
+                if rows:
+                    history[metric][name] = rows
+    finally:
+        store.close()
+    return history
+
+
+def prepare_snapshot(records, own=None, render_seconds=None, run_stats=None,
+                     supervisor=None, timestamp=None):
+    """
+    ================================================================================
+    Normalize stats records into table rows and execution-time bars. Rows are
+    keyed by (script_name, pid); a repeated key gets an occurrence number. The
+    child processes of a script become child rows of its row. own is the
+    daemon's self record, added as a last row with the GUI render time.
+    run_stats ({script: summary}) and supervisor ({script: status}) come from the
+    daemon; with run_stats, the average is weighted by the number of runs.
+    ================================================================================
+    """
+    rows = []
+    bars = []
+    series = {metric: {} for metric in CHART_METRICS}
+    seen = {}
+    barred = set()
+    run_stats = run_stats or {}
+    supervisor = supervisor or {}
+    cpu_count = os.cpu_count()
+    for entry in records:
+        key = (display_name(entry), _pid(entry))
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = key + (seen[key],)
+
+        values, colors = _table_row(entry, cpu_count)
+        children = []
+        for child in entry.get("children") or ():
+            argv0 = (child.get("cmd") or "").split(" ", 1)[0]
+            label = "  \u2514 " + (os.path.basename(argv0) or _pid(child))
+            child_values, child_colors = _table_row(child, cpu_count, label)
+            children.append((key + ("child", _pid(child)),
+                             child_values, child_colors))
+        rows.append((key, values, colors, children))
+
+        name = display_name(entry)
+        for metric in CHART_METRICS:
+            value = entry.get(metric)
+            if value not in (None, "-", ""):
+                values_by_name = series[metric]
+                values_by_name[name] = values_by_name.get(name, 0.0) + safe_float(value)
+        stats = run_stats.get(name)
+        if stats and stats.get("mean") is not None:
+            if name not in barred:
+                barred.add(name)
+                state = (supervisor.get(name) or {}).get("state")
+                bars.append((name, stats["mean"], _run_tooltip(name, stats, state)))
+        elif "script_name" in entry and "etime" in entry:
+            etime = entry["etime"]
+            seconds = time_to_seconds(etime) if isinstance(etime, str) else int(etime or 0)
+            bars.append((name, seconds, name))
+    for name, stats in run_stats.items():
+        if name not in barred and stats.get("mean") is not None:
+            state = (supervisor.get(name) or {}).get("state")
+            bars.append((name, stats["mean"], _run_tooltip(name, stats, state)))
+
+    runs = sum(stats.get("runs") or 0 for stats in run_stats.values())
+    if runs:
+        average = sum((stats.get("mean") or 0) * (stats.get("runs") or 0)
+                      for stats in run_stats.values()) / runs
+    else:
+        average = sum(seconds for _, seconds, _ in bars) / len(bars) if bars else None
+    if own:
+        if render_seconds is not None:
+            own = dict(own, cmd=f"{own.get('cmd', '')}, render {render_seconds * 1000:.1f}")
+        values, colors = _table_row(own, cpu_count)
+        rows.append(((own.get("script_name"), "self"), values, colors, []))
+    return PreparedSnapshot(records, rows, bars, average, timestamp, series)
+
+
+class SnapshotLoader(QObject):
+    """
+    ================================================================================
+    Loads and prepares snapshots on a worker thread. Connect `ready` to a slot of
+    the GUI and call take() from it to get the latest PreparedSnapshot.
+    ================================================================================
+    """
+    ready = pyqtSignal()
+
+    def __init__(self, stats_path, socket_path, map_path=None, history_dir=None,
+                 parent=None):
+        super().__init__(parent)
+        self.reader = SnapshotReader(stats_path)
+        self.history_dir = history_dir
+        self._backfilled = history_dir is None
+        self.socket_path = socket_path
+        self.shared = SharedMapReader(map_path) if map_path else None
+        self._mapped = False
+        self._map_opened = None
+        self._map_timestamp = None
+        self._map_period = 0.0
+        self.stream = None
+        self.notifier = None
+        self.timer = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._notified = False
+        self._has_loaded = False
+        self.metrics = Metrics()
+
+    @pyqtSlot()
+    def start(self):
+        """
+        ================================================================================
+        Start polling. Must run on the loader's thread (connect QThread.started).
+        ================================================================================
+        """
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(POLL_INTERVAL_MS)
+        self.poll()
+
+    @pyqtSlot()
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+        self._disconnect_stream()
+
+    def take(self):
+        """
+        ================================================================================
+        Return the latest prepared snapshot (or None). Called from the GUI thread.
+        ================================================================================
+        """
+        with self._lock:
+            prepared, self._pending = self._pending, None
+            self._notified = False
+        return prepared
+
+    def record_render(self, seconds):
+        """
+        ================================================================================
+        Record how long the GUI took to render a snapshot. Called from the GUI thread.
+        ================================================================================
+        """
+        self.metrics.observe("render", seconds)
+
+    def _deliver(self, records, own=None, run_stats=None, supervisor=None,
+                 timestamp=None):
+        prepared = prepare_snapshot(records, own, self.metrics.quantile("render", 0.5),
+                                    run_stats, supervisor, timestamp)
+        if records and not self._backfilled:
+            self._backfilled = True
+            names = {entry["script_name"] for entry in records
+                     if entry.get("script_name") and not entry.get("host")}
+            try:
+                prepared.history = load_history(self.history_dir, sorted(names),
+                                                prepared.timestamp)
+            except (OSError, ValueError):
+                pass
+        self._has_loaded = True
+        with self._lock:
+            # The history must survive coalescing with the next snapshot.
+            if self._pending is not None and prepared.history is None:
+                prepared.history = self._pending.history
+            self._pending = prepared
+            if self._notified:
+                return
+            self._notified = True
+        self.ready.emit()
+
+    @pyqtSlot()
+    def poll(self):
+        """
+        ================================================================================
+        Timer slot: read the shared map when the daemon publishes one. Otherwise
+        idle while subscribed to the stream, or try to subscribe and fall back to
+        reading stats.json when it has changed.
+        ================================================================================
+        """
+        if self._poll_shared():
+            return
+        if self.stream is not None or self._connect_stream():
+            return
+        snapshot = self.reader.read()
+        if snapshot is not None:
+            self._deliver(snapshot["scripts"], snapshot.get("self"),
+                          snapshot.get("run_stats"), snapshot.get("supervisor"),
+                          snapshot.get("timestamp"))
+        elif not self._has_loaded:
+            # Lets the GUI show that it is waiting for the first snapshot.
+            self._deliver([])
+
+    def _poll_shared(self):
+        """
+        ================================================================================
+        Deliver the shared map's snapshot if it changed. Returns False when there is
+        no map to read or it is stale, switching the timer back to the slow poll.
+        The map is stale when its last snapshot is older than MAP_STALE_INTERVALS
+        times the longest gap seen between two of them (MAP_STALE_MIN_SECONDS at
+        least); a map replaced by a new daemon starts over.
+        ================================================================================
+        """
+        if self.shared is None:
+            return False
+        try:
+            snapshot = self.shared.read()
+        except OSError:
+            self._map_timestamp = None
+            if self._mapped:
+                self.shared.close()
+                self._unmap()
+            return False
+        if snapshot is not None:
+            if self.shared.map is not self._map_opened:
+                self._map_opened = self.shared.map
+                self._map_period = 0.0
+            elif self._map_timestamp is not None:
+                self._map_period = max(self._map_period,
+                                       snapshot.timestamp - self._map_timestamp)
+            self._map_timestamp = snapshot.timestamp
+        stale_after = max(MAP_STALE_INTERVALS * self._map_period, MAP_STALE_MIN_SECONDS)
+        if self._map_timestamp is None or time.time() - self._map_timestamp > stale_after:
+            if self._mapped:
+                self._unmap()
+            return False
+        if not self._mapped:
+            self._mapped = True
+            self._disconnect_stream()
+            self.timer.setInterval(MAP_POLL_INTERVAL_MS)
+        if snapshot is not None:
+            records, own = snapshot.records()
+            self._deliver(records, own, timestamp=snapshot.timestamp)
+        return True
+
+    def _unmap(self):
+        self._mapped = False
+        self.timer.setInterval(POLL_INTERVAL_MS)
+
+    def _connect_stream(self):
+        client = StreamClient(self.socket_path)
+        try:
+            client.connect()
+            client.subscribe()
+        except OSError:
+            client.close()
+            return False
+        self.stream = client
+        self.notifier = QSocketNotifier(client.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self._on_stream_ready)
+        return True
+
+    def _disconnect_stream(self):
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier.deleteLater()
+            self.notifier = None
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    @pyqtSlot()
+    def _on_stream_ready(self):
+        try:
+            messages = self.stream.read_available()
+        except OSError:
+            self._disconnect_stream()
+            return
+        if messages:
+            message = messages[-1]
+            self._deliver(message.get("scripts", []), message.get("self"),
+                          message.get("run_stats"), message.get("supervisor"),
+                          message.get("timestamp"))
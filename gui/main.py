@@ -1,10 +1,16 @@
+import argparse
 import sys
 from PyQt5.QtWidgets import QApplication
 from gui.widgets import ScriptScopeMainWindow
 
 def main():
-    app = QApplication(sys.argv)
-    window = ScriptScopeMainWindow()
+    parser = argparse.ArgumentParser(prog="scriptscope-gui")
+    parser.add_argument("--stats", help="stats file to read instead of the daemon's")
+    parser.add_argument("--socket", help="stream socket to subscribe to instead of the daemon's")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    title = "replay" if args.stats else None
+    window = ScriptScopeMainWindow(args.stats, args.socket, title)
     window.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,217 @@
+"""
+===========================================================================================
+ScriptScope GUI models
+-------------------------------------------------------------------------------------------
+Qt item models behind the ScriptScope views. Rows are keyed (by script name and PID for
+the stats table), so a refresh only inserts rows for processes that started, removes rows
+for processes that stopped and emits dataChanged for the cells whose values changed.
+Nothing is allocated per cell on refresh. A row may carry child rows (the subprocesses
+of a script), shown under it while it is expanded. With checkable names, the first column
+of their top-level rows also carries a check box (whether the script is drawn in the
+charts), shared by every row of the same name.
+===========================================================================================
+"""
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtGui import QColor
+
+_COLORS = {}
+
+
+def _color(name):
+    color = _COLORS.get(name)
+    if color is None:
+        color = _COLORS[name] = QColor(name)
+    return color
+
+
+class KeyedTableModel(QAbstractTableModel):
+    """
+    ================================================================================
+    Table model fed with (key, values, colors[, children]) rows, where values are
+    the display strings of each column, colors are color names (or None) for the
+    text and children is a list of (key, values, colors) rows. A row with children
+    shows an expand marker in its first column; toggle() expands or collapses it.
+    Top-level rows whose key starts with one of the `checkable` names get a check
+    box; unchecking one adds the name to `unchecked` and emits checkToggled.
+    ================================================================================
+    """
+    checkToggled = pyqtSignal(str, bool)
+
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.expanded = set()
+        self.checkable = set()
+        self.unchecked = set()
+        self._rows = []
+        self._parents = set()
+        self._top = set()
+        self._keys = []
+        self._values = []
+        self._colors = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self._values[index.row()][index.column()]
+            if index.column() == 0:
+                key = self._keys[index.row()]
+                if key in self._parents:
+                    return ("\u25be " if key in self.expanded else "\u25b8 ") + value
+            return value
+        if role == Qt.ForegroundRole:
+            name = self._colors[index.row()][index.column()]
+            return _color(name) if name else None
+        if role == Qt.CheckStateRole and self._is_checkable(index):
+            name = self._keys[index.row()][0]
+            return Qt.Unchecked if name in self.unchecked else Qt.Checked
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if self._is_checkable(index):
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not self._is_checkable(index):
+            return False
+        name = self._keys[index.row()][0]
+        checked = value == Qt.Checked
+        if (name not in self.unchecked) == checked:
+            return False
+        self.unchecked ^= {name}
+        for row, key in enumerate(self._keys):
+            if key in self._top and key[0] == name:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, 0),
+                                      [Qt.CheckStateRole])
+        self.checkToggled.emit(name, checked)
+        return True
+
+    def _is_checkable(self, index):
+        if index.column() != 0:
+            return False
+        key = self._keys[index.row()]
+        return key in self._top and key[0] in self.checkable
+
+    def key(self, row):
+        return self._keys[row]
+
+    def set_rows(self, rows):
+        """
+        ================================================================================
+        Replace the content with rows, keeping the position of the keys that are
+        still present. New keys are inserted where they appear in rows.
+        ================================================================================
+        """
+        self._rows = list(rows)
+        old_parents = self._parents
+        self._apply(self._flatten())
+        # Rows that gained or lost children only change their expand marker.
+        for key in (old_parents ^ self._parents).intersection(self._keys):
+            row = self._keys.index(key)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 0))
+
+    def toggle(self, row):
+        """
+        ================================================================================
+        Expand or collapse the children of a row. Returns False for rows without
+        children.
+        ================================================================================
+        """
+        key = self._keys[row]
+        if key not in self._parents:
+            return False
+        self.expanded ^= {key}
+        self._apply(self._flatten())
+        row = self._keys.index(key)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, 0))
+        return True
+
+    def _flatten(self):
+        flat = []
+        self._parents = set()
+        self._top = set()
+        for row in self._rows:
+            key, values, colors = row[:3]
+            if isinstance(key, tuple):
+                self._top.add(key)
+            children = row[3] if len(row) > 3 else None
+            flat.append((key, values, colors))
+            if children:
+                self._parents.add(key)
+                if key in self.expanded:
+                    flat.extend(children)
+        self.expanded &= self._parents
+        return flat
+
+    def _apply(self, flat):
+        new_keys = {key for key, _, _ in flat}
+
+        # Remove vanished keys, from the bottom so the row numbers stay valid.
+        row = len(self._keys) - 1
+        while row >= 0:
+            if self._keys[row] in new_keys:
+                row -= 1
+                continue
+            last = row
+            while row - 1 >= 0 and self._keys[row - 1] not in new_keys:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row, last)
+            del self._keys[row:last + 1]
+            del self._values[row:last + 1]
+            del self._colors[row:last + 1]
+            self.endRemoveRows()
+            row -= 1
+
+        kept = set(self._keys)
+        if [key for key, _, _ in flat if key in kept] != self._keys:
+            # The remaining rows were reordered: not worth a row-by-row diff.
+            self.beginResetModel()
+            self._keys = [key for key, _, _ in flat]
+            self._values = [tuple(values) for _, values, _ in flat]
+            self._colors = [tuple(colors) for _, _, colors in flat]
+            self.endResetModel()
+            return
+
+        i = 0
+        while i < len(flat):
+            key, values, colors = flat[i]
+            if i < len(self._keys) and self._keys[i] == key:
+                self._update(i, tuple(values), tuple(colors))
+                i += 1
+                continue
+            # Insert the run of new keys starting here in one go.
+            run = i
+            while run < len(flat) and flat[run][0] not in kept:
+                run += 1
+            self.beginInsertRows(QModelIndex(), i, run - 1)
+            for key, values, colors in flat[i:run]:
+                self._keys.insert(i, key)
+                self._values.insert(i, tuple(values))
+                self._colors.insert(i, tuple(colors))
+                i += 1
+            self.endInsertRows()
+
+    def _update(self, i, values, colors):
+        old_values, old_colors = self._values[i], self._colors[i]
+        if values == old_values and colors == old_colors:
+            return
+        changed = [c for c in range(len(values))
+                   if values[c] != old_values[c] or colors[c] != old_colors[c]]
+        self._values[i] = values
+        self._colors[i] = colors
+        self.dataChanged.emit(self.index(i, changed[0]), self.index(i, changed[-1]))
@@ -22,7 +22,7 @@ def apply_mainwindow_style(window):
 
 def apply_table_style(table):
     table.setStyleSheet("""
-        QTableWidget {
+        QTableView {
             background-color: #1b2027;
             color: #f8f8f2;
             border: 1px solid #3b4754;
@@ -41,10 +41,10 @@ def apply_table_style(table):
             border: none;
             padding: 10px 0 10px 10px;
         }
-        QTableWidget::item {
+        QTableView::item {
             padding: 8px;
         }
-        QTableWidget::item:selected {
+        QTableView::item:selected {
             background-color: #283039;
             color: #fff;
         }
@@ -4,21 +4,22 @@ ScriptScope GUI Application
 -------------------------------------------------------------------------------------------
 This module implements the main window for the ScriptScope GUI, a PyQt5-based application
 designed to monitor and display real-time statistics about running scripts. The interface
-provides a table view with customizable columns, periodic data refresh from a JSON file,
-and visual indicators for CPU and memory usage. The code is organized into clearly
-documented sections for maintainability and clarity.
+provides a table view with customizable columns, live updates pushed by the monitor daemon
+over its stream socket (or periodic refresh from stats.json when no daemon is listening),
+live CPU and memory charts of the last hour (gui/charts.py), with a check box per script
+in the table to show or hide its series, and visual indicators for CPU and memory usage.
+The code is organized into clearly documented sections for maintainability and clarity.
 ===========================================================================================
 """
 
 import os
-import json
+import time
 
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import QMetaObject, QThread, QTimer, Qt
 from PyQt5.QtSvg import QSvgWidget
 
 from PyQt5.QtWidgets import (
-    QMainWindow, QTableWidget, QTableWidgetItem, QSizePolicy,
+    QMainWindow, QTableView, QSizePolicy,
     QVBoxLayout, QWidget, QHBoxLayout, QPushButton, QLabel, QFrame,
     QProgressBar
 )
@@ -29,6 +30,11 @@ from .style import (
     style_metrics_rect, style_metrics_title, style_avg_time_label,
     style_script_label, style_script_progress_bar, style_no_scripts_label
 )
+from .charts import LiveChart
+from .loader import SnapshotLoader
+from .models import KeyedTableModel
+from scriptscope.config import HISTORY_DIR, MAP_FILE, SOCKET_FILE, STATS_FILE
+from scriptscope.snapshot import safe_div, safe_float, time_to_seconds
 
 SHOW_TABLE = False
 
@@ -45,21 +51,35 @@ class ScriptScopeMainWindow(QMainWindow):
         ("CPU Total (%)", 100),
         ("MEM (%)", 80),
         ("Elapsed Time", 120),
+        ("Read/s", 90),
+        ("Write/s", 90),
+        ("Syscalls/s", 100),
+        ("Cancelled W/s", 110),
         ("Command", 280)
     ]
 
-    def __init__(self):
+    def __init__(self, stats_path=None, socket_path=None, title=None):
         super().__init__()
-        self.setWindowTitle("ScriptScope GUI")
+        self.setWindowTitle(f"ScriptScope GUI - {title}" if title else "ScriptScope GUI")
+        # A replay (scriptscope/replay.py) publishes to its own stats file and socket:
+        # the shared map and the history of the live daemon are not used then.
+        self.sources = (stats_path or STATS_FILE, socket_path or SOCKET_FILE,
+                        None if stats_path else MAP_FILE, None if stats_path else HISTORY_DIR)
         self.resize(900, 500)
         self.last_data = []
+        self.last_bars = []
+        self.last_average = None
         self.has_shown_waiting = False
 
         self.scripts_rect = None
         self.scripts_layout = None
+        self.bar_rows = []
+        self.no_scripts_label = None
+        self.charts = {}
+        self._check_changed = False
 
         self._init_ui()
-        self._init_timer()
+        self._init_loader()
 
         apply_mainwindow_style(self)
 
@@ -165,6 +185,13 @@ class ScriptScopeMainWindow(QMainWindow):
             title.setAlignment(Qt.AlignLeft | Qt.AlignTop)
             vbox.addWidget(title, alignment=Qt.AlignLeft | Qt.AlignTop)
 
+            if title_text in ("CPU Usage", "RAM Usage"):
+                # Per-core CPU percentages, so a busy script can go past 100%.
+                chart = LiveChart("%", 100.0 if title_text == "CPU Usage" else 10.0)
+                self.charts["cpu" if title_text == "CPU Usage" else "mem"] = chart
+                vbox.addSpacing(8)
+                vbox.addWidget(chart, stretch=1)
+
             if title_text == "Script Execution Times":
                 self.avg_time_label = QLabel("Average time: N/A")
                 style_avg_time_label(self.avg_time_label)
@@ -201,9 +228,12 @@ class ScriptScopeMainWindow(QMainWindow):
 
         overview_layout.addWidget(rectangles_container, alignment=Qt.AlignLeft)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(len(self.COLUMNS))
-        self.table.setHorizontalHeaderLabels([name for name, _ in self.COLUMNS])
+        self.table_model = KeyedTableModel([name for name, _ in self.COLUMNS], self)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.verticalHeader().hide()
+        self.table.clicked.connect(self._on_table_clicked)
+        self.table_model.checkToggled.connect(self._on_check_toggled)
         self.table.setAlternatingRowColors(True)
         for idx, (_, width) in enumerate(self.COLUMNS):
             self.table.setColumnWidth(idx, width)
@@ -225,16 +255,59 @@ class ScriptScopeMainWindow(QMainWindow):
         container.setLayout(main_layout)
         self.setCentralWidget(container)
 
-    def _init_timer(self):
+    def _init_loader(self):
+        """
+        ================================================================================
+        Start the background loader. Snapshots are read, parsed and normalized on
+        its thread and handed back through the queued `ready` signal.
+        ================================================================================
+        """
+        self.loader_thread = QThread(self)
+        self.loader = SnapshotLoader(*self.sources)
+        self.loader.moveToThread(self.loader_thread)
+        self.loader_thread.started.connect(self.loader.start)
+        self.loader_thread.finished.connect(self.loader.deleteLater)
+        self.loader.ready.connect(self.refresh_table)
+        self.loader_thread.start()
+
+    def closeEvent(self, event):
+        """
+        ================================================================================
+        Stop the loader thread before the window goes away.
+        ================================================================================
+        """
+        QMetaObject.invokeMethod(self.loader, "stop", Qt.BlockingQueuedConnection)
+        self.loader_thread.quit()
+        self.loader_thread.wait()
+        super().closeEvent(event)
+
+    def _on_table_clicked(self, index):
+        """
+        ================================================================================
+        Expand or collapse the child processes of a script when its name is clicked
+        (but not when the click was on its check box).
+        ================================================================================
+        """
+        if self._check_changed:
+            self._check_changed = False
+            return
+        if index.column() == 0:
+            self.table_model.toggle(index.row())
+
+    def _on_check_toggled(self, name, checked):
         """
         ================================================================================
-        Initialize the timer for periodic data refresh.
+        Show or hide the series of a script in the charts.
         ================================================================================
         """
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.refresh_table)
-        self.timer.start(1000)
-        self.refresh_table()
+        # The view emits clicked right after a check box click: skip that one only.
+        self._check_changed = True
+        QTimer.singleShot(0, self._clear_check_changed)
+        for chart in self.charts.values():
+            chart.set_visible(name, checked)
+
+    def _clear_check_changed(self):
+        self._check_changed = False
 
     def toggle_column_visibility(self, column, visible):
         """
@@ -247,83 +320,85 @@ class ScriptScopeMainWindow(QMainWindow):
     def refresh_table(self):
         """
         ================================================================================
-        Refresh table data from stats.json and update the metrics rectangle.
+        Render the latest snapshot prepared by the loader in the table and the
+        metrics rectangle. Several snapshots published while the GUI was busy are
+        coalesced into the newest one.
         ================================================================================
         """
-        stats_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "stats.json"
-        )
-        try:
-            with open(stats_path, "r") as f:
-                data = json.load(f)
-        except Exception:
-            data = []
-
-        if not data and not self.last_data and not self.has_shown_waiting:
-            self.table.setRowCount(1)
-            item = QTableWidgetItem("Waiting for data...")
-            item.setForeground(QColor("#ffcc00"))
-            self.table.setItem(0, 0, item)
-            for col in range(1, len(self.COLUMNS)):
-                self.table.setItem(0, col, QTableWidgetItem(""))
+        prepared = self.loader.take()
+        if prepared is None:
+            return
+
+        if not prepared.records and not self.last_data and not self.has_shown_waiting:
+            blank = ("",) * (len(self.COLUMNS) - 1)
+            self.table_model.set_rows([
+                (None, ("Waiting for data...",) + blank, ("#ffcc00",) + (None,) * len(blank))
+            ])
             self.has_shown_waiting = True
             return
 
-        if data:
-            self.last_data = data
+        if prepared.records:
+            started = time.perf_counter()
+            self.last_data = prepared.records
+            self.last_bars = prepared.bars
+            self.last_average = prepared.average
             self.has_shown_waiting = False
-            self.update_table(data)
+            self.table_model.checkable = set(prepared.series["cpu"]) | set(prepared.series["mem"])
+            self.table_model.set_rows(prepared.rows)
+            self._update_charts(prepared)
             if self.scripts_rect and self.scripts_layout:
                 self._update_scripts_rect()
+            self.loader.record_render(time.perf_counter() - started)
+
+    def _update_charts(self, prepared):
+        """
+        ================================================================================
+        Backfill the charts with the history the loader read (first snapshot only),
+        then add the values of the snapshot.
+        ================================================================================
+        """
+        for metric, chart in self.charts.items():
+            if prepared.history:
+                chart.backfill(prepared.history.get(metric, {}))
+            chart.add_samples(prepared.timestamp, prepared.series.get(metric, {}))
 
     def _update_scripts_rect(self):
         """
         ================================================================================
         Update the "Script Execution Times" rectangle with scripts and progress bars.
-        Each bar represents the script execution time, normalized to the maximum time.
+        Each bar represents the script execution time (the mean per-run duration when
+        the daemon publishes run statistics), normalized to the maximum time.
+        Row widgets are pooled: existing rows are updated in place, and rows are only
+        created or hidden when the number of processes changes.
         ================================================================================
         """
-        while self.scripts_bar_layout.count():
-            item = self.scripts_bar_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                self._clear_layout(item.layout())
-
-        data = self.last_data
-        scripts_with_times = []
-        for entry in data:
-            if "script_name" in entry and "etime" in entry:
-                etime_str = entry["etime"]
-                etime_sec = self.time_to_seconds(etime_str) if isinstance(etime_str, str) else int(etime_str)
-                scripts_with_times.append((entry["script_name"], etime_sec))
-
-        if not scripts_with_times:
-            label = QLabel("No running scripts")
-            style_no_scripts_label(label)
-            self.scripts_bar_layout.addWidget(label)
-        else:
-            max_time = max(t for _, t in scripts_with_times) if scripts_with_times else 1
-            if max_time == 0:
-                max_time = 1
-            for name, time_sec in scripts_with_times:
-                hbox = QHBoxLayout()
-                hbox.setContentsMargins(0, 8, 0, 8) #espace entre chaque barre
-                hbox.setSpacing(20) #taille de la barre
-
-                label_name = QLabel(name)
-                style_script_label(label_name)
-                hbox.addWidget(label_name)
-
-                bar = QProgressBar()
-                bar.setMaximum(100)
-                bar.setValue(int((time_sec / max_time) * 100))
-                bar.setTextVisible(False)
-                style_script_progress_bar(bar)
-                hbox.addWidget(bar, stretch=1)
-
-                self.scripts_bar_layout.addLayout(hbox)
+        scripts_with_times = self.last_bars
+
+        if self.no_scripts_label is None:
+            self.no_scripts_label = QLabel("No running scripts")
+            style_no_scripts_label(self.no_scripts_label)
+            self.scripts_bar_layout.addWidget(self.no_scripts_label)
+        self.no_scripts_label.setVisible(not scripts_with_times)
+
+        while len(self.bar_rows) < len(scripts_with_times):
+            self.bar_rows.append(self._create_bar_row())
+
+        max_time = max((t for _, t, _ in scripts_with_times), default=0) or 1
+        for (name, time_sec, tooltip), (row, label_name, bar) in zip(scripts_with_times,
+                                                                     self.bar_rows):
+            if label_name.text() != name:
+                label_name.setText(name)
+            if label_name.toolTip() != tooltip:
+                label_name.setToolTip(tooltip)
+                bar.setToolTip(tooltip)
+            value = int((time_sec / max_time) * 100)
+            if bar.value() != value:
+                bar.setValue(value)
+            if row.isHidden():
+                row.show()
+        for row, _, _ in self.bar_rows[len(scripts_with_times):]:
+            if not row.isHidden():
+                row.hide()
 
         common_style = (
             "color:#fff; "
@@ -335,8 +410,8 @@ class ScriptScopeMainWindow(QMainWindow):
         )
 
         if hasattr(self, 'avg_time_label') and self.avg_time_label is not None:
-            if scripts_with_times:
-                avg_time_ms = sum(t * 1000 for _, t in scripts_with_times) / len(scripts_with_times)
+            if self.last_average is not None:
+                avg_time_ms = self.last_average * 1000
                 if avg_time_ms >= 10000:
                     valeur = f"{avg_time_ms / 1000:.1f}"
                     unite = "s"
@@ -354,82 +429,33 @@ class ScriptScopeMainWindow(QMainWindow):
 
 
 
-    def update_table(self, data):
-        """
-        ================================================================================
-        Update table rows from loaded data.
-        ================================================================================
-        """
-        self.table.setRowCount(len(data))
-        for row, entry in enumerate(data):
-            self.table.setItem(row, 0, QTableWidgetItem(entry.get("script_name", "")))
-            self.table.setItem(row, 1, QTableWidgetItem(str(entry.get("pid", ""))))
-
-            cpu = self._safe_float(entry.get("cpu", "0"))
-            cpu_item = QTableWidgetItem(f"{cpu:.2f}")
-            cpu_item.setForeground(QColor("red") if cpu >= 10 else QColor("green"))
-            self.table.setItem(row, 2, cpu_item)
-
-            cpu_total = self._safe_div(cpu, os.cpu_count())
-            cpu_total_item = QTableWidgetItem(f"{cpu_total:.2f}")
-            cpu_total_item.setForeground(QColor("red") if cpu_total >= 10 else QColor("green"))
-            self.table.setItem(row, 3, cpu_total_item)
-
-            mem = self._safe_float(entry.get("mem", "0"))
-            mem_item = QTableWidgetItem(f"{mem:.2f}")
-            mem_item.setForeground(QColor("red") if mem >= 10 else QColor("green"))
-            self.table.setItem(row, 4, mem_item)
-
-            self.table.setItem(row, 5, QTableWidgetItem(entry.get("etime", "")))
-            self.table.setItem(row, 6, QTableWidgetItem(entry.get("cmd", "")))
-
-    def _clear_layout(self, layout):
-        """
-        ================================================================================
-        Recursively clear all widgets and layouts from a layout.
-        ================================================================================
-        """
-        while layout.count():
-            item = layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                self._clear_layout(item.layout())
-
-    @staticmethod
-    def time_to_seconds(time_str):
-        """
-        ================================================================================
-        Convert time string (hh:mm:ss or mm:ss) to seconds.
-        ================================================================================
-        """
-        parts = time_str.split(':')
-        if len(parts) == 2:  # mm:ss
-            return int(parts[0]) * 60 + int(parts[1])
-        elif len(parts) == 3:  # hh:mm:ss
-            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-        return 0
-
-    @staticmethod
-    def _safe_float(value):
-        """
-        ================================================================================
-        Safe float conversion.
-        ================================================================================
-        """
-        try:
-            return float(value)
-        except Exception:
-            return 0.0
-
-    @staticmethod
-    def _safe_div(num, denom):
+    def _create_bar_row(self):
         """
         ================================================================================
-        Safe division.
+        Create one pooled row of the execution-times panel: a name and a bar.
         ================================================================================
         """
-        try:
-            return round(num / denom, 2) if denom else 0.0
-        except Exception:
-            return 0.0
+        row = QWidget()
+        hbox = QHBoxLayout()
+        hbox.setContentsMargins(0, 8, 0, 8) #espace entre chaque barre
+        hbox.setSpacing(20) #taille de la barre
+
+        label_name = QLabel("")
+        style_script_label(label_name)
+        hbox.addWidget(label_name)
+
+        bar = QProgressBar()
+        bar.setMaximum(100)
+        bar.setTextVisible(False)
+        style_script_progress_bar(bar)
+        hbox.addWidget(bar, stretch=1)
+
+        row.setLayout(hbox)
+        self.scripts_bar_layout.addWidget(row)
+        return row, label_name, bar
+
+    # Conversions live in scriptscope/snapshot.py, shared with `scriptscope top`; kept as
+    # attributes for callers of the window.
+    time_to_seconds = staticmethod(time_to_seconds)
+    _safe_float = staticmethod(safe_float)
+    _safe_div = staticmethod(safe_div)
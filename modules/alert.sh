@@ -1,16 +1,26 @@
 #!/bin/bash
 # alert.sh - Alerts if resource usage exceeds thresholds
 
+# Thresholds used by the shell engine only; the daemon reads config/alerts.conf.
 CPU_THRESHOLD=50
 MEM_THRESHOLD=30
 
 # Always resolve the project root
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+export PYTHONPATH="$PROJECT_ROOT${PYTHONPATH:+:$PYTHONPATH}"
 
-"$PROJECT_ROOT/modules/monitor.sh" | while read -r line; do
-  cpu=$(echo "$line" | awk '{print $3}')
-  mem=$(echo "$line" | awk '{print $4}')
+# The daemon evaluates the rules on every snapshot and publishes the alerts
+# that are firing; notifications are appended to alerts.log.
+if [[ "${SCRIPTSCOPE_ENGINE:-python}" == "python" ]]; then
+  exec python3 -m scriptscope alerts
+fi
+
+"$PROJECT_ROOT/modules/monitor.sh" | while IFS= read -r line; do
+  IFS='|' read -r _ _ cpu mem _ <<< "$line"
+  cpu="${cpu// /}"
+  mem="${mem// /}"
+  [[ "$cpu" == "-" || -z "$cpu" ]] && continue
   if (( $(echo "$cpu > $CPU_THRESHOLD" | bc -l) )); then
     echo "ALERT: High CPU usage detected: $line"
   fi
@@ -1,15 +1,33 @@
 #!/bin/bash
 # exporter.sh - Exports monitoring data to CSV
+#
+#   exporter.sh                  write the latest snapshot to a new CSV file
+#   exporter.sh --follow [OPTS]  export every snapshot to rotating files until
+#                                stopped (see python3 -m scriptscope export -h)
 
 # Always resolve the project root
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+export PYTHONPATH="$PROJECT_ROOT${PYTHONPATH:+:$PYTHONPATH}"
 
 # Ensure logs directory exists
 LOG_DIR="$PROJECT_ROOT/logs"
 mkdir -p "$LOG_DIR"
 
+if [[ "$1" == "--follow" ]]; then
+  if [[ "${SCRIPTSCOPE_ENGINE:-python}" != "python" ]]; then
+    echo "Continuous export requires the python engine" >&2
+    exit 1
+  fi
+  exec python3 -m scriptscope export --dir "$LOG_DIR" "${@:2}"
+fi
+
 OUTPUT="$LOG_DIR/monitoring_$(date +%F_%H-%M-%S).csv"
-echo "script_name,pid,cpu,mem,elapsed_time,command" > "$OUTPUT"
-"$PROJECT_ROOT/modules/monitor.sh" | awk '{print $1","$2","$3","$4","$5","$6}' >> "$OUTPUT"
+if [[ "${SCRIPTSCOPE_ENGINE:-python}" == "python" ]]; then
+  # Latest snapshot of the monitor daemon, with commands quoted as CSV fields.
+  python3 -m scriptscope show --format csv > "$OUTPUT"
+else
+  echo "script_name,pid,cpu,mem,elapsed_time,command" > "$OUTPUT"
+  "$PROJECT_ROOT/modules/monitor.sh" | awk '{print $1","$2","$3","$4","$5","$6}' >> "$OUTPUT"
+fi
 echo "Exported to $OUTPUT"
@@ -3,13 +3,42 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
 CONFIG_FILE="$PROJECT_ROOT/config/scripts.conf"
-OUTPUT_JSON="$PROJECT_ROOT/stats.json"
+STATS_JSON="$PROJECT_ROOT/stats.json"
+# Written to a temp file next to stats.json and renamed at the end, so readers
+# never see a half-written snapshot.
+OUTPUT_JSON="$(mktemp "$PROJECT_ROOT/.stats.json.XXXXXX.tmp")"
+trap 'rm -f "$OUTPUT_JSON"' EXIT
 
 output_terminal=""
 first=1
 
 echo "[" > "$OUTPUT_JSON"
 
+# Script paths of scripts.conf: the plain lines, [<path>] sections and the
+# "scripts =" lists of [group] sections. Per-script settings need the Python engine.
+config_paths() {
+  awk '
+    /^[[:space:]]*(#|$)/ { next }
+    /^[[:space:]]*\[.*\][[:space:]]*$/ {
+      title = $0
+      gsub(/^[[:space:]]*\[[[:space:]]*|[[:space:]]*\][[:space:]]*$/, "", title)
+      in_section = 1
+      if (title != "defaults" && title !~ /^group[[:space:]]/ && !seen[title]++) print title
+      next
+    }
+    in_section {
+      key = $0; sub(/=.*/, "", key); gsub(/[[:space:]]/, "", key)
+      if (key == "scripts") {
+        value = $0; sub(/^[^=]*=/, "", value)
+        n = split(value, paths)
+        for (i = 1; i <= n; i++) if (!seen[paths[i]]++) print paths[i]
+      }
+      next
+    }
+    { gsub(/^[[:space:]]+|[[:space:]]+$/, ""); if (!seen[$0]++) print }
+  ' "$CONFIG_FILE"
+}
+
 while IFS= read -r script_path; do
   [[ -z "$script_path" ]] && continue
   script_name=$(basename "$script_path")
@@ -43,9 +72,11 @@ while IFS= read -r script_path; do
     first=0
     echo "  { \"script_name\": \"$script_name\", \"pid\": \"-\", \"cpu\": \"-\", \"mem\": \"-\", \"etime\": \"-\", \"cmd\": \"(not running)\" }" >> "$OUTPUT_JSON"
   fi
-done < "$CONFIG_FILE"
+done < <(config_paths)
 
 echo "]" >> "$OUTPUT_JSON"
+chmod 644 "$OUTPUT_JSON"
+mv -f "$OUTPUT_JSON" "$STATS_JSON"
 
 if [ -t 1 ]; then
   printf "%s" "$output_terminal"
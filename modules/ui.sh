@@ -3,6 +3,13 @@
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+export PYTHONPATH="$PROJECT_ROOT${PYTHONPATH:+:$PYTHONPATH}"
+
+# The python engine has a curses dashboard fed by the monitor daemon, which
+# redraws only what changed; the shell engine keeps the clear-and-print loop.
+if [[ "${SCRIPTSCOPE_ENGINE:-python}" == "python" ]]; then
+  exec python3 -m scriptscope top "$@"
+fi
 
 while true; do
     clear
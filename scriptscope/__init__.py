@@ -0,0 +1,45 @@
+# This file marks the 'scriptscope' directory as a Python package.
+# It holds the monitoring engine shared by the GUI and the shell modules.
+#
+# The public types are imported lazily on first access, so `import scriptscope`
+# stays cheap for collectors that only need part of the engine, and nothing
+# here depends on PyQt:
+#
+#     from scriptscope import Sampler
+#     snapshot = Sampler(["backup.sh"]).snapshot()
+
+import importlib
+
+_EXPORTS = {
+    "Sampler": "sampler",
+    "ProcessSample": "sampler",
+    "Snapshot": "snapshot",
+    "ScriptMatcher": "matcher",
+    "SnapshotReader": "publish",
+    "SnapshotWriter": "publish",
+    "load_snapshot": "publish",
+    "SharedMapReader": "sharedmap",
+    "Recording": "recording",
+    "load_scripts": "config",
+    "load_config": "config",
+    "ScriptConfig": "config",
+    "safe_float": "snapshot",
+    "safe_div": "snapshot",
+    "time_to_seconds": "snapshot",
+    "format_rate": "snapshot",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'scriptscope' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
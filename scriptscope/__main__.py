@@ -0,0 +1,258 @@
+"""
+===========================================================================================
+ScriptScope command line
+-------------------------------------------------------------------------------------------
+Entry point for `python3 -m scriptscope <command>`, used by bin/scriptscope.sh.
+===========================================================================================
+"""
+
+import argparse
+
+from .config import (
+    ALERTS_FILE, CONFIG_FILE, EXPORT_DIR, HISTORY_DIR, MAP_FILE, PID_FILE,
+    REPLAY_SOCKET_FILE, REPLAY_STATS_FILE, SOCKET_FILE, STATS_FILE,
+)
+from .matcher import MODES, SUBSTRING
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="scriptscope")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    monitor = commands.add_parser("monitor", help="sample the configured scripts once")
+    monitor.add_argument("--config", default=CONFIG_FILE, help="scripts.conf to read")
+    monitor.add_argument("--output", default=STATS_FILE, help="stats file to write")
+    monitor.add_argument("--match", choices=MODES, default=SUBSTRING,
+                         help="match script names anywhere in the command line "
+                              "(substring) or only as the program or the script of an interpreter "
+                              "(exact)")
+    monitor.add_argument("--no-children", action="store_true",
+                         help="do not include the child processes of the scripts")
+
+    daemon = commands.add_parser("daemon", help="sample the configured scripts continuously")
+    daemon.add_argument("--config", default=CONFIG_FILE, help="scripts.conf to read")
+    daemon.add_argument("--output", default=STATS_FILE, help="stats file to write")
+    daemon.add_argument("--match", choices=MODES, default=SUBSTRING,
+                        help="script name matching mode, as for monitor")
+    daemon.add_argument("--no-children", action="store_true",
+                        help="do not include the child processes of the scripts")
+    daemon.add_argument("--cgroup", action="store_true",
+                        help="account scripts through per-script cgroup v2 groups")
+    daemon.add_argument("--cgroup-root", help="parent cgroup directory of the groups")
+    daemon.add_argument("--interval", type=float, default=1.0,
+                        help="sampling interval in seconds (sub-second values allowed)")
+    daemon.add_argument("--pid-file", default=PID_FILE, help="pid file of the daemon")
+    daemon.add_argument("--socket", default=SOCKET_FILE, help="stream socket to serve")
+    daemon.add_argument("--no-socket", action="store_true", help="do not serve the stream")
+    daemon.add_argument("--no-file", action="store_true", help="do not write the stats file")
+    daemon.add_argument("--history", default=HISTORY_DIR,
+                        help="directory of the on-disk history rollups")
+    daemon.add_argument("--no-history", action="store_true", help="do not keep history")
+    daemon.add_argument("--alerts", default=ALERTS_FILE, help="alert rules to evaluate")
+    daemon.add_argument("--no-alerts", action="store_true", help="do not evaluate alerts")
+    daemon.add_argument("--collector", metavar="HOST:PORT",
+                        help="also push the snapshots to this collector (agent mode)")
+    daemon.add_argument("--host-name", help="name of this host at the collector")
+    daemon.add_argument("--no-events", action="store_true",
+                        help="scan /proc on every tick instead of using process events")
+    daemon.add_argument("--supervise", action="store_true",
+                        help="launch the configured scripts and restart them when they fail")
+    daemon.add_argument("--restart", choices=("on-failure", "always"), default="on-failure",
+                        help="with --supervise, which exits to restart after (default: "
+                             "on-failure)")
+    daemon.add_argument("--map", nargs="?", const=MAP_FILE, metavar="PATH",
+                        help="also publish into a memory-mapped file (default: "
+                             "scriptscope.map)")
+    daemon.add_argument("--metrics", metavar="HOST:PORT",
+                        help="serve Prometheus metrics on this address (e.g. 127.0.0.1:9878)")
+
+    collector = commands.add_parser("collector",
+                                    help="merge the snapshots pushed by remote agents")
+    collector.add_argument("--listen", default="127.0.0.1:7878", metavar="HOST:PORT",
+                           help="address to accept agents on; agents are not authenticated, "
+                                "use 0.0.0.0:7878 only on a trusted network")
+    collector.add_argument("--output", default=STATS_FILE, help="stats file to write")
+    collector.add_argument("--socket", default=SOCKET_FILE, help="stream socket to serve")
+    collector.add_argument("--no-socket", action="store_true", help="do not serve the stream")
+    collector.add_argument("--no-file", action="store_true",
+                           help="do not write the stats file")
+    collector.add_argument("--interval", type=float, default=1.0,
+                           help="publishing interval in seconds")
+    collector.add_argument("--stale-after", type=float, default=10.0,
+                           help="forget hosts not heard from for this many seconds")
+
+    profile = commands.add_parser("profile",
+                                  help="start or stop profiling the running daemon")
+    profile.add_argument("--pid-file", default=PID_FILE, help="pid file of the daemon")
+
+    show = commands.add_parser("show", help="print the snapshot published by the daemon")
+    show.add_argument("--input", default=STATS_FILE, help="stats file to read")
+    show.add_argument("--format", choices=("table", "csv"), default="table")
+
+    alerts = commands.add_parser("alerts", help="print the alerts currently firing")
+    alerts.add_argument("--input", default=STATS_FILE, help="stats file to read")
+
+    launch = commands.add_parser("launch", help="run a script inside its cgroup")
+    launch.add_argument("--cgroup-root", help="parent cgroup directory of the groups")
+    launch.add_argument("script", help="script to run")
+    launch.add_argument("args", nargs=argparse.REMAINDER, help="arguments of the script")
+
+    stream = commands.add_parser("stream", help="print the daemon's snapshots as JSON lines")
+    stream.add_argument("--socket", default=SOCKET_FILE, help="stream socket to connect to")
+    stream.add_argument("--script", action="append", dest="scripts",
+                        help="only receive this script (repeatable)")
+
+    top = commands.add_parser("top", help="terminal dashboard")
+    top.add_argument("--socket", default=SOCKET_FILE, help="stream socket to connect to")
+    top.add_argument("--config", default=CONFIG_FILE,
+                     help="scripts.conf to sample when no daemon is running")
+    top.add_argument("--interval", type=float, default=1.0,
+                     help="sampling interval when no daemon is running")
+    top.add_argument("--match", choices=MODES, default=SUBSTRING,
+                     help="script name matching mode, as for monitor")
+
+    export = commands.add_parser("export", help="export the daemon's snapshots to files")
+    export.add_argument("--socket", default=SOCKET_FILE, help="stream socket to connect to")
+    export.add_argument("--script", action="append", dest="scripts",
+                        help="only export this script (repeatable)")
+    export.add_argument("--dir", default=EXPORT_DIR, help="directory of the export files")
+    export.add_argument("--format", choices=("csv", "jsonl", "columnar"), default="csv")
+    export.add_argument("--compress", choices=("none", "gzip", "zstd"), default="none")
+    export.add_argument("--rotate-size", default="64M",
+                        help="start a new file after this size (e.g. 64M)")
+    export.add_argument("--rotate-interval", type=float, default=3600,
+                        help="start a new file after this many seconds")
+    export.add_argument("--max-bytes", default="4G",
+                        help="delete the oldest files beyond this total size")
+    export.add_argument("--max-age", type=float, default=7 * 24 * 3600,
+                        help="delete files older than this many seconds")
+
+    replay = commands.add_parser("replay", help="play a recorded export back to the GUI")
+    replay.add_argument("file", help="csv, jsonl or columnar export (.gz and .zst too)")
+    replay.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed (2 plays twice as fast)")
+    replay.add_argument("--start", help="position to start from (+10m, 14:05, ...)")
+    replay.add_argument("--end", help="position to stop at")
+    replay.add_argument("--loop", action="store_true", help="start over at the end")
+    replay.add_argument("--max-gap", type=float, default=5.0,
+                        help="shorten pauses in the recording to this many seconds")
+    replay.add_argument("--output", default=REPLAY_STATS_FILE, help="stats file to write")
+    replay.add_argument("--socket", default=REPLAY_SOCKET_FILE, help="stream socket to serve")
+    replay.add_argument("--no-gui", action="store_true", help="do not start the GUI")
+
+    analyze = commands.add_parser("analyze", help="summarize recorded exports per script")
+    analyze.add_argument("files", nargs="+", help="csv, jsonl or columnar exports")
+    analyze.add_argument("--start", help="position to start from (+10m, 14:05, ...)")
+    analyze.add_argument("--end", help="position to stop at")
+    analyze.add_argument("--top", type=int, default=20,
+                         help="number of scripts to list (0 for all)")
+    analyze.add_argument("--json", action="store_true", help="print the summary as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "monitor":
+        from .monitor import run_once
+        run_once(args.config, args.output, match_mode=args.match,
+                 children=not args.no_children)
+    elif args.command == "daemon":
+        if args.interval <= 0:
+            build_parser().error("--interval must be positive")
+        from .daemon import run_daemon
+        return run_daemon(args.config, None if args.no_file else args.output, args.interval,
+                          args.match, args.pid_file, None if args.no_socket else args.socket,
+                          None if args.no_history else args.history, not args.no_children,
+                          args.cgroup, args.cgroup_root,
+                          None if args.no_alerts else args.alerts,
+                          _address(args.collector) if args.collector else None,
+                          args.host_name, _metrics_address(args.metrics), args.map,
+                          not args.no_events, args.supervise, args.restart)
+    elif args.command == "collector":
+        if args.interval <= 0:
+            build_parser().error("--interval must be positive")
+        from .cluster import run_collector
+        return run_collector(_address(args.listen),
+                             None if args.no_file else args.output,
+                             None if args.no_socket else args.socket,
+                             args.interval, args.stale_after)
+    elif args.command == "profile":
+        return _profile(args.pid_file)
+    elif args.command == "show":
+        from .monitor import show
+        return show(args.input, args.format)
+    elif args.command == "alerts":
+        from .alerts import show_active
+        return show_active(args.input)
+    elif args.command == "launch":
+        from .cgroup import launch
+        launch(args.script, args.args, args.cgroup_root)
+    elif args.command == "stream":
+        from .stream import print_stream
+        return print_stream(args.socket, args.scripts)
+    elif args.command == "top":
+        if args.interval <= 0:
+            build_parser().error("--interval must be positive")
+        from .top import run_dashboard
+        return run_dashboard(args.socket, args.config, args.interval, args.match)
+    elif args.command == "export":
+        return _export(args)
+    elif args.command == "replay":
+        if args.speed <= 0:
+            build_parser().error("--speed must be positive")
+        from .replay import run_replay
+        return run_replay(args.file, args.speed, args.start, args.end, args.loop,
+                          args.max_gap, args.output, args.socket, not args.no_gui)
+    elif args.command == "analyze":
+        from .analysis import run_analysis
+        return run_analysis(args.files, args.start, args.end, args.top, args.json)
+    return 0
+
+
+def _address(text, default_host="127.0.0.1", default_port=None):
+    from .cluster import DEFAULT_PORT, parse_address
+    try:
+        return parse_address(text, default_host, default_port or DEFAULT_PORT)
+    except ValueError as e:
+        build_parser().error(str(e))
+
+
+def _metrics_address(text):
+    if not text:
+        return None
+    from .metrics import DEFAULT_PORT
+    return _address(text, default_port=DEFAULT_PORT)
+
+
+def _profile(pid_file):
+    import os
+    import signal
+    import sys
+    from .daemon import read_pid_file
+    pid = read_pid_file(pid_file)
+    if pid is None:
+        print("scriptscope: no daemon running", file=sys.stderr)
+        return 1
+    os.kill(pid, signal.SIGUSR1)
+    print(f"scriptscope: profiling toggled in daemon {pid} (profiles/)")
+    return 0
+
+
+def _export(args):
+    import signal
+    from .export import Exporter, RotatingWriter, parse_size
+    try:
+        writer = RotatingWriter(args.dir, args.format, args.compress,
+                                rotate_bytes=parse_size(args.rotate_size),
+                                rotate_seconds=args.rotate_interval,
+                                max_bytes=parse_size(args.max_bytes), max_age=args.max_age)
+    except ValueError as e:
+        build_parser().error(str(e))
+    exporter = Exporter(writer, args.socket, args.scripts)
+    signal.signal(signal.SIGTERM, lambda signum, frame: exporter.stop())
+    return exporter.run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
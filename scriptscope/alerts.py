@@ -0,0 +1,303 @@
+"""
+===========================================================================================
+ScriptScope alerts
+-------------------------------------------------------------------------------------------
+Threshold rules evaluated inside the monitor against every snapshot, replacing the
+per-line awk/bc pipeline of modules/alert.sh. Rules are read from config/alerts.conf, one
+per line:
+
+    <script|*>  <metric> <op> <threshold>  [for <duration>]  [clear <value>]
+
+    *               cpu > 50
+    *               mem > 30
+    cpu_stress.sh   cpu > 80 for 30s clear 60
+
+Scripts can also carry their own rules in scripts.conf (`alert = cpu > 80`, see
+config.py); the daemon adds them to these.
+
+A rule fires once its condition has held for the whole duration, and recovers only when
+the value crosses back past the clear value (the threshold by default), which gives
+hysteresis against flapping. Each transition is notified once; a condition that keeps
+firing is reminded at most every `cooldown` seconds.
+
+Evaluation is column-wise: a snapshot is turned into one array per metric holding the
+per-script totals, and every rule on that metric is applied to the whole column at once.
+===========================================================================================
+"""
+
+import operator
+import re
+import sys
+import time
+from array import array
+
+from .config import ALERT_LOG, ALERTS_FILE, STATS_FILE
+from .publish import load_snapshot
+from .sampler import IO_COUNTERS, IO_RATES
+
+# Numeric fields of the snapshot records that rules can test.
+METRICS = ("cpu", "cpu_total", "mem") + IO_COUNTERS + IO_RATES
+OPERATORS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+}
+# Recovery tests: the opposite of the firing comparison, against the clear value.
+_RECOVERS = {">": operator.le, ">=": operator.lt, "<": operator.ge, "<=": operator.gt}
+_UNITS = {"": 1, "ms": 0.001, "s": 1, "m": 60, "h": 3600}
+DEFAULT_COOLDOWN = 300.0
+
+_RULE = re.compile(
+    r"^(?P<script>\S+)\s+(?P<metric>\w+)\s*(?P<op>>=|<=|>|<)\s*(?P<threshold>[-+\d.eE]+)"
+    r"(?:\s+for\s+(?P<duration>[\d.]+)(?P<unit>ms|s|m|h)?)?"
+    r"(?:\s+clear\s+(?P<clear>[-+\d.eE]+))?\s*$"
+)
+
+
+class Rule:
+    """
+    ================================================================================
+    One threshold rule. script is a script name or "*" for every script.
+    ================================================================================
+    """
+    __slots__ = ("script", "metric", "op", "threshold", "duration", "clear", "text")
+
+    def __init__(self, script, metric, op, threshold, duration=0.0, clear=None, text=None):
+        if op not in OPERATORS:
+            raise ValueError(f"unknown operator: {op!r}")
+        self.script = script
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.duration = duration
+        self.clear = threshold if clear is None else clear
+        self.text = text or f"{metric} {op} {threshold:g}"
+
+    def __repr__(self):
+        return f"Rule({self.script} {self.text})"
+
+
+def parse_rules(lines):
+    """
+    ================================================================================
+    Parse rule lines. Blank lines and '#' comments are skipped; a malformed line
+    or an unknown metric raises ValueError with its line number.
+    ================================================================================
+    """
+    rules = []
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        m = _RULE.match(line)
+        if not m:
+            raise ValueError(f"line {number}: cannot parse rule: {line!r}")
+        if m.group("metric") not in METRICS:
+            raise ValueError(f"line {number}: unknown metric {m.group('metric')!r} "
+                             f"(one of {', '.join(METRICS)})")
+        duration = float(m.group("duration") or 0) * _UNITS[m.group("unit") or ""]
+        clear = m.group("clear")
+        rules.append(Rule(
+            m.group("script"), m.group("metric"), m.group("op"), float(m.group("threshold")),
+            duration, float(clear) if clear is not None else None,
+            line.split(None, 1)[1],
+        ))
+    return rules
+
+
+def load_rules(path=ALERTS_FILE):
+    with open(path, "r") as f:
+        return parse_rules(f)
+
+
+def _value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AlertEngine:
+    """
+    ================================================================================
+    Evaluates rules against snapshots and keeps the state of every (rule, script)
+    pair. evaluate() returns the notifications produced by a snapshot; `active`
+    lists the conditions currently firing.
+    ================================================================================
+    """
+
+    def __init__(self, rules, cooldown=DEFAULT_COOLDOWN, clock=time.time):
+        self.cooldown = cooldown
+        self.clock = clock
+        self.rules = []
+        # (rule index, script) -> [breach start, firing, last notification]
+        self._state = {}
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        """
+        ================================================================================
+        Replace the rules. Rules that are unchanged (same script and text) keep
+        their state, so a config reload neither re-fires nor drops their alerts.
+        ================================================================================
+        """
+        kept = {(self.rules[index].script, self.rules[index].text, script): state
+                for (index, script), state in self._state.items()}
+        self.rules = list(rules)
+        self._by_metric = {}
+        for index, rule in enumerate(self.rules):
+            self._by_metric.setdefault(rule.metric, []).append(index)
+        position = {(rule.script, rule.text): index for index, rule in enumerate(self.rules)}
+        self._state = {}
+        for (rule_script, text, script), state in kept.items():
+            index = position.get((rule_script, text))
+            if index is not None:
+                self._state[(index, script)] = state
+
+    def _columns(self, records):
+        """
+        ================================================================================
+        Sum the records per script into one array per metric used by the rules.
+        Missing values ("-") count as 0; a script with no running process is NaN,
+        so no comparison fires for it.
+        ================================================================================
+        """
+        scripts = []
+        position = {}
+        columns = {metric: array("d") for metric in self._by_metric}
+        for r in records:
+            name = r.get("script_name", "")
+            i = position.get(name)
+            running = r.get("pid") not in (None, "-")
+            if i is None:
+                i = position[name] = len(scripts)
+                scripts.append(name)
+                for column in columns.values():
+                    column.append(0.0 if running else float("nan"))
+            for metric, column in columns.items():
+                value = _value(r.get(metric))
+                if value is not None:
+                    column[i] = (0.0 if column[i] != column[i] else column[i]) + value
+        return scripts, columns
+
+    def evaluate(self, records, now=None, keep=()):
+        """
+        ================================================================================
+        Evaluate every rule against one snapshot. Returns a list of notification
+        dicts: {"state": "firing"|"resolved", "script", "rule", "value", "time"}.
+        The scripts in keep were not sampled this time and keep their state.
+        ================================================================================
+        """
+        now = self.clock() if now is None else now
+        scripts, columns = self._columns(records)
+        notifications = []
+        seen = set()
+        for metric, indexes in self._by_metric.items():
+            column = columns[metric]
+            for index in indexes:
+                rule = self.rules[index]
+                fires, recovers = OPERATORS[rule.op], _RECOVERS[rule.op]
+                if rule.script == "*":
+                    targets = range(len(scripts))
+                else:
+                    targets = [i for i, name in enumerate(scripts) if name == rule.script]
+                breached = [fires(column[i], rule.threshold) for i in targets]
+                cleared = [recovers(column[i], rule.clear) or column[i] != column[i]
+                           for i in targets]
+                for i, hit, ok in zip(targets, breached, cleared):
+                    key = (index, scripts[i])
+                    seen.add(key)
+                    self._step(key, rule, column[i], hit, ok, now, notifications)
+        # Scripts that disappeared from the snapshot recover.
+        for key in [k for k in self._state if k not in seen and k[1] not in keep]:
+            state = self._state.pop(key)
+            if state[1]:
+                notifications.append(self._notice("resolved", key, None, now))
+        return notifications
+
+    def _step(self, key, rule, value, hit, ok, now, notifications):
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = [None, False, None]
+        if not state[1]:
+            if not hit:
+                state[0] = None
+                return
+            if state[0] is None:
+                state[0] = now
+            if now - state[0] >= rule.duration:
+                state[1] = True
+                state[2] = now
+                notifications.append(self._notice("firing", key, value, now))
+        elif ok:
+            state[0] = None
+            state[1] = False
+            notifications.append(self._notice("resolved", key, value, now))
+        elif now - state[2] >= self.cooldown:
+            state[2] = now
+            notifications.append(self._notice("firing", key, value, now))
+
+    def _notice(self, state, key, value, now):
+        rule = self.rules[key[0]]
+        return {"state": state, "script": key[1], "rule": rule.text,
+                "metric": rule.metric, "value": value, "time": now}
+
+    @property
+    def active(self):
+        """
+        ================================================================================
+        The (script, rule text) pairs currently firing.
+        ================================================================================
+        """
+        return [{"script": script, "rule": self.rules[index].text}
+                for (index, script), state in self._state.items() if state[1]]
+
+
+def format_notification(notice):
+    """
+    ================================================================================
+    Format a notification as the ALERT/RESOLVED line printed by alert.sh.
+    ================================================================================
+    """
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(notice["time"]))
+    if notice["state"] == "firing":
+        return (f"{stamp} ALERT: {notice['script']}: {notice['rule']} "
+                f"(current {notice['metric']} = {notice['value']:.1f})")
+    return f"{stamp} RESOLVED: {notice['script']}: {notice['rule']}"
+
+
+class AlertLog:
+    """
+    ================================================================================
+    Appends notifications to a log file (and optionally a stream such as stderr).
+    ================================================================================
+    """
+
+    def __init__(self, path=ALERT_LOG, stream=None):
+        self.path = path
+        self.stream = stream
+
+    def __call__(self, notifications):
+        if not notifications:
+            return
+        lines = "".join(format_notification(n) + "\n" for n in notifications)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(lines)
+        if self.stream:
+            self.stream.write(lines)
+            self.stream.flush()
+
+
+def show_active(stats_path=STATS_FILE, out=sys.stdout):
+    """
+    ================================================================================
+    Print the alerts firing in the latest published snapshot, one ALERT line each.
+    Returns 1 when no snapshot is available yet.
+    ================================================================================
+    """
+    try:
+        snapshot = load_snapshot(stats_path)
+    except (OSError, ValueError):
+        return 1
+    for alert in snapshot.get("alerts") or ():
+        print(f"ALERT: {alert['script']}: {alert['rule']}", file=out)
+    return 0
@@ -0,0 +1,223 @@
+"""
+===========================================================================================
+ScriptScope analysis
+-------------------------------------------------------------------------------------------
+Offline summary of recordings (`scriptscope analyze <file>...`, see recording.py). For
+every script: the number of snapshots it appears in, and the mean, p50, p95, p99 and peak
+of its CPU and memory, summed over its processes in each snapshot as in the history, with
+the time of the peak. Scripts are listed worst first (by p95 CPU), followed by the top
+offenders of each metric.
+
+It is a single streaming pass: snapshots are read one at a time and each script keeps a
+QuantileSketch per metric (runstats.py), so memory depends on the number of scripts, not
+on the length of the recordings.
+===========================================================================================
+"""
+
+import json
+import sys
+
+from .recording import Recording, format_time, parse_position
+from .runstats import QuantileSketch
+from .snapshot import display_name
+
+METRICS = ("cpu", "mem")
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_TOP = 20
+OFFENDERS = 3
+ROW_FORMAT = "{:<24} {:>8}  {:>7} {:>7} {:>7} {:>7} {:>7}  {:>7} {:>7} {:>7}"
+
+
+class MetricSummary:
+    """
+    ================================================================================
+    Running count, mean, peak and quantile sketch of one metric of one script.
+    ================================================================================
+    """
+    __slots__ = ("count", "total", "peak", "peak_time", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.peak = None
+        self.peak_time = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value, timestamp):
+        self.count += 1
+        self.total += value
+        self.sketch.add(value)
+        if self.peak is None or value > self.peak:
+            self.peak = value
+            self.peak_time = timestamp
+
+    def summary(self):
+        summary = {
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "peak": self.peak, "peak_time": self.peak_time,
+        }
+        for q in QUANTILES:
+            value = self.sketch.quantile(q)
+            summary[f"p{round(q * 100)}"] = None if value is None else round(value, 3)
+        return summary
+
+
+class ScriptSummary:
+    """
+    ================================================================================
+    Summary of one script over the recordings.
+    ================================================================================
+    """
+    __slots__ = ("name", "samples", "first", "last", "metrics")
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = 0
+        self.first = None
+        self.last = None
+        self.metrics = {metric: MetricSummary() for metric in METRICS}
+
+    def to_dict(self):
+        data = {"samples": self.samples, "first": self.first, "last": self.last}
+        for metric, values in self.metrics.items():
+            data[metric] = values.summary()
+        return data
+
+
+class Analysis:
+    """
+    ================================================================================
+    Accumulates snapshots into ScriptSummary objects, one snapshot at a time.
+    ================================================================================
+    """
+
+    def __init__(self):
+        self.scripts = {}
+        self.snapshots = 0
+        self.first = None
+        self.last = None
+
+    def add(self, snapshot):
+        timestamp = snapshot.get("timestamp")
+        self.snapshots += 1
+        if timestamp is not None:
+            if self.first is None or timestamp < self.first:
+                self.first = timestamp
+            if self.last is None or timestamp > self.last:
+                self.last = timestamp
+        totals = {}
+        for record in snapshot.get("scripts") or ():
+            values = totals.setdefault(display_name(record) or "-", {})
+            for metric in METRICS:
+                value = record.get(metric)
+                if isinstance(value, str):
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        value = None
+                if value is not None:
+                    values[metric] = values.get(metric, 0.0) + value
+        for name, values in totals.items():
+            script = self.scripts.get(name)
+            if script is None:
+                script = self.scripts[name] = ScriptSummary(name)
+            script.samples += 1
+            if script.first is None:
+                script.first = timestamp
+            script.last = timestamp
+            for metric, value in values.items():
+                script.metrics[metric].add(value, timestamp)
+
+    def ranked(self, metric="cpu", key="p95"):
+        """
+        ================================================================================
+        The script summaries, worst first by one statistic of a metric.
+        ================================================================================
+        """
+        def value(script):
+            stat = script.metrics[metric].summary().get(key)
+            return -1.0 if stat is None else stat
+        return sorted(self.scripts.values(), key=value, reverse=True)
+
+    def to_dict(self):
+        return {"snapshots": self.snapshots, "first": self.first, "last": self.last,
+                "scripts": {name: script.to_dict() for name, script in self.scripts.items()}}
+
+
+def _number(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def format_report(analysis, top=DEFAULT_TOP):
+    """
+    ================================================================================
+    Format the analysis as a table of the `top` worst scripts (0: all) followed
+    by the top offenders of each metric.
+    ================================================================================
+    """
+    if not analysis.snapshots:
+        return "No snapshot in range."
+    lines = [
+        f"{analysis.snapshots} snapshots, {len(analysis.scripts)} scripts, "
+        f"{format_time(analysis.first)} .. {format_time(analysis.last)}"
+        if analysis.first is not None else f"{analysis.snapshots} snapshots",
+        "",
+        ROW_FORMAT.format("script", "samples", "cpu avg", "p50", "p95", "p99", "peak",
+                          "mem avg", "p95", "peak"),
+    ]
+    ranked = analysis.ranked()
+    for script in ranked[:top or None]:
+        cpu, mem = script.metrics["cpu"].summary(), script.metrics["mem"].summary()
+        lines.append(ROW_FORMAT.format(
+            script.name[:24], script.samples,
+            _number(cpu["mean"]), _number(cpu["p50"]), _number(cpu["p95"]),
+            _number(cpu["p99"]), _number(cpu["peak"]),
+            _number(mem["mean"]), _number(mem["p95"]), _number(mem["peak"]),
+        ))
+    if top and len(ranked) > top:
+        lines.append(f"... {len(ranked) - top} more")
+    lines.append("")
+    lines.append("Top offenders:")
+    for metric, key, label in (("cpu", "p95", "p95 CPU"), ("cpu", "peak", "peak CPU"),
+                               ("mem", "peak", "peak MEM")):
+        worst = [s for s in analysis.ranked(metric, key)[:OFFENDERS]
+                 if s.metrics[metric].count]
+        parts = []
+        for script in worst:
+            summary = script.metrics[metric].summary()
+            text = f"{script.name} {_number(summary[key])}%"
+            if key == "peak" and summary["peak_time"] is not None:
+                text += f" at {format_time(summary['peak_time'])}"
+            parts.append(text)
+        lines.append(f"  {label + ':':<10} " + (", ".join(parts) or "-"))
+    return "\n".join(lines)
+
+
+def run_analysis(paths, start=None, end=None, top=DEFAULT_TOP, as_json=False,
+                 out=sys.stdout):
+    """
+    ================================================================================
+    Analyze the recordings in one pass and print the report (or JSON). start and
+    end are positions (see recording.parse_position) in the first recording.
+    Returns 1 when a recording cannot be read or a position is invalid.
+    ================================================================================
+    """
+    analysis = Analysis()
+    bounds = None
+    for path in paths:
+        try:
+            recording = Recording(path)
+            if bounds is None and recording.first is not None:
+                bounds = (parse_position(start, recording.first) if start else None,
+                          parse_position(end, recording.first) if end else None)
+            for snapshot in recording.snapshots(*(bounds or (None, None))):
+                analysis.add(snapshot)
+        except (OSError, ValueError, EOFError) as e:
+            print(f"scriptscope: {path}: {e}", file=sys.stderr)
+            return 1
+    if as_json:
+        json.dump(analysis.to_dict(), out, indent=2)
+        out.write("\n")
+    else:
+        print(format_report(analysis, top), file=out)
+    return 0
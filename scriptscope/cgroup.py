@@ -0,0 +1,270 @@
+"""
+===========================================================================================
+ScriptScope cgroup v2 accounting
+-------------------------------------------------------------------------------------------
+Opt-in accounting mode where every monitored script runs in its own cgroup v2 group,
+<root>/<script name>. The kernel then charges the group for everything its processes
+do, including children that live for a few milliseconds between two ticks, and a tick
+reads one cpu.stat, memory.current, memory.peak and io.stat per script whatever the fork
+rate.
+
+Scripts get into their group either by being launched through `scriptscope launch`, or by
+being adopted: the daemon moves every matched process (and its descendants) that is not
+in the script's group yet. memory.* and io.stat only exist when the memory and io
+controllers are enabled for the groups; the corresponding values are then taken from
+/proc for the processes listed in cgroup.procs instead.
+
+When cgroup v2 is not mounted or the root group cannot be created (no delegation), the
+mode is unavailable and the sampler keeps using /proc alone.
+===========================================================================================
+"""
+
+import os
+import re
+import sys
+import time
+
+from . import procfs
+
+MOUNTINFO = "/proc/self/mountinfo"
+ROOT_NAME = "scriptscope"
+CONTROLLERS = ("cpu", "memory", "io")
+
+
+def find_mount(mountinfo=MOUNTINFO):
+    """
+    ================================================================================
+    Return the mount point of the cgroup v2 hierarchy, or None.
+    ================================================================================
+    """
+    try:
+        with open(mountinfo, "r") as f:
+            for line in f:
+                fields = line.split()
+                sep = fields.index("-")
+                if fields[sep + 1] == "cgroup2":
+                    return fields[4]
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def own_cgroup(pid="self"):
+    """
+    ================================================================================
+    Return the cgroup v2 path of a process, relative to the hierarchy root.
+    ================================================================================
+    """
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+
+def _group_name(script_name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", script_name) or "_"
+
+
+def _read_keyed(path):
+    """
+    ================================================================================
+    Parse "key value" lines (cpu.stat) into a dict of integers.
+    ================================================================================
+    """
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                try:
+                    values[key] = int(value)
+                except ValueError:
+                    pass
+    except OSError:
+        return None
+    return values
+
+
+def _read_int(path):
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_io_stat(path):
+    """
+    ================================================================================
+    Sum the per-device lines of io.stat ("8:0 rbytes=.. wbytes=.. rios=.. ...").
+    ================================================================================
+    """
+    totals = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    try:
+                        totals[key] = totals.get(key, 0) + int(value)
+                    except ValueError:
+                        pass
+    except OSError:
+        return None
+    return totals
+
+
+class CgroupAccounting:
+    """
+    ================================================================================
+    Creates and reads the per-script groups under <mount>/<own cgroup>/scriptscope
+    (or under an explicit root path).
+    ================================================================================
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self.error = None
+        self._prev = {}
+        if root is None:
+            mount = find_mount()
+            path = own_cgroup()
+            if mount is None or path is None:
+                self.error = "cgroup v2 is not mounted"
+                return
+            self.root = os.path.join(mount, path.lstrip("/"), ROOT_NAME)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            self._enable_controllers()
+        except OSError as e:
+            self.error = f"cannot create {self.root}: {e.strerror}"
+
+    @property
+    def available(self):
+        return self.error is None
+
+    def _enable_controllers(self):
+        try:
+            with open(os.path.join(self.root, "cgroup.controllers"), "r") as f:
+                available = f.read().split()
+        except OSError:
+            return
+        for controller in CONTROLLERS:
+            if controller in available:
+                try:
+                    with open(os.path.join(self.root, "cgroup.subtree_control"), "w") as f:
+                        f.write(f"+{controller}")
+                except OSError:
+                    # Not delegated to us: the value comes from /proc instead.
+                    pass
+
+    def group(self, script_name):
+        return os.path.join(self.root, _group_name(script_name))
+
+    def procs(self, script_name):
+        """
+        ================================================================================
+        Return the PIDs currently in a script's group (empty if it does not exist).
+        ================================================================================
+        """
+        try:
+            with open(os.path.join(self.group(script_name), "cgroup.procs"), "r") as f:
+                return [int(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    def attach(self, script_name, pid):
+        """
+        ================================================================================
+        Move a process into a script's group, creating the group if needed.
+        Returns False when the kernel refuses the move.
+        ================================================================================
+        """
+        group = self.group(script_name)
+        try:
+            os.makedirs(group, exist_ok=True)
+            with open(os.path.join(group, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+        except OSError:
+            return False
+        return True
+
+    def read(self, script_name, mem_total_kb, cpu_count, proc_root=procfs.PROC_ROOT):
+        """
+        ================================================================================
+        Read a script's group. Returns None when it holds no process, otherwise a
+        dict with pids, cpu (% of one core since the previous read), cpu_total, mem
+        (% of RAM), mem_peak (bytes or None), read_bytes and write_bytes, and their
+        per-second rates read_rate and write_rate.
+        ================================================================================
+        """
+        pids = self.procs(script_name)
+        if not pids:
+            self._prev.pop(script_name, None)
+            return None
+        group = self.group(script_name)
+        now = time.monotonic()
+        cpu_stat = _read_keyed(os.path.join(group, "cpu.stat")) or {}
+        usage = cpu_stat.get("usage_usec", 0)
+
+        mem_bytes = _read_int(os.path.join(group, "memory.current"))
+        if mem_bytes is None:
+            mem_bytes = 0
+            for pid in pids:
+                status = procfs.read_status(pid, proc_root)
+                if status:
+                    mem_bytes += procfs.status_kb(status, "VmRSS") * 1024
+        mem = mem_bytes / 1024 / mem_total_kb * 100 if mem_total_kb else 0.0
+
+        io = _read_io_stat(os.path.join(group, "io.stat"))
+        if io is not None:
+            read_bytes, write_bytes = io.get("rbytes", 0), io.get("wbytes", 0)
+        else:
+            read_bytes = write_bytes = 0
+            for pid in pids:
+                counters = procfs.read_io(pid, proc_root)
+                if counters:
+                    read_bytes += counters.get("read_bytes", 0)
+                    write_bytes += counters.get("write_bytes", 0)
+
+        prev = self._prev.get(script_name)
+        self._prev[script_name] = (now, usage, read_bytes, write_bytes)
+        cpu = read_rate = write_rate = 0.0
+        if prev is not None and now > prev[0]:
+            elapsed = now - prev[0]
+            cpu = max(usage - prev[1], 0) / 1e6 / elapsed * 100
+            read_rate = max(read_bytes - prev[2], 0) / elapsed
+            write_rate = max(write_bytes - prev[3], 0) / elapsed
+
+        return {
+            "pids": pids,
+            "cpu": cpu,
+            "cpu_total": cpu / cpu_count,
+            "mem": mem,
+            "mem_peak": _read_int(os.path.join(group, "memory.peak")),
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "read_rate": read_rate,
+            "write_rate": write_rate,
+        }
+
+
+def launch(script, args=(), root=None):
+    """
+    ================================================================================
+    Move the current process into the script's group and exec the script, so the
+    script and everything it forks are accounted from the first instruction. If
+    the group cannot be joined, the script runs anyway.
+    ================================================================================
+    """
+    accounting = CgroupAccounting(root)
+    if accounting.available:
+        accounting.attach(os.path.basename(script), os.getpid())
+    else:
+        print(f"scriptscope: cgroup accounting unavailable ({accounting.error})",
+              file=sys.stderr)
+    os.execvp(script, [script] + list(args))
@@ -0,0 +1,524 @@
+"""
+===========================================================================================
+ScriptScope cluster
+-------------------------------------------------------------------------------------------
+Multi-host monitoring. A daemon started with --collector HOST:PORT acts as an agent: on
+top of its usual outputs, it pushes every snapshot over TCP to a central collector, which
+merges the hosts into one snapshot and publishes it like a daemon does (stats.json and the
+stream socket), so the GUI, `top`, alerts and exporters work on the whole fleet unchanged.
+Merged records carry a "host" field.
+
+The protocol is newline-delimited JSON, as on the stream socket:
+
+    agent      {"op": "hello", "host": "worker-3"}
+    agent      {"op": "batch", "snapshots": [<delta>, ...]}
+    collector  {"ack": <seq of the last snapshot applied>}
+
+Snapshots are delta-encoded per connection. Each (script, pid) gets a small integer id
+the first time it is sent ("new": [[id, record]]); after that only the fields that
+changed are sent ("set": [[id, {field: value}]]) and vanished records are listed by id
+("del"). "order" is only sent when the records are not in the order the collector can
+infer. Both sides start from scratch on every connection.
+
+The agent never blocks the sampling loop: snapshots go into a bounded buffer that a
+background thread sends in batches. They leave the buffer once the collector has
+acknowledged them, so a collector restart or a network cut loses nothing until the
+buffer is full; then the oldest snapshots are dropped. Reconnects back off
+exponentially up to RETRY_MAX seconds.
+
+Agents are not authenticated: the collector listens on the loopback interface unless
+told otherwise (`--listen 0.0.0.0:7878`), which should only be done on a trusted network.
+===========================================================================================
+"""
+
+import collections
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+
+from .config import SOCKET_FILE, STATS_FILE
+
+DEFAULT_PORT = 7878
+DEFAULT_BUFFER = 600
+RETRY_MIN = 0.5
+RETRY_MAX = 30.0
+RECV_SIZE = 65536
+MAX_LINE_SIZE = 64 * 1024 * 1024
+STALE_AFTER = 10.0
+
+
+def parse_address(text, default_host="127.0.0.1", default_port=DEFAULT_PORT):
+    """
+    ================================================================================
+    Parse "host:port", ":port", "port" or "host" into a (host, port) tuple.
+    ================================================================================
+    """
+    host, sep, port = str(text).rpartition(":")
+    if not sep:
+        host, port = (default_host, text) if str(text).isdigit() else (text, default_port)
+    try:
+        return (host.strip("[]") or default_host, int(port))
+    except ValueError:
+        raise ValueError(f"invalid address: {text!r}") from None
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _record_key(record):
+    return (record.get("script_name", ""), record.get("pid", ""))
+
+
+class DeltaEncoder:
+    """
+    ================================================================================
+    Agent side of the delta encoding. encode() turns a snapshot payload into the
+    delta against the previous one; reset() starts over (new connection).
+    ================================================================================
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._ids = {}
+        self._records = {}
+        self._order = []
+        self._next_id = 0
+
+    def encode(self, payload):
+        delta = {"seq": payload.get("seq"), "timestamp": payload.get("timestamp")}
+        new, changed, order, present = [], [], [], set()
+        for record in payload.get("scripts", []):
+            key = _record_key(record)
+            ident = self._ids.get(key)
+            if ident is None or ident in present:
+                ident = self._ids[key] = self._next_id
+                self._next_id += 1
+                new.append([ident, record])
+            else:
+                previous = self._records[ident]
+                fields = {k: v for k, v in record.items() if previous.get(k) != v}
+                removed = [k for k in previous if k not in record]
+                if removed:
+                    fields.update(dict.fromkeys(removed))
+                if fields:
+                    changed.append([ident, fields])
+            self._records[ident] = record
+            present.add(ident)
+            order.append(ident)
+        deleted = [ident for ident in self._order if ident not in present]
+        for ident in deleted:
+            del self._records[ident]
+        for key in [k for k, ident in self._ids.items() if ident not in present]:
+            del self._ids[key]
+
+        if new:
+            delta["new"] = new
+        if changed:
+            delta["set"] = changed
+        if deleted:
+            delta["del"] = deleted
+        new_ids = {ident for ident, _ in new}
+        expected = [i for i in self._order if i in present and i not in new_ids]
+        expected += [ident for ident, _ in new]
+        if order != expected:
+            delta["order"] = order
+        self._order = order
+        for name in ("alerts",):
+            if name in payload:
+                delta[name] = payload[name]
+        return delta
+
+
+class DeltaDecoder:
+    """
+    ================================================================================
+    Collector side: rebuilds full snapshot payloads from the deltas of one
+    connection.
+    ================================================================================
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._records = {}
+        self._order = []
+
+    def apply(self, delta):
+        deleted = set(delta.get("del", ()))
+        for ident in deleted:
+            self._records.pop(ident, None)
+        for ident, fields in delta.get("set", ()):
+            record = dict(self._records[ident])
+            for name, value in fields.items():
+                if value is None:
+                    record.pop(name, None)
+                else:
+                    record[name] = value
+            self._records[ident] = record
+        new = delta.get("new", ())
+        for ident, record in new:
+            self._records[ident] = record
+        if "order" in delta:
+            self._order = list(delta["order"])
+        else:
+            new_ids = {ident for ident, _ in new}
+            self._order = [i for i in self._order if i not in deleted and i not in new_ids]
+            self._order += [ident for ident, _ in new]
+        payload = {
+            "seq": delta.get("seq"),
+            "timestamp": delta.get("timestamp"),
+            "scripts": [self._records[ident] for ident in self._order],
+        }
+        if "alerts" in delta:
+            payload["alerts"] = delta["alerts"]
+        return payload
+
+
+class Agent:
+    """
+    ================================================================================
+    Pushes snapshots to a collector from a background thread. publish() only
+    appends to the bounded buffer and never blocks. `dropped` counts the
+    snapshots lost to a full buffer.
+    ================================================================================
+    """
+
+    def __init__(self, address, host_name=None, buffer_size=DEFAULT_BUFFER):
+        self.address = address
+        self.host_name = host_name or default_host_name()
+        self.dropped = 0
+        self.connected = False
+        self._buffer = collections.deque()
+        self._buffer_size = buffer_size
+        self._sent = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="scriptscope-agent",
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def publish(self, payload):
+        with self._cond:
+            if len(self._buffer) >= self._buffer_size:
+                self._buffer.popleft()
+                self.dropped += 1
+                self._sent = max(self._sent - 1, 0)
+            self._buffer.append(payload)
+            self._cond.notify()
+
+    def close(self, timeout=2.0):
+        """
+        ================================================================================
+        Stop the agent, giving it up to `timeout` seconds to send what is buffered.
+        ================================================================================
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._buffer and self.connected and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def _run(self):
+        retry = RETRY_MIN
+        while not self._closing:
+            try:
+                sock = socket.create_connection(self.address, timeout=5.0)
+            except OSError:
+                with self._cond:
+                    self._cond.wait(retry)
+                retry = min(retry * 2, RETRY_MAX)
+                continue
+            retry = RETRY_MIN
+            try:
+                self._session(sock)
+            except OSError:
+                pass
+            finally:
+                self.connected = False
+                sock.close()
+
+    def _session(self, sock):
+        encoder = DeltaEncoder()
+        with self._cond:
+            # Everything not acknowledged is sent again, from a fresh encoder.
+            self._sent = 0
+        sock.settimeout(None)
+        sock.sendall(_encode({"op": "hello", "host": self.host_name}))
+        self.connected = True
+        inbuf = b""
+        while not self._closing:
+            with self._cond:
+                if self._sent >= len(self._buffer):
+                    self._cond.wait(0.5)
+                batch = list(self._buffer)[self._sent:]
+                self._sent += len(batch)
+            if batch:
+                sock.sendall(_encode({"op": "batch",
+                                      "snapshots": [encoder.encode(p) for p in batch]}))
+            inbuf = self._read_acks(sock, inbuf)
+
+    def _read_acks(self, sock, inbuf):
+        sock.setblocking(False)
+        try:
+            while True:
+                try:
+                    data = sock.recv(RECV_SIZE)
+                except BlockingIOError:
+                    break
+                if not data:
+                    raise ConnectionError("collector closed the connection")
+                inbuf += data
+        finally:
+            sock.setblocking(True)
+        *lines, inbuf = inbuf.split(b"\n")
+        for line in lines:
+            try:
+                ack = json.loads(line)["ack"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            with self._cond:
+                while (self._sent and self._buffer
+                       and (self._buffer[0].get("seq") or 0) <= ack):
+                    self._buffer.popleft()
+                    self._sent -= 1
+                self._cond.notify_all()
+        return inbuf
+
+
+class _Connection:
+    __slots__ = ("sock", "inbuf", "host", "decoder")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b""
+        self.host = None
+        self.decoder = DeltaDecoder()
+
+
+class Collector:
+    """
+    ================================================================================
+    Accepts agents on a TCP port from a background thread and keeps the latest
+    snapshot of every host. merged() returns one payload with the records of all
+    the hosts heard from in the last `stale_after` seconds.
+    ================================================================================
+    """
+
+    def __init__(self, address, stale_after=STALE_AFTER, clock=time.monotonic):
+        self.address = address
+        self.stale_after = stale_after
+        self.clock = clock
+        self.changed = threading.Event()
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._connections = {}
+        self._listener = None
+        self._thread = None
+        self._closing = False
+
+    def start(self):
+        listener = socket.socket(socket.AF_INET6 if ":" in self.address[0] else socket.AF_INET)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            listener.bind(self.address)
+            listener.listen(64)
+        except OSError:
+            listener.close()
+            raise
+        listener.setblocking(False)
+        self._listener = listener
+        self.address = listener.getsockname()[:2]
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._serve, name="scriptscope-collector",
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._closing = True
+        if self._thread is not None:
+            self._thread.join()
+
+    def _serve(self):
+        try:
+            while not self._closing:
+                for key, _ in self._selector.select(0.5):
+                    if key.fileobj is self._listener:
+                        self._accept()
+                    else:
+                        self._receive(self._connections[key.fileobj])
+        finally:
+            for conn in list(self._connections.values()):
+                self._drop(conn)
+            self._selector.close()
+            self._listener.close()
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self._connections[sock] = _Connection(sock)
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _receive(self, conn):
+        try:
+            data = conn.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        conn.inbuf += data
+        *lines, conn.inbuf = conn.inbuf.split(b"\n")
+        if len(conn.inbuf) > MAX_LINE_SIZE:
+            self._drop(conn)
+            return
+        for line in lines:
+            if line.strip() and not self._handle(conn, line):
+                self._drop(conn)
+                return
+
+    def _handle(self, conn, line):
+        try:
+            message = json.loads(line)
+            op = message.get("op")
+        except (ValueError, AttributeError):
+            return False
+        if op == "hello":
+            conn.host = str(message.get("host") or conn.sock.getpeername()[0])
+            conn.decoder.reset()
+            return True
+        if op != "batch" or conn.host is None:
+            return False
+        payload = None
+        try:
+            for delta in message.get("snapshots", ()):
+                if not isinstance(delta, dict):
+                    return False
+                payload = conn.decoder.apply(delta)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # A malformed batch only costs that agent its connection.
+            return False
+        if payload is None:
+            return True
+        with self._lock:
+            self._hosts[conn.host] = (self.clock(), payload)
+        self.changed.set()
+        try:
+            conn.sock.send(_encode({"ack": payload.get("seq") or 0}))
+        except OSError:
+            # A full socket buffer only delays the ack until the next batch.
+            pass
+        return True
+
+    def _drop(self, conn):
+        self._connections.pop(conn.sock, None)
+        try:
+            self._selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+    @property
+    def hosts(self):
+        with self._lock:
+            return sorted(self._hosts)
+
+    def merged(self):
+        """
+        ================================================================================
+        Return {"scripts", "alerts", "hosts"}: the records of the live hosts (each
+        with its "host"), their alerts, and when each host was last heard from (in
+        seconds ago).
+        ================================================================================
+        """
+        now = self.clock()
+        records, alerts, hosts = [], [], {}
+        with self._lock:
+            for host in [h for h, (seen, _) in self._hosts.items()
+                         if now - seen > self.stale_after]:
+                del self._hosts[host]
+            items = sorted(self._hosts.items())
+        for host, (seen, payload) in items:
+            hosts[host] = round(now - seen, 3)
+            records.extend(dict(r, host=host) for r in payload.get("scripts", ()))
+            alerts.extend(dict(a, host=host) for a in payload.get("alerts") or ())
+        return {"scripts": records, "alerts": alerts, "hosts": hosts}
+
+
+def run_collector(listen=("127.0.0.1", DEFAULT_PORT), stats_path=STATS_FILE,
+                  socket_path=SOCKET_FILE, interval=1.0, stale_after=STALE_AFTER):
+    """
+    ================================================================================
+    Run a collector in the foreground until SIGTERM or SIGINT, publishing the
+    merged snapshot of all hosts every `interval` seconds to stats_path and the
+    stream socket (either may be None).
+    ================================================================================
+    """
+    from .daemon import FixedRateScheduler
+    from .publish import SnapshotWriter
+
+    collector = Collector(listen, stale_after)
+    try:
+        collector.start()
+    except OSError as e:
+        print(f"scriptscope: cannot listen on {listen[0]}:{listen[1]}: {e}", file=sys.stderr)
+        return 1
+    writer = SnapshotWriter(stats_path) if stats_path else None
+    server = None
+    if socket_path:
+        from .stream import StreamServer
+        server = StreamServer(socket_path)
+        server.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    print(f"scriptscope: collector listening on {collector.address[0]}:{collector.address[1]}",
+          file=sys.stderr)
+
+    seq = writer.seq if writer else 0
+    scheduler = FixedRateScheduler(interval)
+    try:
+        while not stop.is_set():
+            merged = collector.merged()
+            timestamp = time.time()
+            extra = {"alerts": merged["alerts"], "hosts": merged["hosts"]}
+            if writer:
+                seq = writer.publish(merged["scripts"], timestamp, extra)
+            else:
+                seq += 1
+            if server:
+                server.publish(dict(extra, seq=seq, timestamp=timestamp,
+                                    scripts=merged["scripts"]))
+            stop.wait(scheduler.next_delay())
+    finally:
+        collector.close()
+        if server:
+            server.close()
+    return 0
+
+
+def default_host_name():
+    return os.environ.get("SCRIPTSCOPE_HOST") or socket.gethostname()
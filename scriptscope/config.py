@@ -0,0 +1,239 @@
+"""
+===========================================================================================
+ScriptScope configuration
+-------------------------------------------------------------------------------------------
+Project paths and the loader for config/scripts.conf, the list of scripts to monitor.
+Alert rules live next to it in config/alerts.conf (see alerts.py).
+
+scripts.conf is a list of script paths, one per line. Sections after them set how each
+script is sampled, INI style:
+
+    ./example/sleep_script.sh
+
+    [defaults]
+    interval = 1s
+
+    [group critical]
+    scripts = ./example/cpu_stress.sh ./example/mem_stress.sh
+    interval = 100ms
+    alert = cpu > 80 for 5s
+
+    [./example/io_stress.sh]
+    interval = 10s
+    match = io_stress\\.sh --fast
+    cwd = /srv/jobs
+    user = backup
+    argv = 1
+    metrics = io
+    alert = write_rate > 1e6 for 30s
+
+[defaults] applies to every script, a [group <name>] to the scripts it lists, and a
+[<path>] section to one script (which it also adds), in that order of precedence. Keys:
+
+    interval    how often the script is sampled (ms, s, m or h; the daemon's --interval
+                by default)
+    match       a regular expression searched in the command line, instead of the name
+    argv        the position in argv where the script's name must appear
+    cwd         only processes working in this directory or below
+    user        only processes of this user (name or uid)
+    metrics     what to read: any of cpu, mem and io (all by default)
+    alert       an alert rule without its script (see alerts.py); may be repeated
+===========================================================================================
+"""
+
+import copy
+import os
+import re
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILE = os.path.join(PROJECT_ROOT, "config", "scripts.conf")
+STATS_FILE = os.path.join(PROJECT_ROOT, "stats.json")
+PID_FILE = os.path.join(PROJECT_ROOT, "scriptscope.pid")
+SOCKET_FILE = os.path.join(PROJECT_ROOT, "scriptscope.sock")
+HISTORY_DIR = os.path.join(PROJECT_ROOT, "history")
+ALERTS_FILE = os.path.join(PROJECT_ROOT, "config", "alerts.conf")
+ALERT_LOG = os.path.join(PROJECT_ROOT, "alerts.log")
+EXPORT_DIR = os.path.join(PROJECT_ROOT, "logs")
+PROFILE_DIR = os.path.join(PROJECT_ROOT, "profiles")
+MAP_FILE = os.path.join(PROJECT_ROOT, "scriptscope.map")
+RUNS_LOG = os.path.join(PROJECT_ROOT, "runs.log")
+SCRIPT_LOG_DIR = os.path.join(PROJECT_ROOT, "logs", "scripts")
+REPLAY_STATS_FILE = os.path.join(PROJECT_ROOT, "replay.json")
+REPLAY_SOCKET_FILE = os.path.join(PROJECT_ROOT, "replay.sock")
+
+
+METRICS = ("cpu", "mem", "io")
+_DURATION = re.compile(r"^([\d.]+)\s*(ms|s|m|h)?$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+_SETTINGS = ("interval", "match", "argv", "cwd", "user", "metrics")
+
+
+def parse_duration(text):
+    """
+    ================================================================================
+    Parse a duration such as "100ms", "10s", "5m" or "2" (seconds) into seconds.
+    ================================================================================
+    """
+    m = _DURATION.match(text.strip())
+    if not m:
+        raise ValueError(f"invalid duration: {text!r}")
+    return float(m.group(1)) * _DURATION_UNITS[m.group(2) or "s"]
+
+
+class ScriptConfig:
+    """
+    ================================================================================
+    How one script is matched and sampled. Unset values are None: the daemon's
+    interval, matching by name, no process filter, every metric.
+    ================================================================================
+    """
+    __slots__ = ("path", "name", "interval", "match", "argv", "cwd", "uid", "metrics",
+                 "alerts")
+
+    def __init__(self, path, interval=None, match=None, argv=None, cwd=None, uid=None,
+                 metrics=None, alerts=()):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.interval = interval
+        self.match = match
+        self.argv = argv
+        self.cwd = cwd
+        self.uid = uid
+        self.metrics = metrics
+        self.alerts = list(alerts)
+
+    def __repr__(self):
+        return f"ScriptConfig({self.path!r})"
+
+
+def _setting(key, value):
+    """
+    ================================================================================
+    Parse the value of one section key into the ScriptConfig attribute it sets.
+    ================================================================================
+    """
+    if key == "interval":
+        seconds = parse_duration(value)
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        return "interval", seconds
+    if key == "match":
+        return "match", re.compile(value)
+    if key == "argv":
+        if not value.isdigit():
+            raise ValueError(f"invalid argv position: {value!r}")
+        return "argv", int(value)
+    if key == "cwd":
+        if not os.path.isabs(value):
+            raise ValueError(f"cwd must be an absolute path: {value!r}")
+        return "cwd", os.path.normpath(value)
+    if key == "user":
+        if value.isdigit():
+            return "uid", int(value)
+        import pwd
+        try:
+            return "uid", pwd.getpwnam(value).pw_uid
+        except KeyError:
+            raise ValueError(f"unknown user: {value!r}") from None
+    if key == "metrics":
+        metrics = frozenset(value.replace(",", " ").split())
+        unknown = metrics.difference(METRICS)
+        if unknown:
+            raise ValueError(f"unknown metrics: {', '.join(sorted(unknown))}")
+        return "metrics", metrics
+    raise ValueError(f"unknown key: {key!r}")
+
+
+def parse_config(lines):
+    """
+    ================================================================================
+    Parse scripts.conf lines into a list of ScriptConfig, in the order the scripts
+    first appear. Blank lines and '#' comments are skipped; a malformed line
+    raises ValueError with its line number.
+    ================================================================================
+    """
+    from .alerts import parse_rules
+
+    order = []
+    sections = {}  # "defaults", ("group", name) or ("script", path) -> (settings, alerts)
+    members = {}   # group name -> script paths
+    current = None
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            if line.startswith("[") and line.endswith("]"):
+                title = line[1:-1].strip()
+                words = title.split(None, 1)
+                if title == "defaults":
+                    current = "defaults"
+                elif len(words) == 2 and words[0] == "group":
+                    current = ("group", words[1])
+                    members.setdefault(current[1], [])
+                elif title:
+                    current = ("script", title)
+                    order.append(title)
+                else:
+                    raise ValueError("empty section name")
+                sections.setdefault(current, ({}, []))
+            elif current is None:
+                order.append(line)
+            else:
+                key, sep, value = line.partition("=")
+                key, value = key.strip(), value.strip()
+                if not sep or not value:
+                    raise ValueError(f"expected key = value: {line!r}")
+                settings, alerts = sections[current]
+                if key == "alert":
+                    try:
+                        alerts.extend(parse_rules(["* " + value]))
+                    except ValueError as e:
+                        # Drop the "line 1: " of the one-line rule.
+                        raise ValueError(f"alert {value!r}: {str(e).partition(': ')[2]}") \
+                            from None
+                elif key == "scripts":
+                    if current[0] != "group":
+                        raise ValueError("scripts is only valid in a [group] section")
+                    members[current[1]].extend(value.split())
+                    order.extend(value.split())
+                elif key in _SETTINGS:
+                    name, parsed = _setting(key, value)
+                    settings[name] = parsed
+                else:
+                    raise ValueError(f"unknown key: {key!r}")
+        except (ValueError, re.error) as e:
+            raise ValueError(f"line {number}: {e}") from None
+
+    scripts = []
+    for path in dict.fromkeys(order):
+        script = ScriptConfig(path)
+        layers = [sections.get("defaults")]
+        layers += [sections[("group", group)] for group, paths in members.items()
+                   if path in paths]
+        layers.append(sections.get(("script", path)))
+        for layer in layers:
+            if layer is None:
+                continue
+            for name, value in layer[0].items():
+                setattr(script, name, value)
+            for rule in layer[1]:
+                rule = copy.copy(rule)
+                rule.script = script.name
+                script.alerts.append(rule)
+        scripts.append(script)
+    return scripts
+
+
+def load_config(path=CONFIG_FILE):
+    with open(path, "r") as f:
+        return parse_config(f)
+
+
+def load_scripts(path=CONFIG_FILE):
+    """
+    ================================================================================
+    Return the script paths configured in scripts.conf.
+    ================================================================================
+    """
+    return [script.path for script in load_config(path)]
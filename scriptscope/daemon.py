@@ -0,0 +1,519 @@
+"""
+===========================================================================================
+ScriptScope daemon
+-------------------------------------------------------------------------------------------
+Long-running monitor that keeps one Sampler alive between ticks instead of respawning
+monitor.sh every second. Ticks are scheduled at a fixed rate from the start time, so the
+period does not drift by the time spent sampling, and intervals below one second are
+supported. scripts.conf is re-read only when its modification time changes.
+
+Scripts may set their own sampling interval in scripts.conf (see config.py). The daemon
+then ticks at the shortest interval and each tick reads only the scripts that are due,
+batching those due within half a tick of each other; the others keep their last sample.
+
+Snapshots are published to stats.json and, when enabled, pushed to the subscribers of
+the local stream socket (see stream.py), and recorded in the history store (see
+history.py) when one is configured, and sent to a central collector when running as an
+agent (see cluster.py). Alert rules (see alerts.py) are evaluated against every snapshot
+in the same pass; their notifications go to alerts.log. The daemon stops cleanly on
+SIGTERM or SIGINT, and SIGHUP forces a config reload. Its pid is written to a pid file so
+the shell modules can tell whether one is already running.
+
+Process start and exit are followed through the kernel's proc connector when it is
+available (see procevents.py): the daemon then ticks as soon as a script starts or ends,
+and every finished run is appended to runs.log with its start and end times and exit code.
+Per-script run statistics (see runstats.py) are published with every snapshot. With
+--supervise, the daemon also launches the scripts and restarts them when they fail (see
+supervisor.py).
+
+With --map, every snapshot is also written into a memory-mapped file that local readers
+access without parsing JSON (see sharedmap.py).
+
+The daemon times its own stages and publishes its overhead with every snapshot under
+"self" (see metrics.py); SIGUSR1 starts and stops a cProfile of the tick loop.
+===========================================================================================
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+
+from .config import (
+    ALERTS_FILE, CONFIG_FILE, HISTORY_DIR, PID_FILE, SOCKET_FILE, STATS_FILE, load_config,
+)
+from .matcher import SUBSTRING
+from .metrics import Metrics, Profiler
+from .publish import SnapshotWriter
+from .sampler import Sampler
+
+DEFAULT_INTERVAL = 1.0
+EVENT_TICK_GAP = 0.05
+MIN_INTERVAL = 0.05
+
+
+class FixedRateScheduler:
+    """
+    ================================================================================
+    Computes tick deadlines as start + n * interval. A tick that overruns the next
+    deadline does not shift the schedule: the deadlines it overran are skipped and
+    counted in `missed`.
+    ================================================================================
+    """
+
+    def __init__(self, interval, clock=time.monotonic):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.clock = clock
+        self.start = clock()
+        self.ticks = 0
+        self.missed = 0
+
+    def next_delay(self):
+        """
+        ================================================================================
+        Advance to the next deadline and return how long to wait for it, in seconds.
+        ================================================================================
+        """
+        self.ticks += 1
+        now = self.clock()
+        deadline = self.start + self.ticks * self.interval
+        if now > deadline:
+            late = int((now - deadline) // self.interval) + 1
+            self.ticks += late
+            self.missed += late
+            deadline = self.start + self.ticks * self.interval
+        return max(deadline - now, 0.0)
+
+
+class SampleSchedule:
+    """
+    ================================================================================
+    Sampling deadlines of scripts with their own intervals. due() returns the
+    scripts whose deadline falls before now + slack and moves their deadlines on
+    by whole intervals, so scripts whose intervals are multiples of each other
+    keep falling due on the same ticks.
+    ================================================================================
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.intervals = {}
+        self._next = {}
+
+    def set_intervals(self, intervals):
+        """
+        ================================================================================
+        Replace the {script name: seconds} intervals. New scripts are due at once;
+        the others keep their deadlines.
+        ================================================================================
+        """
+        self.intervals = dict(intervals)
+        self._next = {name: self._next.get(name, 0.0) for name in self.intervals}
+
+    def period(self, default):
+        """
+        ================================================================================
+        The tick period needed: the shortest interval (default when there is none),
+        no shorter than MIN_INTERVAL.
+        ================================================================================
+        """
+        return max(min(self.intervals.values(), default=default), MIN_INTERVAL)
+
+    def due(self, slack=0.0):
+        now = self.clock()
+        due = set()
+        for name, deadline in self._next.items():
+            if deadline > now + slack:
+                continue
+            due.add(name)
+            interval = self.intervals[name]
+            if deadline <= 0.0:
+                deadline = now
+            skipped = max(int((now - deadline) // interval), 0)
+            self._next[name] = deadline + (skipped + 1) * interval
+        return due
+
+
+class ConfigWatcher:
+    """
+    ================================================================================
+    Reports when scripts.conf has changed, by comparing its mtime and size.
+    ================================================================================
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stamp = None
+
+    def _current(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def changed(self):
+        stamp = self._current()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return True
+
+
+class MonitorDaemon:
+    """
+    ================================================================================
+    Samples the configured scripts at a fixed rate and publishes every snapshot to
+    the stats file (unless stats_path is None), to the stream server and to the
+    history store and to the cluster agent, if any. alerts is an AlertEngine
+    evaluated on each snapshot, whose notifications are passed to notify. shared
+    is a SharedMapWriter to publish into. The stages of every tick are timed into
+    metrics. events is a started ProcessWatcher; finished runs are passed to
+    run_log and added to run_stats. supervisor is a Supervisor that launches the
+    configured scripts.
+    ================================================================================
+    """
+
+    def __init__(self, config_path=CONFIG_FILE, stats_path=STATS_FILE,
+                 interval=DEFAULT_INTERVAL, match_mode=SUBSTRING, server=None, history=None,
+                 children=True, cgroups=None, alerts=None, notify=None, agent=None,
+                 metrics=None, shared=None, events=None, run_log=None, run_stats=None,
+                 supervisor=None):
+        self.config_path = config_path
+        self.interval = interval
+        self.writer = SnapshotWriter(stats_path) if stats_path else None
+        self.server = server
+        self.history = history
+        self.alerts = alerts
+        self.notify = notify
+        self.agent = agent
+        self.shared = shared
+        self.events = events
+        self.run_log = run_log
+        self.run_stats = run_stats
+        self.supervisor = supervisor
+        self.metrics = metrics or Metrics()
+        self.profiler = Profiler()
+        self.seq = self.writer.seq if self.writer else 0
+        self.sampler = Sampler([], match_mode=match_mode, children=children, cgroups=cgroups,
+                               metrics=self.metrics, events=events)
+        if events is not None:
+            events.on_change = self.wake
+        if supervisor is not None:
+            supervisor.runs = self.sampler.runs
+        self.alert_rules = list(alerts.rules) if alerts else []
+        self.watcher = ConfigWatcher(config_path)
+        self.schedule = SampleSchedule()
+        self.scheduler = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._reload = False
+        self._toggle_profile = False
+        self._last_tick = None
+
+    def reload_config(self):
+        """
+        ================================================================================
+        Re-read scripts.conf if it changed (or a reload was requested). A config that
+        cannot be read or parsed keeps the previous scripts.
+        ================================================================================
+        """
+        if not self.watcher.changed() and not self._reload:
+            return
+        forced, self._reload = self._reload, False
+        try:
+            scripts = load_config(self.config_path)
+        except (OSError, ValueError) as e:
+            print(f"scriptscope: cannot load {self.config_path}: {e}", file=sys.stderr)
+            return
+        self.sampler.set_scripts(scripts)
+        self.schedule.set_intervals({script.name: script.interval or self.interval
+                                     for script in scripts})
+        if self.alerts:
+            self.alerts.set_rules(self.alert_rules +
+                                  [rule for script in scripts for rule in script.alerts])
+        if self.supervisor:
+            self.supervisor.set_scripts([script.path for script in scripts])
+            if forced:
+                self.supervisor.reset()
+
+    def tick(self, scheduled=False):
+        """
+        ================================================================================
+        Sample once and publish the snapshot. Returns the published records. A
+        scheduled tick only reads the scripts that are due, and publishes nothing
+        (returning None) when none is.
+        ================================================================================
+        """
+        started = time.perf_counter()
+        self.reload_config()
+        if self.supervisor:
+            self.supervisor.poll()
+        due = None
+        if scheduled and self.scheduler is not None:
+            due = self.schedule.due(self.scheduler.interval / 2)
+            if not due:
+                return None
+        snapshot = self.sampler.snapshot(due)
+        records, timestamp = snapshot.records, snapshot.timestamp
+        # The scripts that are not due repeat their last records: only the fresh
+        # ones go to the history and the alerts.
+        sampled, skipped = records, ()
+        if due is not None:
+            sampled = [r for r in records if r.get("script_name") in due]
+            skipped = set(self.sampler.scripts) - due
+        extra = {"self": self._self_record()}
+        runs = self.sampler.runs.drain()
+        if runs:
+            extra["runs"] = runs
+            if self.run_log:
+                self.run_log(runs)
+        if self.run_stats is not None:
+            self.run_stats.add(runs)
+            extra["run_stats"] = self.run_stats.summary()
+        if self.supervisor:
+            extra["supervisor"] = self.supervisor.status()
+        if self.alerts:
+            with self.metrics.stage("alerts"):
+                notifications = self.alerts.evaluate(sampled, timestamp, keep=skipped)
+                if notifications and self.notify:
+                    self.notify(notifications)
+                extra["alerts"] = self.alerts.active
+        with self.metrics.stage("publish"):
+            if self.writer:
+                self.seq = self.writer.publish(records, timestamp, extra)
+            else:
+                self.seq += 1
+            if self.shared:
+                self.shared.publish(records, self.seq, timestamp, extra["self"])
+            if self.server or self.agent:
+                payload = {"seq": self.seq, "timestamp": timestamp, "scripts": records}
+                payload.update(extra)
+                if self.server:
+                    self.server.publish(payload)
+                if self.agent:
+                    self.agent.publish(payload)
+            if self.history:
+                self.history.record(timestamp, sampled)
+        self._last_tick = time.perf_counter() - started
+        return records
+
+    def _self_record(self):
+        """
+        ================================================================================
+        Update the gauges of the outgoing queues and return the daemon's own record.
+        ================================================================================
+        """
+        metrics = self.metrics
+        metrics.count("scriptscope_ticks_total")
+        if self.scheduler is not None:
+            missed = self.scheduler.missed - metrics.counters["scriptscope_missed_ticks_total"]
+            if missed:
+                metrics.count("scriptscope_missed_ticks_total", missed)
+        metrics.set("scriptscope_scripts", len(self.sampler.scripts))
+        if self.server:
+            metrics.set("scriptscope_queue_depth", self.server.queued, queue="stream")
+            metrics.set("scriptscope_stream_subscribers", self.server.subscriber_count)
+        if self.agent:
+            metrics.set("scriptscope_queue_depth", self.agent.pending, queue="agent")
+            metrics.set("scriptscope_agent_dropped", self.agent.dropped)
+        if self.events:
+            metrics.set("scriptscope_proc_events_lost", self.events.lost)
+        return metrics.self_record(self.sampler.mem_total, self._last_tick)
+
+    def run(self):
+        """
+        ================================================================================
+        Tick until stop() is called, at the period the script intervals need. A
+        wake() between two ticks (a script started or ended) triggers an extra tick
+        of every script, at most every EVENT_TICK_GAP seconds, without moving the
+        schedule.
+        ================================================================================
+        """
+        self.reload_config()
+        self.scheduler = FixedRateScheduler(self.schedule.period(self.interval))
+        while not self._stop.is_set():
+            if self._toggle_profile:
+                self._toggle_profile = False
+                path = self.profiler.toggle()
+                print(f"scriptscope: profile written to {path}" if path else
+                      "scriptscope: profiling started", file=sys.stderr)
+            self.tick(scheduled=True)
+            period = self.schedule.period(self.interval)
+            if period != self.scheduler.interval:
+                missed = self.scheduler.missed
+                self.scheduler = FixedRateScheduler(period)
+                self.scheduler.missed = missed
+            deadline = time.monotonic() + self.scheduler.next_delay()
+            while self._wake.wait(max(deadline - time.monotonic(), 0.0)):
+                self._wake.clear()
+                if self._stop.is_set() or self._stop.wait(EVENT_TICK_GAP):
+                    break
+                if time.monotonic() >= deadline:
+                    break
+                self.tick()
+        if self.profiler.active:
+            self.profiler.toggle()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def request_reload(self):
+        self._reload = True
+
+    def request_profile(self):
+        self._toggle_profile = True
+
+    def install_signal_handlers(self):
+        """
+        ================================================================================
+        Stop on SIGTERM/SIGINT, reload the config on SIGHUP, start or stop
+        profiling on SIGUSR1, and reap the supervised scripts on SIGCHLD.
+        ================================================================================
+        """
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.request_reload())
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_profile())
+        if self.supervisor:
+            signal.signal(signal.SIGCHLD, lambda signum, frame: self.wake())
+
+
+def read_pid_file(path=PID_FILE):
+    """
+    ================================================================================
+    Return the pid of the running daemon, or None when the pid file is missing or
+    points to a process that no longer exists.
+    ================================================================================
+    """
+    try:
+        with open(path, "r") as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return None
+    return pid
+
+
+def run_daemon(config_path=CONFIG_FILE, stats_path=STATS_FILE, interval=DEFAULT_INTERVAL,
+               match_mode=SUBSTRING, pid_file=PID_FILE, socket_path=SOCKET_FILE,
+               history_dir=HISTORY_DIR, children=True, cgroup=False, cgroup_root=None,
+               alerts_path=ALERTS_FILE, collector=None, host_name=None,
+               metrics_address=None, map_path=None, events=True, supervise=False,
+               restart="on-failure"):
+    """
+    ================================================================================
+    Run the monitor daemon in the foreground until SIGTERM or SIGINT.
+    stats_path, socket_path or history_dir may be None to disable that output.
+    Alert rules are read from alerts_path when it exists, next to the alerts of
+    scripts.conf (None disables them).
+    With cgroup=True, scripts are accounted through cgroup v2 when it is usable.
+    collector is a (host, port) to push the snapshots to, as host_name.
+    metrics_address is a (host, port) to serve the Prometheus metrics on, and
+    map_path the shared map to publish into. With events=True, process events
+    are used when the proc connector is available. With supervise=True, the
+    scripts are launched and restarted according to restart.
+    Returns 1 without starting when another daemon owns the pid file.
+    ================================================================================
+    """
+    running = read_pid_file(pid_file)
+    if running is not None and running != os.getpid():
+        print(f"scriptscope: daemon already running (pid {running})", file=sys.stderr)
+        return 1
+
+    alerts = notify = None
+    if alerts_path:
+        from .alerts import AlertEngine, AlertLog, load_rules
+        try:
+            alerts = AlertEngine(load_rules(alerts_path) if os.path.exists(alerts_path)
+                                 else [])
+        except (OSError, ValueError) as e:
+            print(f"scriptscope: cannot load {alerts_path}: {e}", file=sys.stderr)
+            return 1
+        notify = AlertLog()
+    server = None
+    if socket_path:
+        from .stream import StreamServer
+        server = StreamServer(socket_path)
+        server.start()
+    history = None
+    if history_dir:
+        from .history import HistoryStore
+        history = HistoryStore(history_dir)
+    cgroups = None
+    if cgroup:
+        from .cgroup import CgroupAccounting
+        cgroups = CgroupAccounting(cgroup_root)
+        if not cgroups.available:
+            print(f"scriptscope: cgroup accounting unavailable ({cgroups.error}), "
+                  "using /proc only", file=sys.stderr)
+            cgroups = None
+    agent = None
+    if collector:
+        from .cluster import Agent
+        agent = Agent(collector, host_name)
+        agent.start()
+    metrics = Metrics()
+    metrics_server = None
+    if metrics_address:
+        from .metrics import MetricsServer
+        try:
+            metrics_server = MetricsServer(metrics, metrics_address)
+        except OSError as e:
+            print(f"scriptscope: cannot serve metrics on {metrics_address[0]}:"
+                  f"{metrics_address[1]}: {e}", file=sys.stderr)
+        else:
+            metrics_server.start()
+    shared = None
+    if map_path:
+        from .sharedmap import SharedMapWriter
+        shared = SharedMapWriter(map_path)
+    from .procevents import ProcessWatcher, RunLog, RunTracker
+    watcher = None
+    if events:
+        watcher = ProcessWatcher(RunTracker())
+        if not watcher.start():
+            print(f"scriptscope: process events unavailable ({watcher.error}), "
+                  "scanning /proc", file=sys.stderr)
+            watcher = None
+    from .runstats import RunStatistics
+    run_stats = RunStatistics(os.path.join(history_dir, "runstats.json") if history_dir
+                              else None)
+    supervisor = None
+    if supervise:
+        from .supervisor import Supervisor
+        supervisor = Supervisor(restart)
+    daemon = MonitorDaemon(config_path, stats_path, interval, match_mode, server, history,
+                           children, cgroups, alerts, notify, agent, metrics, shared,
+                           watcher, RunLog(), run_stats, supervisor)
+    daemon.install_signal_handlers()
+    with open(pid_file, "w") as f:
+        f.write(f"{os.getpid()}\n")
+    try:
+        daemon.run()
+    finally:
+        if server:
+            server.close()
+        if history:
+            history.close()
+        if agent:
+            agent.close()
+        if metrics_server:
+            metrics_server.close()
+        if shared:
+            shared.close()
+        if supervisor:
+            supervisor.close()
+        if watcher:
+            watcher.close()
+        run_stats.save()
+        if read_pid_file(pid_file) == os.getpid():
+            os.unlink(pid_file)
+    return 0
@@ -0,0 +1,583 @@
+"""
+===========================================================================================
+ScriptScope export
+-------------------------------------------------------------------------------------------
+Continuous export of the daemon's snapshots to rotating files. The exporter subscribes to
+the stream socket (see stream.py), groups snapshots into batches and hands each batch to
+a writer thread, which encodes it and appends it to the current file:
+
+    csv        one row per record, with the snapshot timestamp and seq in front
+    jsonl      one snapshot per line, as published on the stream
+    columnar   packed binary blocks, one array per column (see ColumnarFormat)
+
+Files are named <prefix>-<YYYYmmdd-HHMMSS>.<format>[.gz|.zst] and rotated once they reach
+a size or an age. After each rotation the oldest files are deleted until the export
+directory fits in max_bytes and holds nothing older than max_age, so a week of samples
+never grows past a known budget.
+
+The daemon never waits for the exporter: the stream already coalesces snapshots for
+slow readers. Between the socket and the disk, batches wait in a bounded queue; when
+the disk falls behind by more than that queue, new batches are dropped and counted
+instead of buffering without bound. Gaps in the snapshot seq are counted as well.
+===========================================================================================
+"""
+
+import csv
+import gzip
+import io
+import json
+import math
+import os
+import queue
+import re
+import select
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from .config import EXPORT_DIR, SOCKET_FILE
+from .monitor import CSV_FIELDS
+from .sampler import IO_COUNTERS, IO_RATES
+from .stream import StreamClient
+
+FORMATS = ("csv", "jsonl", "columnar")
+COMPRESSIONS = ("none", "gzip", "zstd")
+DEFAULT_ROTATE_BYTES = 64 * 1024 * 1024
+DEFAULT_ROTATE_SECONDS = 3600
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+DEFAULT_BATCH_ROWS = 5000
+DEFAULT_FLUSH_SECONDS = 5.0
+DEFAULT_QUEUE_BATCHES = 64
+
+_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text):
+    """
+    ================================================================================
+    Parse a byte size such as "512", "64M" or "4G" (binary units).
+    ================================================================================
+    """
+    m = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", str(text), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"invalid size: {text!r}")
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2).upper()])
+
+
+def etime_seconds(etime):
+    """
+    ================================================================================
+    Convert a `ps` elapsed time ([[dd-]hh:]mm:ss) to seconds, or None.
+    ================================================================================
+    """
+    days, _, clock = str(etime).rpartition("-")
+    try:
+        seconds = 0
+        for part in clock.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds + int(days or 0) * 86400
+    except ValueError:
+        return None
+
+
+class CsvFormat:
+    """
+    ================================================================================
+    One CSV row per record: timestamp, seq, host (empty unless exported from a
+    collector) and the columns of `show --format csv`.
+    ================================================================================
+    """
+    name = "csv"
+    fields = ("timestamp", "seq", "host") + CSV_FIELDS
+
+    def start(self):
+        return self._rows([self.fields])
+
+    def encode(self, batch):
+        return self._rows(
+            [snapshot["timestamp"], snapshot["seq"], r.get("host", "")]
+            + [r.get(f, "") for f in CSV_FIELDS]
+            for snapshot in batch for r in snapshot["scripts"]
+        )
+
+    @staticmethod
+    def _rows(rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+
+class JsonLinesFormat:
+    """
+    ================================================================================
+    One JSON snapshot per line, child processes included.
+    ================================================================================
+    """
+    name = "jsonl"
+
+    def start(self):
+        return b""
+
+    def encode(self, batch):
+        return "".join(json.dumps(snapshot, separators=(",", ":")) + "\n"
+                       for snapshot in batch).encode("utf-8")
+
+
+class ColumnarFormat:
+    """
+    ================================================================================
+    Packed binary blocks, little-endian. A file starts with an 8-byte magic, then
+    holds one block per batch:
+
+        "BLK\\n", snapshot count, row count, new string count     (<4sIII)
+        new strings                 <H length + UTF-8 each, appended to the table
+        timestamps                  float64 per snapshot
+        seqs                        int64 per snapshot (-1 when unknown)
+        rows                        uint32 per snapshot, its number of records
+        script, cmd, host           uint32 string table index per record
+        pid, etime                  int32 per record (-1 when not running)
+        FLOAT_FIELDS                float32 per record each (NaN when missing)
+        INT_FIELDS                  int64 per record each (-1 when missing)
+
+    Script names and commands are stored once per file in the string table, so a
+    record costs about 90 bytes before compression.
+    ================================================================================
+    """
+    name = "columnar"
+    MAGIC = b"SSCOL1\0\n"
+    FLOAT_FIELDS = ("cpu", "cpu_total", "mem") + IO_RATES
+    INT_FIELDS = IO_COUNTERS
+    _BLOCK = struct.Struct("<4sIII")
+    _LENGTH = struct.Struct("<H")
+
+    def __init__(self):
+        self._strings = {}
+
+    def start(self):
+        self._strings = {}
+        return self.MAGIC
+
+    def _string(self, value, new):
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+            new.append(value)
+        return index
+
+    def encode(self, batch):
+        new = []
+        timestamps, seqs, counts = array("d"), array("q"), array("I")
+        scripts, cmds, hosts = array("I"), array("I"), array("I")
+        pids, etimes = array("i"), array("i")
+        floats = [array("f") for _ in self.FLOAT_FIELDS]
+        ints = [array("q") for _ in self.INT_FIELDS]
+        for snapshot in batch:
+            records = snapshot["scripts"]
+            timestamps.append(snapshot["timestamp"] or 0.0)
+            seqs.append(-1 if snapshot.get("seq") is None else snapshot["seq"])
+            counts.append(len(records))
+            for r in records:
+                scripts.append(self._string(r.get("script_name", ""), new))
+                cmds.append(self._string(r.get("cmd", ""), new))
+                hosts.append(self._string(r.get("host", ""), new))
+                pids.append(_int(r.get("pid")))
+                etime = etime_seconds(r.get("etime"))
+                etimes.append(-1 if etime is None else etime)
+                for column, field in zip(floats, self.FLOAT_FIELDS):
+                    column.append(_float(r.get(field)))
+                for column, field in zip(ints, self.INT_FIELDS):
+                    column.append(_int(r.get(field)))
+
+        parts = [self._BLOCK.pack(b"BLK\n", len(counts), len(scripts), len(new))]
+        for value in new:
+            data = value.encode("utf-8")[:0xFFFF]
+            parts.append(self._LENGTH.pack(len(data)) + data)
+        columns = [timestamps, seqs, counts, scripts, cmds, hosts, pids, etimes]
+        for column in columns + floats + ints:
+            if sys.byteorder == "big":
+                column.byteswap()
+            parts.append(column.tobytes())
+        return b"".join(parts)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def read_columnar(f, strings=None):
+    """
+    ================================================================================
+    Yield the snapshots of a columnar export from a binary file object, as
+    {"seq", "timestamp", "scripts"} dicts with numeric values and None for the
+    missing ones. A truncated last block (file still being written) is ignored.
+    With strings, the string table of the blocks before it, f is positioned at
+    a block rather than at the start of the file (see scan_columnar()).
+    ================================================================================
+    """
+    fmt = ColumnarFormat
+    if strings is None:
+        if f.read(len(fmt.MAGIC)) != fmt.MAGIC:
+            raise ValueError("not a ScriptScope columnar export")
+        strings = []
+    else:
+        strings = list(strings)
+
+    def column(typecode, count):
+        values = array(typecode)
+        data = f.read(values.itemsize * count)
+        if len(data) != values.itemsize * count:
+            raise EOFError
+        values.frombytes(data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    while True:
+        header = f.read(fmt._BLOCK.size)
+        if len(header) < fmt._BLOCK.size:
+            return
+        tag, n_snapshots, n_rows, n_strings = fmt._BLOCK.unpack(header)
+        if tag != b"BLK\n":
+            raise ValueError("corrupt columnar export")
+        try:
+            for _ in range(n_strings):
+                data = f.read(fmt._LENGTH.unpack(f.read(fmt._LENGTH.size))[0])
+                strings.append(data.decode("utf-8", "replace"))
+            timestamps, seqs = column("d", n_snapshots), column("q", n_snapshots)
+            counts = column("I", n_snapshots)
+            scripts, cmds, hosts = (column("I", n_rows) for _ in range(3))
+            pids, etimes = column("i", n_rows), column("i", n_rows)
+            floats = [column("f", n_rows) for _ in fmt.FLOAT_FIELDS]
+            ints = [column("q", n_rows) for _ in fmt.INT_FIELDS]
+        except (EOFError, struct.error):
+            return
+
+        row = 0
+        for timestamp, seq, count in zip(timestamps, seqs, counts):
+            records = []
+            for i in range(row, row + count):
+                record = {
+                    "script_name": strings[scripts[i]], "cmd": strings[cmds[i]],
+                    "host": strings[hosts[i]] or None,
+                    "pid": None if pids[i] < 0 else pids[i],
+                    "etime": None if etimes[i] < 0 else etimes[i],
+                }
+                for name, values in zip(fmt.FLOAT_FIELDS, floats):
+                    record[name] = None if math.isnan(values[i]) else values[i]
+                for name, values in zip(fmt.INT_FIELDS, ints):
+                    record[name] = None if values[i] < 0 else values[i]
+                records.append(record)
+            row += count
+            yield {"seq": None if seq < 0 else seq, "timestamp": timestamp, "scripts": records}
+
+
+def scan_columnar(f, strings):
+    """
+    ================================================================================
+    Walk the blocks of a columnar export positioned after its magic, reading only
+    their headers, new strings and timestamps and seeking over the other columns.
+    Yields (offset, string count before the block, first timestamp, last
+    timestamp) per block holding snapshots; the new strings are appended to
+    strings. Stops at a truncated block.
+    ================================================================================
+    """
+    fmt = ColumnarFormat
+    row_bytes = 4 * 3 + 4 + 4 + 4 * len(fmt.FLOAT_FIELDS) + 8 * len(fmt.INT_FIELDS)
+    while True:
+        offset = f.tell()
+        header = f.read(fmt._BLOCK.size)
+        if len(header) < fmt._BLOCK.size:
+            return
+        tag, n_snapshots, n_rows, n_strings = fmt._BLOCK.unpack(header)
+        if tag != b"BLK\n":
+            raise ValueError("corrupt columnar export")
+        known = len(strings)
+        try:
+            for _ in range(n_strings):
+                data = f.read(fmt._LENGTH.unpack(f.read(fmt._LENGTH.size))[0])
+                strings.append(data.decode("utf-8", "replace"))
+        except struct.error:
+            del strings[known:]
+            return
+        data = f.read(8 * n_snapshots)
+        if len(data) < 8 * n_snapshots:
+            del strings[known:]
+            return
+        timestamps = array("d", data)
+        if sys.byteorder == "big":
+            timestamps.byteswap()
+        rest = (8 + 4) * n_snapshots + row_bytes * n_rows
+        if rest:
+            # Land on the last byte of the block: a short read means it is truncated.
+            f.seek(f.tell() + rest - 1)
+            if len(f.read(1)) != 1:
+                del strings[known:]
+                return
+        if n_snapshots:
+            yield offset, known, timestamps[0], timestamps[-1]
+
+
+def open_export(path):
+    """
+    ================================================================================
+    Open an export file for reading, decompressing .gz and .zst files.
+    ================================================================================
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        zstandard = _zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    return open(path, "rb")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression requires the zstandard module") from None
+    return zstandard
+
+
+FORMAT_CLASSES = {"csv": CsvFormat, "jsonl": JsonLinesFormat, "columnar": ColumnarFormat}
+
+
+class RotatingWriter:
+    """
+    ================================================================================
+    Appends encoded batches to the current export file, rotating it after
+    rotate_bytes (on disk, after compression) or rotate_seconds, and pruning the
+    oldest files of the directory beyond max_bytes or max_age.
+    ================================================================================
+    """
+
+    def __init__(self, directory=EXPORT_DIR, fmt="csv", compress="none", prefix="scriptscope",
+                 rotate_bytes=DEFAULT_ROTATE_BYTES, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, clock=time.time):
+        if fmt not in FORMAT_CLASSES:
+            raise ValueError(f"unknown export format: {fmt!r}")
+        if compress not in COMPRESSIONS:
+            raise ValueError(f"unknown compression: {compress!r}")
+        if compress == "zstd":
+            self._zstd = _zstandard().ZstdCompressor()
+        self.directory = directory
+        self.format = FORMAT_CLASSES[fmt]()
+        self.compress = compress
+        self.prefix = prefix
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        self.path = None
+        self._raw = None
+        self._file = None
+        self._opened = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def extension(self):
+        return "." + self.format.name + _SUFFIXES[self.compress]
+
+    def _open(self):
+        now = self.clock()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}{self.extension}")
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(self.directory, f"{self.prefix}-{stamp}.{n}{self.extension}")
+        self._raw = open(path, "xb")
+        if self.compress == "gzip":
+            self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        elif self.compress == "zstd":
+            self._file = self._zstd.stream_writer(self._raw, closefd=False)
+        else:
+            self._file = self._raw
+        self.path = path
+        self._opened = now
+        self._file.write(self.format.start())
+
+    def write(self, batch):
+        """
+        ================================================================================
+        Encode a batch of snapshots and append it, rotating first when due.
+        ================================================================================
+        """
+        if self._file is not None and self._due():
+            self.rotate()
+        if self._file is None:
+            self._open()
+        self._file.write(self.format.encode(batch))
+        if self._file is not self._raw:
+            self._file.flush()
+        self._raw.flush()
+
+    def _due(self):
+        return (self._raw.tell() >= self.rotate_bytes
+                or self.clock() - self._opened >= self.rotate_seconds)
+
+    def rotate(self):
+        self._close_file()
+        self.prune()
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+        self._file = self._raw = None
+
+    def prune(self):
+        """
+        ================================================================================
+        Delete the oldest finished exports until the directory fits in max_bytes and
+        no file is older than max_age. The file being written is never deleted.
+        ================================================================================
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if (entry.name.startswith(self.prefix + "-") and entry.name.endswith(self.extension)
+                    and entry.path != self.path):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.path, st.st_size))
+        files.sort()
+        total = sum(size for _, _, size in files)
+        oldest_kept = self.clock() - self.max_age
+        for mtime, path, size in files:
+            if total <= self.max_bytes and mtime >= oldest_kept:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def close(self):
+        self._close_file()
+
+
+class Exporter:
+    """
+    ================================================================================
+    Reads snapshots from the stream and writes them through a RotatingWriter on a
+    separate thread. `dropped` counts the snapshots lost: the ones the daemon
+    coalesced away (gaps in seq) plus the batches refused by a full queue.
+    ================================================================================
+    """
+
+    def __init__(self, writer, socket_path=SOCKET_FILE, scripts=None,
+                 batch_rows=DEFAULT_BATCH_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS,
+                 queue_batches=DEFAULT_QUEUE_BATCHES):
+        self.writer = writer
+        self.socket_path = socket_path
+        self.scripts = scripts
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.exported = 0
+        self.dropped = 0
+        self.error = None
+        self._queue = queue.Queue(queue_batches)
+        self._stop = threading.Event()
+        self._batch = []
+        self._rows = 0
+        self._last_seq = None
+        self._thread = threading.Thread(target=self._write_loop, name="scriptscope-export",
+                                        daemon=True)
+
+    def _write_loop(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                self.writer.write(batch)
+            except OSError as e:
+                self.error = e
+                self._stop.set()
+                return
+            self.exported += len(batch)
+
+    def add(self, snapshot):
+        """
+        ================================================================================
+        Add one snapshot to the current batch, queuing the batch once it is full.
+        ================================================================================
+        """
+        seq = snapshot.get("seq")
+        if seq is not None and self._last_seq is not None and seq > self._last_seq + 1:
+            self.dropped += seq - self._last_seq - 1
+        self._last_seq = seq
+        self._batch.append(snapshot)
+        self._rows += len(snapshot.get("scripts", ()))
+        if self._rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        try:
+            self._queue.put_nowait(self._batch)
+        except queue.Full:
+            # The disk is behind by a whole queue of batches: shed load here.
+            self.dropped += len(self._batch)
+        self._batch = []
+        self._rows = 0
+
+    def run(self):
+        """
+        ================================================================================
+        Export until stop() is called or the daemon goes away, then write what is
+        buffered. Returns 1 when no daemon is listening or the disk fails.
+        ================================================================================
+        """
+        client = StreamClient(self.socket_path)
+        try:
+            client.connect()
+        except OSError as e:
+            print(f"scriptscope: cannot connect to {self.socket_path}: {e}", file=sys.stderr)
+            return 1
+        client.subscribe(self.scripts)
+        self._thread.start()
+        deadline = time.monotonic() + self.flush_seconds
+        try:
+            while not self._stop.is_set():
+                timeout = max(deadline - time.monotonic(), 0.0)
+                readable, _, _ = select.select([client], [], [], min(timeout, 1.0))
+                if readable:
+                    for snapshot in client.read_available():
+                        self.add(snapshot)
+                if time.monotonic() >= deadline:
+                    self.flush()
+                    deadline = time.monotonic() + self.flush_seconds
+        except (ConnectionError, KeyboardInterrupt):
+            pass
+        finally:
+            client.close()
+            self.flush()
+            if self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self.writer.close()
+        if self.error is not None:
+            print(f"scriptscope: export stopped: {self.error}", file=sys.stderr)
+            return 1
+        return 0
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,374 @@
+"""
+===========================================================================================
+ScriptScope history
+-------------------------------------------------------------------------------------------
+Keeps the recent values of every (script, metric) pair in fixed-size ring buffers backed
+by array('d'), and rolls them up into 10 s, 1 min and 1 h buckets stored on disk.
+
+Each resolution has its own file, a fixed-capacity circular log of packed records:
+
+    header   magic, record size, capacity, number of records ever written
+    records  bucket start (s), key id, sample count, min, max, mean
+
+so the total size on disk is bounded and known up front. Records are written in time
+order, which lets a query binary-search its start. Key ids map to (script, metric) in a
+small keys.json next to the files. Files written by the daemon can be opened read-only
+by any other process, such as the GUI.
+===========================================================================================
+"""
+
+import json
+import math
+import os
+import struct
+import threading
+from array import array
+
+from .config import HISTORY_DIR
+
+METRICS = ("cpu", "cpu_total", "mem", "read_rate", "write_rate")
+RESOLUTIONS = (10, 60, 3600)
+DEFAULT_CAPACITY = 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_MAGIC = b"SSHIST1\0"
+_HEADER = struct.Struct("<8sIIQ")
+_RECORD = struct.Struct("<dIIfff")
+
+
+def _metric_value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _merge(a, b):
+    count = a[2] + b[2]
+    return (a[0], a[1], count, min(a[3], b[3]), max(a[4], b[4]),
+            (a[5] * a[2] + b[5] * b[2]) / count)
+
+
+class RingBuffer:
+    """
+    ================================================================================
+    Fixed-size ring of (timestamp, value) pairs stored in two array('d').
+    ================================================================================
+    """
+    __slots__ = ("capacity", "times", "values", "head", "size")
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def _index(self, i):
+        return (self.head - self.size + i) % self.capacity
+
+    def oldest(self):
+        return self.times[self._index(0)] if self.size else None
+
+    def latest(self):
+        return self.values[self._index(self.size - 1)] if self.size else None
+
+    def range(self, start, end):
+        """
+        ================================================================================
+        Return the (timestamp, value) pairs with start <= timestamp < end, oldest
+        first. Timestamps are appended in increasing order, so the start is found
+        by binary search.
+        ================================================================================
+        """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._index(mid)] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        points = []
+        for i in range(lo, self.size):
+            j = self._index(i)
+            if self.times[j] >= end:
+                break
+            points.append((self.times[j], self.values[j]))
+        return points
+
+    def tail(self, count):
+        """
+        ================================================================================
+        Return the last `count` values, oldest first.
+        ================================================================================
+        """
+        count = min(count, self.size)
+        return [self.values[self._index(i)] for i in range(self.size - count, self.size)]
+
+
+class RollupFile:
+    """
+    ================================================================================
+    Fixed-capacity circular log of rollup records for one resolution.
+    ================================================================================
+    """
+
+    def __init__(self, path, capacity, writable=True):
+        self.path = path
+        self.writable = writable
+        flags = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        self.fd = os.open(path, flags, 0o644)
+        self.capacity = capacity
+        self.written = 0
+        header = os.pread(self.fd, _HEADER.size, 0)
+        if len(header) == _HEADER.size:
+            magic, record_size, capacity, written = _HEADER.unpack(header)
+            if magic == _MAGIC and record_size == _RECORD.size:
+                self.capacity = capacity
+                self.written = written
+                return
+        if writable:
+            # Missing or incompatible file: start a new one.
+            os.ftruncate(self.fd, 0)
+            self._write_header()
+
+    def _write_header(self):
+        os.pwrite(self.fd, _HEADER.pack(_MAGIC, _RECORD.size, self.capacity, self.written), 0)
+
+    def _refresh(self):
+        if not self.writable:
+            header = os.pread(self.fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size:
+                self.written = _HEADER.unpack(header)[3]
+
+    def _offset(self, n):
+        return _HEADER.size + (n % self.capacity) * _RECORD.size
+
+    def append(self, rows):
+        """
+        ================================================================================
+        Append (bucket_start, key_id, count, min, max, mean) rows, then publish them
+        by updating the record count in the header.
+        ================================================================================
+        """
+        n = self.written
+        while rows:
+            room = self.capacity - n % self.capacity
+            chunk, rows = rows[:room], rows[room:]
+            os.pwrite(self.fd, b"".join(_RECORD.pack(*row) for row in chunk), self._offset(n))
+            n += len(chunk)
+        self.written = n
+        self._write_header()
+
+    def _record(self, n):
+        return _RECORD.unpack(os.pread(self.fd, _RECORD.size, self._offset(n)))
+
+    def read_range(self, key_id, start, end):
+        """
+        ================================================================================
+        Return the records of a key with start <= bucket start < end, oldest first.
+        Records of the same bucket are merged: a bucket still open when the daemon
+        stopped is written then, and again when a restart within its period
+        closes it.
+        ================================================================================
+        """
+        self._refresh()
+        first = max(self.written - self.capacity, 0)
+        lo, hi = first, self.written
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        block = 4096
+        n = lo
+        while n < self.written:
+            count = min(block, self.written - n, self.capacity - n % self.capacity)
+            raw = os.pread(self.fd, count * _RECORD.size, self._offset(n))
+            for row in _RECORD.iter_unpack(raw):
+                if row[0] >= end:
+                    return rows
+                if row[1] != key_id:
+                    continue
+                if rows and rows[-1][0] == row[0]:
+                    rows[-1] = _merge(rows[-1], row)
+                else:
+                    rows.append(row)
+            n += count
+        return rows
+
+    def close(self):
+        os.close(self.fd)
+
+
+class HistoryStore:
+    """
+    ================================================================================
+    In-memory rings per (script, metric) plus on-disk rollups. With directory None
+    only the rings are kept. With readonly=True the store only serves queries from
+    files written by another process.
+    ================================================================================
+    """
+
+    def __init__(self, directory=HISTORY_DIR, capacity=DEFAULT_CAPACITY,
+                 resolutions=RESOLUTIONS, max_bytes=DEFAULT_MAX_BYTES, readonly=False):
+        self.directory = directory
+        self.capacity = capacity
+        self.resolutions = tuple(sorted(resolutions))
+        self.readonly = readonly
+        self.rings = {}
+        self._keys = {}
+        self._buckets = {res: {} for res in self.resolutions}
+        self._files = {}
+        self._lock = threading.Lock()
+        if directory is None:
+            return
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        records_per_file = max(
+            (max_bytes // len(self.resolutions) - _HEADER.size) // _RECORD.size, 1
+        )
+        for res in self.resolutions:
+            path = os.path.join(directory, f"rollup-{res}s.bin")
+            if readonly and not os.path.exists(path):
+                continue
+            self._files[res] = RollupFile(path, records_per_file, writable=not readonly)
+        self._load_keys()
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.directory, "keys.json")
+
+    def _load_keys(self):
+        try:
+            with open(self._keys_path, "r") as f:
+                self._keys = {tuple(key): i for i, key in enumerate(json.load(f))}
+        except (OSError, ValueError):
+            self._keys = {}
+
+    def _key_id(self, key):
+        key_id = self._keys.get(key)
+        if key_id is None:
+            key_id = self._keys[key] = len(self._keys)
+            if self._files:
+                self._save_keys()
+        return key_id
+
+    def _save_keys(self):
+        keys = sorted(self._keys, key=self._keys.get)
+        tmp_path = self._keys_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([list(key) for key in keys], f)
+        os.replace(tmp_path, self._keys_path)
+
+    def record(self, timestamp, records):
+        """
+        ================================================================================
+        Add one snapshot. Values of the processes of a script are summed, and a
+        script that is not running records 0.
+        ================================================================================
+        """
+        totals = {}
+        for r in records:
+            values = totals.setdefault(r.get("script_name", ""), dict.fromkeys(METRICS, 0.0))
+            for metric in METRICS:
+                values[metric] += _metric_value(r.get(metric))
+        with self._lock:
+            for script, values in totals.items():
+                for metric, value in values.items():
+                    self._add((script, metric), timestamp, value)
+            self._flush_closed(timestamp)
+
+    def _add(self, key, timestamp, value):
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = RingBuffer(self.capacity)
+        ring.append(timestamp, value)
+        if self.readonly:
+            return
+        for res, buckets in self._buckets.items():
+            start = math.floor(timestamp / res) * res
+            bucket = buckets.get(key)
+            if bucket is None or bucket[0] != start:
+                if bucket is not None:
+                    self._write(res, key, bucket)
+                buckets[key] = [start, 1, value, value, value]
+            else:
+                bucket[1] += 1
+                bucket[2] = min(bucket[2], value)
+                bucket[3] = max(bucket[3], value)
+                bucket[4] += value
+
+    def _flush_closed(self, timestamp):
+        """
+        ================================================================================
+        Write the buckets of scripts that stopped reporting once their period ended.
+        ================================================================================
+        """
+        for res, buckets in self._buckets.items():
+            for key in [k for k, b in buckets.items() if b[0] + res <= timestamp]:
+                self._write(res, key, buckets.pop(key))
+
+    def _write(self, res, key, bucket):
+        rollup = self._files.get(res)
+        if rollup is None:
+            return
+        start, count, low, high, total = bucket
+        rollup.append([(start, self._key_id(key), count, low, high, total / count)])
+
+    def flush(self):
+        """
+        ================================================================================
+        Write every open bucket, e.g. before shutting down.
+        ================================================================================
+        """
+        with self._lock:
+            for res, buckets in self._buckets.items():
+                for key, bucket in buckets.items():
+                    self._write(res, key, bucket)
+                buckets.clear()
+
+    def query(self, script, metric, start_ms, end_ms, resolution_ms=None):
+        """
+        ================================================================================
+        Return [(time_ms, mean, min, max), ...] for a script and metric between
+        start_ms and end_ms. A resolution below the finest rollup (or None) reads
+        the in-memory ring; otherwise the coarsest rollup not above the requested
+        resolution is read from disk.
+        ================================================================================
+        """
+        key = (script, metric)
+        start, end = start_ms / 1000.0, end_ms / 1000.0
+        candidates = [res for res in self.resolutions if res * 1000 <= (resolution_ms or 0)]
+        if not candidates or candidates[-1] not in self._files:
+            with self._lock:
+                ring = self.rings.get(key)
+                points = ring.range(start, end) if ring else []
+            return [(int(t * 1000), v, v, v) for t, v in points]
+        res = candidates[-1]
+        if self.readonly:
+            self._load_keys()
+        key_id = self._keys.get(key)
+        if key_id is None:
+            return []
+        return [(int(row[0] * 1000), row[5], row[3], row[4])
+                for row in self._files[res].read_range(key_id, start, end)]
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        for rollup in self._files.values():
+            rollup.close()
+        self._files = {}
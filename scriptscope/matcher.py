@@ -0,0 +1,165 @@
+"""
+===========================================================================================
+ScriptScope matcher
+-------------------------------------------------------------------------------------------
+Matches process command lines against every configured script at once. All script names
+are compiled into a single regular expression shaped like a trie, so checking a command
+line costs about the same whether scripts.conf lists 4 entries or several thousands.
+
+Two modes are supported:
+  - "substring": the script name appears anywhere in the command line (`pgrep -f`).
+  - "exact": argv[0] is the script itself, or argv[0] is an interpreter (sh, bash,
+    python3, perl...) and argv[1] is the script, compared by basename. This skips
+    editors, pagers or `tail -f` processes that merely mention the script.
+
+Scripts configured with their own match rules (see config.ScriptConfig) are checked
+apart from the trie: a "match" regular expression is searched in the command line, an
+"argv" position compares that argument only. Their cwd and user filters need the pid
+and are applied when match() is given one.
+===========================================================================================
+"""
+
+import os
+import re
+
+from . import procfs
+
+SUBSTRING = "substring"
+EXACT = "exact"
+MODES = (SUBSTRING, EXACT)
+
+# Programs whose argv[1] is the script they run, in exact mode.
+_INTERPRETER = re.compile(r"(?:ba|da|tc|[ackz])?sh|(?:python|perl|ruby|php|lua)[0-9.]*"
+                          r"|node|Rscript")
+
+
+def _trie_pattern(words):
+    """
+    ================================================================================
+    Build a regular expression matching any of the words, factored as a trie so the
+    regex engine only explores branches that share the characters read so far.
+    Longer words are preferred at a given position.
+    ================================================================================
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        end = "" in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            body = ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return emit(trie)
+
+
+class ScriptMatcher:
+    """
+    ================================================================================
+    Precompiled matcher for the scripts listed in scripts.conf: paths or
+    ScriptConfig.
+    ================================================================================
+    """
+
+    def __init__(self, scripts, mode=SUBSTRING, proc_root=procfs.PROC_ROOT):
+        if mode not in MODES:
+            raise ValueError(f"unknown match mode: {mode!r}")
+        self.mode = mode
+        self.proc_root = proc_root
+        self.names = []
+        self._regexes = []
+        self._positions = []
+        self._filters = {}
+        trie_names = []
+        for script in scripts:
+            name = os.path.basename(getattr(script, "path", script))
+            if not name or name in self.names:
+                continue
+            self.names.append(name)
+            if getattr(script, "match", None) is not None:
+                self._regexes.append((name, script.match))
+            elif getattr(script, "argv", None) is not None:
+                self._positions.append((name, script.argv))
+            else:
+                trie_names.append(name)
+            cwd, uid = getattr(script, "cwd", None), getattr(script, "uid", None)
+            if cwd is not None or uid is not None:
+                self._filters[name] = (cwd, uid)
+
+        self._name_set = set(trie_names)
+        pattern = _trie_pattern(sorted(self._name_set))
+        self._regex = re.compile(pattern) if pattern else None
+        self._overlapping = re.compile("(?=(" + pattern + "))") if pattern else None
+        # Names that are a strict prefix of another name: the trie prefers the longest
+        # word at a position, so the shorter ones are recovered from this table.
+        self._prefixes = {
+            name: [name[:i] for i in range(1, len(name)) if name[:i] in self._name_set]
+            for name in self._name_set
+        }
+
+    def match(self, argv, pid=None):
+        """
+        ================================================================================
+        Return the set of script names matching a process argv. With a pid, the
+        cwd and user filters of the scripts found are checked too.
+        ================================================================================
+        """
+        if not argv:
+            return set()
+        found = self._match_names(argv)
+        if self._regexes:
+            cmdline = " ".join(argv)
+            found.update(name for name, regex in self._regexes if regex.search(cmdline))
+        for name, position in self._positions:
+            if position < len(argv) and os.path.basename(argv[position]) == name:
+                found.add(name)
+        if pid is not None and self._filters and not found.isdisjoint(self._filters):
+            found = {name for name in found
+                     if name not in self._filters or self._accepts(name, pid)}
+        return found
+
+    def _match_names(self, argv):
+        if self._regex is None:
+            return set()
+        if self.mode == EXACT:
+            return self._match_exact(argv)
+        cmdline = " ".join(argv)
+        if not self._regex.search(cmdline):
+            return set()
+        found = set()
+        for m in self._overlapping.finditer(cmdline):
+            word = m.group(1)
+            if word:
+                found.add(word)
+                found.update(self._prefixes[word])
+        return found
+
+    def _match_exact(self, argv):
+        if not argv:
+            return set()
+        program = os.path.basename(argv[0])
+        found = {program} if program in self._name_set else set()
+        if len(argv) > 1 and _INTERPRETER.fullmatch(program):
+            script = os.path.basename(argv[1])
+            if script in self._name_set:
+                found.add(script)
+        return found
+
+    def _accepts(self, name, pid):
+        cwd, uid = self._filters[name]
+        if uid is not None and procfs.read_uid(pid, self.proc_root) != uid:
+            return False
+        if cwd is not None:
+            current = procfs.read_cwd(pid, self.proc_root)
+            if current is None or (current != cwd and not current.startswith(cwd + os.sep)
+                                   and cwd != os.sep):
+                return False
+        return True
@@ -0,0 +1,292 @@
+"""
+===========================================================================================
+ScriptScope self-instrumentation
+-------------------------------------------------------------------------------------------
+Measures what the monitor itself costs. Each tick records the duration of its stages as
+histograms:
+
+    scan        listing /proc and reading the command lines
+    match       matching the command lines against the scripts
+    parse       reading stat, status and io of the matched processes
+    serialize   building the records
+    alerts      evaluating the alert rules
+    publish     stats.json, stream, history and agent
+    render      (GUI side) putting a snapshot on screen
+
+next to the ticks missed by the scheduler, the depth of the outgoing queues and the
+daemon's own CPU and RSS. The daemon publishes a summary with every snapshot under
+"self", shown as the "ScriptScope self" row of the GUI, and can serve everything in the
+Prometheus text format on a local HTTP endpoint (--metrics 127.0.0.1:9878).
+
+SIGUSR1 toggles a cProfile of the tick loop; the second signal writes the profile and a
+text summary of its hottest functions to profiles/.
+===========================================================================================
+"""
+
+import bisect
+import os
+import threading
+import time
+from array import array
+
+from . import procfs
+from .config import PROFILE_DIR
+
+STAGES = ("scan", "match", "parse", "serialize", "alerts", "publish", "render")
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SELF_NAME = "ScriptScope self"
+DEFAULT_PORT = 9878
+
+
+class Histogram:
+    """
+    ================================================================================
+    Fixed-bucket histogram of durations in seconds, Prometheus style.
+    ================================================================================
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = array("Q", bytes(8 * (len(buckets) + 1)))
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        ================================================================================
+        Estimate a quantile by linear interpolation inside its bucket. Values past
+        the last bucket are reported as its bound.
+        ================================================================================
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class ProcessUsage:
+    """
+    ================================================================================
+    CPU (% of one core since the previous call) and RSS of the current process.
+    ================================================================================
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._prev = (clock(), time.process_time())
+        self.cpu_seconds = 0.0
+
+    def read(self):
+        now, cpu = self.clock(), time.process_time()
+        elapsed = now - self._prev[0]
+        percent = (cpu - self._prev[1]) / elapsed * 100 if elapsed > 0 else 0.0
+        self._prev = (now, cpu)
+        self.cpu_seconds = cpu
+        status = procfs.read_status("self") or {}
+        return percent, procfs.status_kb(status, "VmRSS") * 1024
+
+
+class Metrics:
+    """
+    ================================================================================
+    Registry of the stage histograms, counters and gauges of one process. Safe to
+    render from another thread (the HTTP endpoint).
+    ================================================================================
+    """
+
+    def __init__(self):
+        self.stages = {name: Histogram() for name in STAGES}
+        self.counters = {"scriptscope_ticks_total": 0, "scriptscope_missed_ticks_total": 0}
+        self.gauges = {}
+        self.usage = ProcessUsage()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def quantile(self, stage, q):
+        with self._lock:
+            return self.stages[stage].quantile(q)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def self_record(self, mem_total_kb, tick_seconds=None):
+        """
+        ================================================================================
+        Sample the process's own CPU/RSS and return the "ScriptScope self" record,
+        formatted like the script records, with the tick timings in its command.
+        ================================================================================
+        """
+        from .sampler import format_etime
+        cpu, rss = self.usage.read()
+        self.set("scriptscope_cpu_percent", cpu)
+        self.set("scriptscope_resident_memory_bytes", rss)
+        with self._lock:
+            stages = {name: h.quantile(0.5) for name, h in self.stages.items() if h.count}
+            missed = self.counters["scriptscope_missed_ticks_total"]
+        summary = [f"{name} {seconds * 1000:.1f}" for name, seconds in stages.items()]
+        if tick_seconds is not None:
+            summary.insert(0, f"tick {tick_seconds * 1000:.1f}")
+        summary.append(f"missed {missed}")
+        return {
+            "script_name": SELF_NAME,
+            "pid": str(os.getpid()),
+            "cpu": f"{cpu:.1f}",
+            "mem": f"{rss / 1024 / mem_total_kb * 100:.1f}" if mem_total_kb else "0.0",
+            "etime": format_etime(time.time() - self.started),
+            "cmd": "p50 ms: " + ", ".join(summary),
+            "rss_bytes": str(rss),
+            "missed": str(missed),
+        }
+
+    def render(self):
+        """
+        ================================================================================
+        Return every metric in the Prometheus text exposition format.
+        ================================================================================
+        """
+        lines = [
+            "# HELP scriptscope_stage_duration_seconds Duration of each stage of a tick.",
+            "# TYPE scriptscope_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in self.stages.items():
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'scriptscope_stage_duration_seconds_bucket'
+                                 f'{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'scriptscope_stage_duration_seconds_sum{{stage="{name}"}} {h.sum}')
+                lines.append(f'scriptscope_stage_duration_seconds_count{{stage="{name}"}} '
+                             f'{h.count}')
+            counters = dict(self.counters)
+            counters["scriptscope_cpu_seconds_total"] = self.usage.cpu_seconds
+            for name, value in sorted(counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+            typed = set()
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} gauge")
+                    typed.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class MetricsServer:
+    """
+    ================================================================================
+    Serves Metrics.render() at /metrics over HTTP from a background thread.
+    ================================================================================
+    """
+
+    def __init__(self, metrics, address):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(address, Handler)
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address[:2]
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        name="scriptscope-metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Profiler:
+    """
+    ================================================================================
+    cProfile of the thread that calls toggle(): the first call starts profiling,
+    the second stops it and writes <directory>/scriptscope-<pid>-<time>.prof and a
+    .txt summary. Returns the path of the profile once written.
+    ================================================================================
+    """
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self._profile = None
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def toggle(self):
+        import cProfile
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            return None
+        profile, self._profile = self._profile, None
+        profile.disable()
+        return self._dump(profile)
+
+    def _dump(self, profile):
+        import pstats
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"scriptscope-{os.getpid()}-{stamp}.prof")
+        profile.dump_stats(path)
+        with open(path[:-len(".prof")] + ".txt", "w") as f:
+            pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(40)
+        return path
@@ -0,0 +1,69 @@
+"""
+===========================================================================================
+ScriptScope monitor
+-------------------------------------------------------------------------------------------
+Python counterpart of modules/monitor.sh: samples the configured scripts once, writes
+stats.json for the GUI and prints the terminal table when attached to a terminal. show()
+prints the snapshot last published by the daemon, for the shell modules.
+===========================================================================================
+"""
+
+import csv
+import sys
+
+from .config import CONFIG_FILE, STATS_FILE, load_config
+from .matcher import SUBSTRING
+from .publish import SnapshotWriter, load_snapshot
+from .sampler import IO_COUNTERS, IO_RATES, Sampler
+
+ROW_FORMAT = "{:<15} | {:<8} | {:<8} | {:<8} | {:<14} | {}"
+CSV_FIELDS = ("script_name", "pid", "cpu", "mem", "etime", "cmd") + IO_COUNTERS + IO_RATES
+
+
+def format_table(records):
+    """
+    ================================================================================
+    Format records as the pipe-separated rows printed by monitor.sh.
+    ================================================================================
+    """
+    return "\n".join(
+        ROW_FORMAT.format(r["script_name"], r["pid"], r["cpu"], r["mem"], r["etime"], r["cmd"])
+        for r in records
+    )
+
+
+def run_once(config_path=CONFIG_FILE, stats_path=STATS_FILE, out=sys.stdout,
+             match_mode=SUBSTRING, children=True):
+    """
+    ================================================================================
+    Sample once, publish stats.json and print the table on a terminal.
+    ================================================================================
+    """
+    sampler = Sampler(load_config(config_path), match_mode=match_mode, children=children)
+    snapshot = sampler.snapshot()
+    records = snapshot.records
+    SnapshotWriter(stats_path, fsync=True).publish(records, snapshot.timestamp)
+    if out.isatty():
+        print(format_table(records), file=out)
+    return records
+
+
+def show(stats_path=STATS_FILE, fmt="table", out=sys.stdout):
+    """
+    ================================================================================
+    Print the latest published snapshot as the monitor.sh table or as CSV.
+    Returns 1 when no snapshot is available yet.
+    ================================================================================
+    """
+    try:
+        records = load_snapshot(stats_path)["scripts"]
+    except (OSError, ValueError):
+        return 1
+    if fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(CSV_FIELDS)
+        for r in records:
+            writer.writerow([r.get(field, "") for field in CSV_FIELDS])
+    elif records:
+        print(format_table(records), file=out)
+    return 0
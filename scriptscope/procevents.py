@@ -0,0 +1,407 @@
+"""
+===========================================================================================
+ScriptScope process events
+-------------------------------------------------------------------------------------------
+Event-driven tracking of the process table through the kernel's netlink proc connector.
+A ProcessWatcher thread receives the fork, exec and exit events of every process, reads
+the command line of each exec as it happens and matches it against the monitored scripts,
+so the sampler gets the current PID set and matches without rescanning /proc, and runs
+shorter than a tick are still seen. Each run of a script is recorded with its exact start
+time, end time and exit code (see RunTracker), and the daemon can tick as soon as one
+starts or ends instead of waiting for the next one.
+
+The connector needs CAP_NET_ADMIN in the initial user namespace. Without it, the sampler
+keeps scanning /proc on every tick and RunTracker.observe() derives the runs from the
+difference between two scans: start times are still exact (from /proc/<pid>/stat), end
+times are those of the first tick that no longer sees the process, and exit codes are
+unknown.
+
+If the kernel drops events (the socket buffer overflowed), the watcher asks for a resync:
+the sampler rescans /proc once and reseeds the table. If the connector fails for any other
+reason, the watcher stops and sets `failed`: the sampler then goes back to scanning /proc
+on every tick, as without the connector.
+===========================================================================================
+"""
+
+import errno
+import json
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+from . import procfs
+from .config import RUNS_LOG
+
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+NLMSG_DONE = 3
+
+PROC_EVENT_NONE = 0
+PROC_EVENT_FORK = 0x00000001
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+
+_NLMSGHDR = struct.Struct("<IHHII")
+_CN_MSG = struct.Struct("<IIIIHH")
+_EVENT = struct.Struct("<IIQ")
+_DATA = struct.Struct("<4i")
+_EVENT_OFFSET = _NLMSGHDR.size + _CN_MSG.size
+_DATA_OFFSET = _EVENT_OFFSET + _EVENT.size
+
+RECV_BUFFER = 4 << 20
+RUNS_KEPT = 1000
+
+
+def exit_status(status):
+    """
+    ================================================================================
+    Decode a wait status into (exit_code, signal): the exit code as a shell
+    reports it in $? (128 + n when killed by signal n), and the signal or None.
+    ================================================================================
+    """
+    if status & 0x7F:
+        return 128 + (status & 0x7F), status & 0x7F
+    return (status >> 8) & 0xFF, None
+
+
+class ProcConnector:
+    """
+    ================================================================================
+    Netlink socket subscribed to the proc connector. Raises OSError when the
+    connector is unavailable or the subscription is refused.
+    ================================================================================
+    """
+
+    def __init__(self, timeout=1.0):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+            self.sock.bind((0, CN_IDX_PROC))
+            self._control(PROC_CN_MCAST_LISTEN)
+            self._wait_ack(timeout)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def _control(self, op):
+        body = _CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, 4, 0) + struct.pack("<I", op)
+        self.sock.send(_NLMSGHDR.pack(_NLMSGHDR.size + len(body), NLMSG_DONE, 0, 0, 0) + body)
+
+    def _wait_ack(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            ready, _, _ = select.select([self.sock], [], [], deadline - time.monotonic())
+            if not ready:
+                raise OSError(errno.ETIMEDOUT, "no answer from the proc connector")
+            for what, _, data in self._parse(self.sock.recv(65536)):
+                if what == PROC_EVENT_NONE:
+                    # The ack's err is the first field of the event data.
+                    if data[0]:
+                        raise OSError(data[0], os.strerror(data[0]))
+                    return
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @staticmethod
+    def _parse(packet):
+        offset = 0
+        while offset + _DATA_OFFSET + _DATA.size <= len(packet):
+            length = _NLMSGHDR.unpack_from(packet, offset)[0]
+            what, _, timestamp = _EVENT.unpack_from(packet, offset + _EVENT_OFFSET)
+            yield what, timestamp, _DATA.unpack_from(packet, offset + _DATA_OFFSET)
+            if length < _NLMSGHDR.size:
+                break
+            offset += (length + 3) & ~3
+
+    def read(self):
+        """
+        ================================================================================
+        Return the pending events as (what, timestamp_ns, data) tuples, where
+        timestamp_ns is on the CLOCK_MONOTONIC clock. Raises OSError(ENOBUFS) when
+        events were lost.
+        ================================================================================
+        """
+        events = []
+        while True:
+            try:
+                packet = self.sock.recv(65536, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return events
+            events.extend(self._parse(packet))
+
+    def close(self):
+        try:
+            self._control(PROC_CN_MCAST_IGNORE)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class RunTracker:
+    """
+    ================================================================================
+    Start and end of every run of the monitored scripts. Finished runs are kept
+    until drain() hands them over, as {"script", "pid", "cmd", "start", "end",
+    "duration", "exit_code", "signal"} dicts with wall-clock times; exit_code and
+    signal are None when unknown. Runs started by the supervisor are marked
+    "supervised" and only ended by it, which adds their "peak_rss". Thread-safe.
+    ================================================================================
+    """
+
+    def __init__(self, limit=RUNS_KEPT):
+        self.limit = limit
+        self.active = {}
+        self.finished = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def start(self, script, pid, start, cmd, supervised=False):
+        with self._lock:
+            run = self.active.setdefault((script, pid), {
+                "script": script, "pid": pid, "cmd": cmd, "start": start,
+            })
+            if supervised:
+                run["supervised"] = True
+
+    def running(self, script, pid):
+        return (script, pid) in self.active
+
+    def keys(self):
+        with self._lock:
+            return list(self.active)
+
+    def end(self, pid, end, exit_code=None, signal=None, script=None, supervised=False,
+            peak_rss=None):
+        """
+        ================================================================================
+        End the runs of pid (only the one of script, when given).
+        ================================================================================
+        """
+        with self._lock:
+            for key in [k for k, run in self.active.items()
+                        if k[1] == pid and script in (None, k[0])
+                        and run.get("supervised", False) == supervised]:
+                run = self.active.pop(key)
+                run.update(end=end, duration=max(end - run["start"], 0.0),
+                           exit_code=exit_code, signal=signal)
+                if peak_rss is not None:
+                    run["peak_rss"] = peak_rss
+                self.finished.append(run)
+            if len(self.finished) > self.limit:
+                self.dropped += len(self.finished) - self.limit
+                del self.finished[:-self.limit]
+
+    def observe(self, script, pids, starts, cmds, now):
+        """
+        ================================================================================
+        Scan-based tracking: start the runs of the pids of script seen for the first
+        time, with their start time and command from starts and cmds, and end those
+        no longer seen.
+        ================================================================================
+        """
+        current = set(pids)
+        for pid in current:
+            if (script, pid) not in self.active:
+                self.start(script, pid, starts.get(pid, now), cmds.get(pid))
+        for key in [k for k in self.keys() if k[0] == script and k[1] not in current]:
+            self.end(key[1], now, script=script)
+
+    def drain(self):
+        with self._lock:
+            finished, self.finished = self.finished, []
+        return finished
+
+
+class ProcessWatcher:
+    """
+    ================================================================================
+    Keeps a pid -> (argv, matched script names) table up to date from proc
+    connector events, on a background thread. start() returns False (with the
+    reason in `error`) when the connector is unavailable; the sampler then scans
+    /proc itself. on_change is called when a monitored script starts or exits.
+    ================================================================================
+    """
+
+    def __init__(self, runs, proc_root=procfs.PROC_ROOT, on_change=None):
+        self.runs = runs
+        self.proc_root = proc_root
+        self.on_change = on_change
+        self.matcher = None
+        self.error = None
+        self.resync = True
+        self.failed = False
+        self.lost = 0
+        self._argv = {}
+        self._names = {}
+        self._parent = {}
+        self._exited = None
+        self._lock = threading.Lock()
+        self._connector = None
+        self._thread = None
+        self._closing = False
+
+    @property
+    def available(self):
+        return self._connector is not None and not self.failed
+
+    def start(self):
+        try:
+            self._connector = ProcConnector()
+        except OSError as e:
+            self.error = e.strerror or str(e)
+            return False
+        self._thread = threading.Thread(target=self._run, name="scriptscope-events",
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def close(self):
+        self._closing = True
+        if self._thread is not None:
+            self._thread.join()
+        if self._connector is not None:
+            self._connector.close()
+            self._connector = None
+
+    def set_matcher(self, matcher):
+        with self._lock:
+            self.matcher = matcher
+            self._names = {pid: self._match(argv, pid) for pid, argv in self._argv.items()}
+
+    def _match(self, argv, pid):
+        return tuple(self.matcher.match(argv, pid)) if self.matcher and argv else ()
+
+    def begin_resync(self):
+        """
+        ================================================================================
+        Called before the sampler rescans /proc: exits seen from now on are kept so
+        that seed() does not bring back processes that ended during the scan.
+        ================================================================================
+        """
+        with self._lock:
+            self.resync = False
+            self._exited = set()
+
+    def seed(self, argvs, parents, starts, now):
+        """
+        ================================================================================
+        Replace the table with a full scan: argvs and parents by pid, and the start
+        times of the processes. Runs of processes that disappeared are ended.
+        ================================================================================
+        """
+        with self._lock:
+            exited, self._exited = self._exited or set(), None
+            self._argv = {pid: argv for pid, argv in argvs.items() if pid not in exited}
+            self._parent = {pid: parents.get(pid) for pid in self._argv}
+            self._names = {pid: self._match(argv, pid) for pid, argv in self._argv.items()}
+            table = dict(self._names)
+        for script, pid in self.runs.keys():
+            if pid not in table or script not in table[pid]:
+                self.runs.end(pid, now, script=script)
+        for pid, names in table.items():
+            for script in names:
+                if script not in table.get(parents.get(pid), ()):
+                    self.runs.start(script, pid, starts.get(pid, now),
+                                    " ".join(self._argv.get(pid, ())))
+
+    def table(self):
+        """
+        ================================================================================
+        Return copies of the pid -> argv and pid -> matched names tables.
+        ================================================================================
+        """
+        with self._lock:
+            return dict(self._argv), dict(self._names)
+
+    def _run(self):
+        fd = self._connector.fileno()
+        while not self._closing:
+            ready, _, _ = select.select([fd], [], [], 0.2)
+            if not ready:
+                continue
+            try:
+                events = self._connector.read()
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    print(f"scriptscope: proc connector: {e}, scanning /proc", file=sys.stderr)
+                    self.failed = True
+                    if self.on_change:
+                        self.on_change()
+                    return
+                self.lost += 1
+                self.resync = True
+                continue
+            if self._handle(events) and self.on_change:
+                self.on_change()
+
+    def _handle(self, events):
+        offset = time.time() - time.monotonic()
+        changed = False
+        for what, timestamp, data in events:
+            when = timestamp / 1e9 + offset
+            if what == PROC_EVENT_FORK:
+                parent, pid = data[1], data[3]
+                if data[2] != pid:
+                    continue  # a new thread
+                with self._lock:
+                    self._parent[pid] = parent
+                    self._argv[pid] = self._argv.get(parent, [])
+                    self._names[pid] = self._names.get(parent, ())
+            elif what == PROC_EVENT_EXEC:
+                pid = data[1]
+                argv = procfs.read_cmdline(pid, self.proc_root)
+                with self._lock:
+                    previous = self._names.get(pid, ())
+                    names = self._match(argv, pid)
+                    self._argv[pid] = argv
+                    self._names[pid] = names
+                    inherited = self._names.get(self._parent.get(pid), ())
+                for script in previous:
+                    # A forked child of a script inherits its names; exec'ing another
+                    # program (sleep, dd...) ends a run only if it had one of its own.
+                    if script not in names and self.runs.running(script, pid):
+                        changed = True
+                        self.runs.end(pid, when, script=script)
+                for script in names:
+                    if script not in inherited and not self.runs.running(script, pid):
+                        changed = True
+                        self.runs.start(script, pid, when, " ".join(argv))
+            elif what == PROC_EVENT_EXIT:
+                pid = data[0]
+                if data[1] != pid:
+                    continue  # a thread
+                with self._lock:
+                    self._argv.pop(pid, None)
+                    self._parent.pop(pid, None)
+                    names = self._names.pop(pid, ())
+                    if self._exited is not None:
+                        self._exited.add(pid)
+                if any(self.runs.running(script, pid) for script in names):
+                    changed = True
+                    self.runs.end(pid, when, *exit_status(data[2]))
+        return changed
+
+
+class RunLog:
+    """
+    ================================================================================
+    Appends finished runs to a log file, one JSON object per line.
+    ================================================================================
+    """
+
+    def __init__(self, path=RUNS_LOG):
+        self.path = path
+
+    def __call__(self, runs):
+        if not runs or not self.path:
+            return
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(run, separators=(",", ":")) + "\n" for run in runs))
@@ -0,0 +1,221 @@
+"""
+===========================================================================================
+ScriptScope /proc readers
+-------------------------------------------------------------------------------------------
+Low-level helpers that read process information straight from the /proc filesystem.
+Every function here is a thin parser over a single file, so the sampler can read what it
+needs for each process in one pass without forking `ps`, `pgrep` or `awk`. Processes may
+exit at any time between two reads: readers return None instead of raising in that case.
+===========================================================================================
+"""
+
+import os
+
+PROC_ROOT = "/proc"
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+class ProcStat:
+    """
+    ================================================================================
+    Parsed fields of /proc/<pid>/stat that ScriptScope cares about.
+    Times are in clock ticks, rss is in pages.
+    ================================================================================
+    """
+    __slots__ = ("pid", "comm", "state", "ppid", "utime", "stime", "starttime",
+                 "num_threads", "rss")
+
+    def __init__(self, pid, comm, state, ppid, utime, stime, starttime, num_threads, rss):
+        self.pid = pid
+        self.comm = comm
+        self.state = state
+        self.ppid = ppid
+        self.utime = utime
+        self.stime = stime
+        self.starttime = starttime
+        self.num_threads = num_threads
+        self.rss = rss
+
+
+def list_pids(proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return the PIDs currently listed in /proc.
+    ================================================================================
+    """
+    return [int(name) for name in os.listdir(proc_root) if name.isdigit()]
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        # The process exited or is not readable by the current user.
+        return None
+
+
+def read_uptime(proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return the system uptime in seconds.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, "uptime"))
+    return float(raw.split()[0]) if raw else 0.0
+
+
+def read_mem_total(proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return MemTotal from /proc/meminfo in kB.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, "meminfo"))
+    if raw:
+        for line in raw.splitlines():
+            if line.startswith(b"MemTotal:"):
+                return int(line.split()[1])
+    return 0
+
+
+def parse_stat(pid, raw):
+    """
+    ================================================================================
+    Parse the content of /proc/<pid>/stat.
+    The command name is wrapped in parentheses and may itself contain spaces or
+    parentheses, so the remaining fields are split after the last ')'.
+    ================================================================================
+    """
+    end = raw.rfind(b")")
+    comm = raw[raw.find(b"(") + 1:end].decode("utf-8", "replace")
+    fields = raw[end + 2:].split()
+    # Field numbers below are taken from proc(5), shifted by the pid and comm fields.
+    return ProcStat(
+        pid=pid,
+        comm=comm,
+        state=fields[0].decode("ascii", "replace"),
+        ppid=int(fields[1]),
+        utime=int(fields[11]),
+        stime=int(fields[12]),
+        starttime=int(fields[19]),
+        num_threads=int(fields[17]),
+        rss=int(fields[21]),
+    )
+
+
+def read_stat(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Read and parse /proc/<pid>/stat, or return None if the process is gone.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, str(pid), "stat"))
+    if not raw:
+        return None
+    try:
+        return parse_stat(pid, raw)
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_status(raw):
+    """
+    ================================================================================
+    Parse the "Key: value" lines of /proc/<pid>/status into a dict of strings.
+    ================================================================================
+    """
+    status = {}
+    for line in raw.splitlines():
+        key, sep, value = line.partition(b":")
+        if sep:
+            status[key.decode("ascii", "replace")] = value.strip().decode("utf-8", "replace")
+    return status
+
+
+def read_status(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Read /proc/<pid>/status, or return None if the process is gone.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, str(pid), "status"))
+    return parse_status(raw) if raw else None
+
+
+def parse_io(raw):
+    """
+    ================================================================================
+    Parse /proc/<pid>/io into a dict of integer counters.
+    ================================================================================
+    """
+    counters = {}
+    for line in raw.splitlines():
+        key, sep, value = line.partition(b":")
+        if sep:
+            try:
+                counters[key.decode("ascii", "replace")] = int(value)
+            except ValueError:
+                pass
+    return counters
+
+
+def read_io(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Read /proc/<pid>/io. Only processes owned by the current user (or every process
+    when running as root) expose it, so None is returned when it is not readable.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, str(pid), "io"))
+    return parse_io(raw) if raw else None
+
+
+def read_cmdline(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return the argv list of a process. Kernel threads and zombies have an empty
+    cmdline, in which case an empty list is returned.
+    ================================================================================
+    """
+    raw = _read(os.path.join(proc_root, str(pid), "cmdline"))
+    if not raw:
+        return []
+    return raw.rstrip(b"\0").decode("utf-8", "replace").split("\0")
+
+
+def read_cwd(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return the working directory of a process, or None if it cannot be read.
+    ================================================================================
+    """
+    try:
+        return os.readlink(os.path.join(proc_root, str(pid), "cwd"))
+    except OSError:
+        return None
+
+
+def read_uid(pid, proc_root=PROC_ROOT):
+    """
+    ================================================================================
+    Return the (effective) uid owning a process, or None if it is gone.
+    ================================================================================
+    """
+    try:
+        return os.stat(os.path.join(proc_root, str(pid))).st_uid
+    except OSError:
+        return None
+
+
+def status_kb(status, key):
+    """
+    ================================================================================
+    Return a "<n> kB" field of /proc/<pid>/status as an integer number of kB.
+    ================================================================================
+    """
+    try:
+        return int(status.get(key, "0").split()[0])
+    except (IndexError, ValueError):
+        return 0
@@ -0,0 +1,113 @@
+"""
+===========================================================================================
+ScriptScope process tree
+-------------------------------------------------------------------------------------------
+Parent/children index of the process table, used to roll the cost of child processes up
+to the script that started them. The index persists across ticks: each tick only reads
+/proc/<pid>/stat for PIDs that appeared since the previous one and forgets the PIDs that
+disappeared, so an unchanged process table costs a directory listing and a set difference.
+
+Processes that are re-read by the sampler (the tracked scripts and their descendants)
+refresh their entry, which keeps the parent links of the tracked subtrees exact even
+when a process is reparented.
+===========================================================================================
+"""
+
+from . import procfs
+
+
+class ProcessTree:
+    """
+    ================================================================================
+    Incrementally maintained pid -> (ppid, starttime) table and ppid -> children
+    index.
+    ================================================================================
+    """
+
+    def __init__(self, proc_root=procfs.PROC_ROOT):
+        self.proc_root = proc_root
+        self._entries = {}
+        self._children = {}
+
+    def __contains__(self, pid):
+        return pid in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, pids):
+        """
+        ================================================================================
+        Bring the index in line with the current list of PIDs.
+        ================================================================================
+        """
+        current = set(pids)
+        known = self._entries.keys()
+        for pid in known - current:
+            self._remove(pid)
+        for pid in current - known:
+            stat = procfs.read_stat(pid, self.proc_root)
+            if stat is not None:
+                self._add(pid, stat.ppid, stat.starttime)
+
+    def refresh(self, pid, ppid, starttime):
+        """
+        ================================================================================
+        Record fresh stat values of a process: follows reparenting and PID reuse.
+        ================================================================================
+        """
+        if self._entries.get(pid) == (ppid, starttime):
+            return
+        self._remove(pid)
+        self._add(pid, ppid, starttime)
+
+    def _add(self, pid, ppid, starttime):
+        self._entries[pid] = (ppid, starttime)
+        self._children.setdefault(ppid, set()).add(pid)
+
+    def _remove(self, pid):
+        entry = self._entries.pop(pid, None)
+        if entry is None:
+            return
+        siblings = self._children.get(entry[0])
+        if siblings is not None:
+            siblings.discard(pid)
+            if not siblings:
+                del self._children[entry[0]]
+
+    def parent(self, pid):
+        entry = self._entries.get(pid)
+        return entry[0] if entry else None
+
+    def descendants(self, pid):
+        """
+        ================================================================================
+        Return every descendant of a process, parents before their children.
+        ================================================================================
+        """
+        found = []
+        stack = sorted(self._children.get(pid, ()), reverse=True)
+        seen = {pid}
+        while stack:
+            child = stack.pop()
+            if child in seen:
+                continue
+            seen.add(child)
+            found.append(child)
+            stack.extend(sorted(self._children.get(child, ()), reverse=True))
+        return found
+
+    def has_ancestor_in(self, pid, pids):
+        """
+        ================================================================================
+        Return True when one of the ancestors of pid is in the given set.
+        ================================================================================
+        """
+        seen = set()
+        parent = self.parent(pid)
+        while parent and parent not in seen:
+            if parent in pids:
+                return True
+            seen.add(parent)
+            parent = self.parent(parent)
+        return False
@@ -0,0 +1,132 @@
+"""
+===========================================================================================
+ScriptScope snapshot publication
+-------------------------------------------------------------------------------------------
+Writes stats.json so that readers never observe a partially written file: each snapshot
+is written to a temporary file in the same directory and published with an atomic
+rename. The payload carries a monotonically increasing sequence number and a timestamp,
+
+    {"seq": 42, "timestamp": 1719057861.25, "scripts": [{...}, ...]}
+
+so readers can tell whether anything changed without re-rendering. When alert rules are
+loaded, the payload also lists the alerts currently firing under "alerts". The plain list
+written by the legacy modules/monitor.sh is still accepted by the reader.
+===========================================================================================
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from .config import STATS_FILE
+
+
+def load_snapshot(path=STATS_FILE):
+    """
+    ================================================================================
+    Read a stats file and return its payload as {"seq", "timestamp", "scripts"}.
+    Raises OSError or ValueError when the file is missing or not valid JSON.
+    ================================================================================
+    """
+    with open(path, "r") as f:
+        payload = json.load(f)
+    if isinstance(payload, list):
+        return {"seq": None, "timestamp": None, "scripts": payload}
+    payload.setdefault("seq", None)
+    payload.setdefault("timestamp", None)
+    payload.setdefault("scripts", [])
+    return payload
+
+
+class SnapshotWriter:
+    """
+    ================================================================================
+    Publishes snapshots to a stats file with write-to-temp + atomic rename.
+    The sequence number continues from the file already on disk, if any. The
+    rename alone keeps readers consistent; fsync=True also flushes each file to
+    disk first, which is only worth it for a one-shot write: a daemon rewrites
+    the file on the next tick anyway.
+    ================================================================================
+    """
+
+    def __init__(self, path=STATS_FILE, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.seq = self._last_seq()
+
+    def _last_seq(self):
+        try:
+            return int(load_snapshot(self.path)["seq"] or 0)
+        except (OSError, ValueError, TypeError):
+            return 0
+
+    def publish(self, records, timestamp=None, extra=None):
+        """
+        ================================================================================
+        Write a new snapshot and return its sequence number. extra holds additional
+        top-level fields of the payload (such as "alerts").
+        ================================================================================
+        """
+        self.seq += 1
+        payload = {
+            "seq": self.seq,
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "scripts": records,
+        }
+        if extra:
+            payload.update(extra)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(
+            prefix="." + os.path.basename(self.path) + ".", suffix=".tmp", dir=directory
+        )
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "w") as f:
+                json.dump(payload, f, separators=(",", ":"))
+                f.write("\n")
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return self.seq
+
+
+class SnapshotReader:
+    """
+    ================================================================================
+    Reads the stats file only when a new snapshot has been published.
+    read() returns the payload dict, or None when nothing changed since the last
+    successful read or when the file is missing or unreadable.
+    ================================================================================
+    """
+
+    def __init__(self, path=STATS_FILE):
+        self.path = path
+        self.seq = None
+        self._stamp = None
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        # Every publication renames a new file in place, so the inode changes too.
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return None
+        try:
+            payload = load_snapshot(self.path)
+        except (OSError, ValueError):
+            return None
+        self._stamp = stamp
+        if payload["seq"] is not None and payload["seq"] == self.seq:
+            return None
+        self.seq = payload["seq"]
+        return payload
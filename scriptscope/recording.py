@@ -0,0 +1,344 @@
+"""
+===========================================================================================
+ScriptScope recordings
+-------------------------------------------------------------------------------------------
+Reads back the files written by the exporter (export.py), csv, jsonl or columnar, plain,
+.gz or .zst, and the one-snapshot CSV files of `exporter.sh` (timestamped with their
+mtime). A Recording yields {"seq", "timestamp", "scripts", ...} snapshots in the shape
+the daemon publishes, one at a time, from any point in time.
+
+Seeking uses a time index built on the first open and saved next to the recording as
+<file>.idx (kept in memory only when the directory is read-only). It holds the timestamp
+and byte offset of a snapshot about every INDEX_STEP bytes (at most MAX_INDEX_ENTRIES),
+the time range of the recording and, for columnar files, the string table. For a plain
+file the index is built by probing one line per step (csv and jsonl) or by walking the
+block headers (columnar) instead of reading everything, so a multi-gigabyte recording
+opens in well under a second. A compressed file has to be decompressed once. The index
+is rebuilt when the size or mtime of the recording changes.
+
+A CSV index entry may point into the middle of a snapshot; reading from a time therefore
+starts at the last entry strictly before it and drops the snapshots before that time.
+===========================================================================================
+"""
+
+import bisect
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from .config import parse_duration
+from .export import FORMATS, ColumnarFormat, open_export, read_columnar, scan_columnar
+from .sampler import IO_COUNTERS, IO_RATES
+
+INDEX_VERSION = 1
+INDEX_STEP = 1 << 20
+MAX_INDEX_ENTRIES = 4096
+TAIL_BYTES = 1 << 16
+
+# Header names of the CSV files written by the shell engine.
+_CSV_ALIASES = {"elapsed_time": "etime", "command": "cmd"}
+_INT_FIELDS = frozenset(("pid", "seq") + IO_COUNTERS)
+_FLOAT_FIELDS = frozenset(("timestamp", "cpu", "cpu_total", "mem") + IO_RATES)
+_JSON_TIMESTAMP = re.compile(rb'"timestamp":\s*(-?[0-9.eE+-]+)')
+_CLOCK = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}(?:\.\d*)?))?$")
+
+
+def recording_format(path):
+    """
+    ================================================================================
+    Format of a recording: from its extension, else from its first bytes.
+    ================================================================================
+    """
+    name = path
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    extension = os.path.splitext(name)[1].lstrip(".")
+    if extension in FORMATS:
+        return extension
+    with open_export(path) as f:
+        head = f.read(len(ColumnarFormat.MAGIC))
+    if head == ColumnarFormat.MAGIC:
+        return "columnar"
+    return "jsonl" if head.lstrip().startswith(b"{") else "csv"
+
+
+def parse_position(text, first, current=None):
+    """
+    ================================================================================
+    Parse a position in a recording that starts at `first` (epoch seconds):
+    "+30s" or "-5m" from `current` (default first), "90s" or "10m" from the
+    start, "14:05[:30]" on the day of the recording (or the next one), a date
+    "2026-10-17 14:05[:30]", or epoch seconds.
+    ================================================================================
+    """
+    text = text.strip()
+    if text[:1] in "+-":
+        offset = parse_duration(text[1:])
+        return (first if current is None else current) + (offset if text[0] == "+" else -offset)
+    m = _CLOCK.match(text)
+    if m:
+        day = datetime.fromtimestamp(first).replace(hour=0, minute=0, second=0, microsecond=0)
+        at = day + timedelta(hours=int(m.group(1)), minutes=int(m.group(2)),
+                             seconds=float(m.group(3) or 0))
+        if at.timestamp() < first - 1:
+            at += timedelta(days=1)
+        return at.timestamp()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    try:
+        value = float(text)
+    except ValueError:
+        return first + parse_duration(text)
+    # A bare number is a time since the start, unless it looks like an epoch.
+    return value if value >= 1e9 else first + value
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def _csv_value(field, text):
+    if text in ("", "-"):
+        return None
+    try:
+        if field in _INT_FIELDS:
+            return int(text)
+        if field in _FLOAT_FIELDS:
+            return float(text)
+    except ValueError:
+        pass
+    return text
+
+
+def _line_timestamp(fmt, line):
+    """
+    ================================================================================
+    Timestamp of a csv or jsonl line, or None when it has none (header, partial
+    or continuation line).
+    ================================================================================
+    """
+    if fmt == "jsonl":
+        m = _JSON_TIMESTAMP.search(line, 0, 256) or _JSON_TIMESTAMP.search(line)
+        text = m.group(1) if m else None
+    else:
+        text = line.split(b",", 1)[0]
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class Recording:
+    """
+    ================================================================================
+    One recording file, opened with its time index. snapshots() reads it from a
+    time; first and last bound the recorded time range (None when empty).
+    ================================================================================
+    """
+
+    def __init__(self, path, save_index=True):
+        self.path = path
+        self.format = recording_format(path)
+        self.compressed = path.endswith((".gz", ".zst"))
+        self.save_index = save_index
+        self.index = self._load_index() or self._build_index()
+        self._times = [entry[0] for entry in self.index["entries"]]
+
+    @property
+    def first(self):
+        return self.index["first"]
+
+    @property
+    def last(self):
+        return self.index["last"]
+
+    @property
+    def index_path(self):
+        return self.path + ".idx"
+
+    def _open(self):
+        f = open_export(self.path)
+        # The zstd reader has no readline(): buffer it.
+        return io.BufferedReader(f) if self.path.endswith(".zst") else f
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return st.st_size, st.st_mtime_ns
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        size, mtime_ns = self._stamp()
+        if (not isinstance(index, dict) or index.get("version") != INDEX_VERSION
+                or index.get("size") != size or index.get("mtime_ns") != mtime_ns):
+            return None
+        return index
+
+    def _build_index(self):
+        size, mtime_ns = self._stamp()
+        index = {"version": INDEX_VERSION, "size": size, "mtime_ns": mtime_ns,
+                 "format": self.format, "first": None, "last": None, "entries": []}
+        with self._open() as f:
+            if self.format == "columnar":
+                self._index_columnar(f, index)
+            else:
+                self._index_text(f, index, size)
+        if self.save_index:
+            tmp_path = self.index_path + ".tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f, separators=(",", ":"))
+                os.replace(tmp_path, self.index_path)
+            except OSError:
+                pass
+        return index
+
+    def _index_columnar(self, f, index):
+        if f.read(len(ColumnarFormat.MAGIC)) != ColumnarFormat.MAGIC:
+            raise ValueError(f"{self.path}: not a ScriptScope columnar export")
+        strings = []
+        entries = index["entries"]
+        next_offset = 0
+        for offset, known, first, last in scan_columnar(f, strings):
+            if index["first"] is None:
+                index["first"] = first
+            index["last"] = last
+            if offset >= next_offset:
+                entries.append([first, offset, known])
+                next_offset = offset + INDEX_STEP
+        index["strings"] = strings
+
+    def _index_text(self, f, index, size):
+        start = 0
+        if self.format == "csv":
+            header = f.readline()
+            start = len(header)
+            index["header"] = header.decode("utf-8", "replace")
+            if "timestamp" not in self._csv_fields(index):
+                # A single snapshot from `exporter.sh`, taken when the file was written.
+                index["first"] = index["last"] = os.stat(self.path).st_mtime
+                index["entries"].append([index["first"], start])
+                return
+        entries = index["entries"]
+        if self.compressed:
+            # Seeking means decompressing: read it all once.
+            offset, next_offset = start, start
+            for line in iter(f.readline, b""):
+                timestamp = _line_timestamp(self.format, line)
+                if timestamp is not None:
+                    if index["first"] is None:
+                        index["first"] = timestamp
+                    index["last"] = timestamp
+                    if offset >= next_offset:
+                        entries.append([timestamp, offset])
+                        next_offset = offset + INDEX_STEP
+                offset += len(line)
+            return
+        step = max(INDEX_STEP, size // MAX_INDEX_ENTRIES)
+        for probe in range(start, size, step):
+            f.seek(probe)
+            if probe != start:
+                f.readline()
+            entry = self._next_line(f)
+            if entry and (not entries or entry[1] > entries[-1][1]):
+                entries.append(entry)
+        if entries:
+            index["first"] = entries[0][0]
+            f.seek(max(size - TAIL_BYTES, start))
+            if f.tell() != start:
+                f.readline()
+            last = entries[-1]
+            while True:
+                entry = self._next_line(f)
+                if entry is None:
+                    break
+                last = entry
+            index["last"] = last[0]
+
+    def _next_line(self, f):
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                return None
+            timestamp = _line_timestamp(self.format, line)
+            if timestamp is not None:
+                return [timestamp, offset]
+
+    def _csv_fields(self, index=None):
+        header = (index or self.index)["header"]
+        row = next(csv.reader([header.strip("\r\n")]), [])
+        return [_CSV_ALIASES.get(field, field) for field in row]
+
+    def snapshots(self, start=None, end=None):
+        """
+        ================================================================================
+        Yield the snapshots with start <= timestamp <= end (None: no bound), in
+        file order, reading from the last index entry before start.
+        ================================================================================
+        """
+        entries = self.index["entries"]
+        if not entries:
+            return
+        i = 0
+        if start is not None:
+            i = max(bisect.bisect_left(self._times, start) - 1, 0)
+        entry = entries[i]
+        with self._open() as f:
+            f.seek(entry[1])
+            if self.format == "columnar":
+                source = read_columnar(f, self.index["strings"][:entry[2]])
+            elif self.format == "jsonl":
+                source = (json.loads(line) for line in f if line.strip())
+            else:
+                source = self._read_csv(f)
+            for snapshot in source:
+                timestamp = snapshot.get("timestamp")
+                if start is not None and (timestamp is None or timestamp < start):
+                    continue
+                if end is not None and timestamp is not None and timestamp > end:
+                    return
+                yield snapshot
+
+    def _read_csv(self, f):
+        fields = self._csv_fields()
+        rows = csv.reader(line.decode("utf-8", "replace") for line in f)
+        if "timestamp" not in fields:
+            records = [self._csv_record(fields, row) for row in rows if row]
+            yield {"seq": None, "timestamp": self.first, "scripts": records}
+            return
+        key, records = None, []
+        for row in rows:
+            if len(row) < 2:
+                continue
+            timestamp, seq = _csv_value("timestamp", row[0]), _csv_value("seq", row[1])
+            if not isinstance(timestamp, float):
+                continue
+            if (timestamp, seq) != key:
+                if key is not None:
+                    yield {"seq": key[1], "timestamp": key[0], "scripts": records}
+                key, records = (timestamp, seq), []
+            records.append(self._csv_record(fields, row))
+        if key is not None:
+            yield {"seq": key[1], "timestamp": key[0], "scripts": records}
+
+    @staticmethod
+    def _csv_record(fields, row):
+        record = {}
+        for field, text in zip(fields, row):
+            if field not in ("timestamp", "seq"):
+                record[field] = _csv_value(field, text)
+        if not record.get("host"):
+            record.pop("host", None)
+        return record
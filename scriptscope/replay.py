@@ -0,0 +1,267 @@
+"""
+===========================================================================================
+ScriptScope replay
+-------------------------------------------------------------------------------------------
+Plays a recording (see recording.py) back through the same outputs as the daemon: each
+snapshot is published to a stats file and a stream socket, by default replay.json and
+replay.sock so that a running daemon is left alone. The GUI (started unless --no-gui),
+`scriptscope top --socket replay.sock` or any stream client then shows the recorded
+scripts as if they were live, with their recorded timestamps.
+
+Snapshots are published at the pace they were recorded, times `speed`. Gaps longer than
+max_gap seconds (the daemon was stopped, or nothing was exported overnight) are shortened
+to max_gap. When stdin is a terminal, playback is controlled by typing a command and
+Enter:
+
+    (empty) or p    pause / resume
+    speed N         play N times faster (0.25, 4, 60...); + and - double and halve it
+    seek POS        jump to a position: +30s, -5m, 10m (from the start), 14:05:30, ...
+    q               quit
+
+Seeking goes through the recording's time index, so it is immediate in plain files.
+===========================================================================================
+"""
+
+import importlib.util
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from .config import PROJECT_ROOT, REPLAY_SOCKET_FILE, REPLAY_STATS_FILE
+from .recording import Recording, format_time, parse_position
+
+DEFAULT_MAX_GAP = 5.0
+# Slice of the waits, so that a stop or a GUI exit is noticed quickly.
+POLL_SECONDS = 0.25
+
+
+class Player:
+    """
+    ================================================================================
+    Paces the snapshots of a recording and hands them to publish(snapshot). The
+    state (speed, pause, position) is changed with command() from the control
+    input, between two snapshots.
+    ================================================================================
+    """
+
+    def __init__(self, recording, publish, speed=1.0, max_gap=DEFAULT_MAX_GAP,
+                 clock=time.monotonic):
+        if speed <= 0:
+            raise ValueError("the speed must be positive")
+        self.recording = recording
+        self.publish = publish
+        self.speed = speed
+        self.max_gap = max_gap
+        self.clock = clock
+        self.paused = False
+        self.position = recording.first
+        self.published = 0
+        self.controls = None
+        self._seek = None
+
+    def status(self):
+        state = " (paused)" if self.paused else ""
+        position = "-" if self.position is None else format_time(self.position)
+        return f"replay: {position} x{self.speed:g}{state}"
+
+    def command(self, line):
+        """
+        ================================================================================
+        Apply one control command. Returns False for quit; raises ValueError for
+        an invalid command.
+        ================================================================================
+        """
+        words = line.split(None, 1)
+        name = words[0].lower() if words else "p"
+        argument = words[1] if len(words) > 1 else ""
+        if name in ("q", "quit"):
+            return False
+        if name in ("p", "pause", "play"):
+            self.paused = not self.paused if name == "p" else name == "pause"
+        elif name in ("+", "-"):
+            self.speed = self.speed * 2 if name == "+" else self.speed / 2
+        elif name in ("s", "speed"):
+            speed = float(argument)
+            if speed <= 0:
+                raise ValueError("the speed must be positive")
+            self.speed = speed
+        elif name in ("g", "seek"):
+            if not argument or self.recording.first is None:
+                raise ValueError("seek needs a position")
+            self._seek = self.position = parse_position(argument, self.recording.first,
+                                                        self.position)
+        else:
+            raise ValueError(f"unknown command: {line.strip()!r}")
+        return True
+
+    def run(self, stop, start=None, end=None, loop=False, controls=None):
+        """
+        ================================================================================
+        Play from start to end (epoch seconds, None for the whole recording) until
+        stop is set, the end is reached (start over with loop) or quit is typed.
+        controls is a file object with a fileno() to read commands from, or None.
+        ================================================================================
+        """
+        self.controls = controls
+        snapshots = self.recording.snapshots(start, end)
+        if start is not None:
+            self.position = start
+        deadline = self.clock()
+        pending = None
+        while not stop.is_set():
+            if self._seek is not None:
+                snapshots = self.recording.snapshots(self._seek, end)
+                self.position, self._seek, pending = self._seek, None, None
+                deadline = self.clock()
+            if self.paused:
+                if not self._wait(stop, self.clock() + POLL_SECONDS):
+                    return
+                deadline = self.clock()
+                continue
+            if pending is None:
+                pending = next(snapshots, None)
+                if pending is None:
+                    if not loop:
+                        return
+                    snapshots = self.recording.snapshots(start, end)
+                    self.position = self.recording.first if start is None else start
+                    continue
+            timestamp = pending.get("timestamp")
+            if timestamp is not None and self.position is not None:
+                delay = min(max(timestamp - self.position, 0.0) / self.speed, self.max_gap)
+                # Behind by more than a gap (slow consumer): do not burst to catch up.
+                target = max(deadline + delay, self.clock() - self.max_gap)
+                state = (self.speed, self.paused, self._seek)
+                if not self._wait(stop, target):
+                    return
+                if (self.speed, self.paused, self._seek) != state:
+                    deadline = self.clock()
+                    continue
+                if self.clock() < target:
+                    continue
+                deadline = target
+            self.publish(pending)
+            self.published += 1
+            if timestamp is not None:
+                self.position = timestamp
+            pending = None
+
+    def _wait(self, stop, deadline):
+        """
+        ================================================================================
+        Wait until deadline, applying the commands typed meanwhile. Returns False
+        when playback must stop. Returns early after a command.
+        ================================================================================
+        """
+        while not stop.is_set():
+            timeout = deadline - self.clock()
+            if timeout <= 0:
+                return True
+            timeout = min(timeout, POLL_SECONDS)
+            if self.controls is None:
+                stop.wait(timeout)
+                continue
+            readable, _, _ = select.select([self.controls], [], [], timeout)
+            if not readable:
+                continue
+            line = self.controls.readline()
+            if not line:
+                # Control input closed: play on without it.
+                self.controls = None
+                continue
+            try:
+                if not self.command(line):
+                    stop.set()
+                    return False
+            except ValueError as e:
+                print(f"replay: {e}", file=sys.stderr)
+            print(self.status(), file=sys.stderr)
+            return True
+        return False
+
+
+def _start_gui(stats_path, socket_path):
+    if importlib.util.find_spec("PyQt5") is None:
+        print("scriptscope: PyQt5 is not installed, replaying without the GUI",
+              file=sys.stderr)
+        return None
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_ROOT + (os.pathsep + env["PYTHONPATH"]
+                                        if env.get("PYTHONPATH") else "")
+    return subprocess.Popen([sys.executable, "-m", "gui.main", "--stats", stats_path,
+                             "--socket", socket_path], cwd=PROJECT_ROOT, env=env)
+
+
+def run_replay(path, speed=1.0, start=None, end=None, loop=False, max_gap=DEFAULT_MAX_GAP,
+               stats_path=REPLAY_STATS_FILE, socket_path=REPLAY_SOCKET_FILE, gui=True):
+    """
+    ================================================================================
+    Replay a recording in the foreground until its end (or SIGTERM, SIGINT, quit
+    or the GUI closing), publishing to stats_path and the stream socket (either
+    may be None). start and end are positions (see recording.parse_position).
+    ================================================================================
+    """
+    from .publish import SnapshotWriter
+    from .stream import StreamServer
+
+    writer = server = None
+
+    def publish(snapshot):
+        records = snapshot.get("scripts") or []
+        timestamp = snapshot.get("timestamp")
+        extra = {key: value for key, value in snapshot.items()
+                 if key not in ("seq", "timestamp", "scripts")}
+        seq = writer.publish(records, timestamp, extra) if writer else player.published + 1
+        if server:
+            server.publish(dict(extra, seq=seq, timestamp=timestamp, scripts=records))
+
+    try:
+        recording = Recording(path)
+        if recording.first is None:
+            raise ValueError("no snapshot recorded")
+        start_time = parse_position(start, recording.first) if start else None
+        end_time = parse_position(end, recording.first) if end else None
+        player = Player(recording, publish, speed, max_gap)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"scriptscope: {path}: {e}", file=sys.stderr)
+        return 1
+
+    if stats_path:
+        writer = SnapshotWriter(stats_path)
+    if socket_path:
+        server = StreamServer(socket_path)
+        server.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    controls = sys.stdin if sys.stdin.isatty() else None
+    print(f"scriptscope: replaying {path} ({format_time(recording.first)} .. "
+          f"{format_time(recording.last)}) to {socket_path or stats_path}", file=sys.stderr)
+
+    gui_process = _start_gui(stats_path, socket_path) if gui and stats_path and socket_path \
+        else None
+    if gui_process is not None:
+        # Closing the GUI ends the replay.
+        def watch():
+            gui_process.wait()
+            stop.set()
+        threading.Thread(target=watch, name="scriptscope-replay-gui", daemon=True).start()
+    try:
+        player.run(stop, start_time, end_time, loop, controls)
+        if gui_process is not None and not stop.is_set():
+            print("scriptscope: end of the recording, close the GUI to quit",
+                  file=sys.stderr)
+            while not stop.is_set():
+                stop.wait(POLL_SECONDS)
+    finally:
+        if server:
+            server.close()
+        if gui_process is not None and gui_process.poll() is None:
+            gui_process.terminate()
+            gui_process.wait()
+    print(f"scriptscope: replayed {player.published} snapshots", file=sys.stderr)
+    return 0
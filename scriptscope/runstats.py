@@ -0,0 +1,205 @@
+"""
+===========================================================================================
+ScriptScope run statistics
+-------------------------------------------------------------------------------------------
+Per-script statistics of finished runs (see procevents.RunTracker and supervisor.py):
+number of runs and failures, mean and maximum duration, last exit status, peak RSS, and
+the p50/p95/p99 durations from a QuantileSketch.
+
+The sketch keeps one counter per logarithmic bucket of width 1 + 2 * accuracy, so any
+quantile is returned within `accuracy` (1% by default) of a true value, in constant
+memory whatever the number of runs: durations from a millisecond to a month fit in about
+900 buckets. Sketches merge by adding their counters, and serialize to JSON so the
+statistics survive a daemon restart (runstats.json in the history directory).
+===========================================================================================
+"""
+
+import json
+import math
+import os
+import time
+
+DEFAULT_ACCURACY = 0.01
+QUANTILES = (0.5, 0.95, 0.99)
+# Durations below this (in seconds) are counted in the zero bucket.
+MIN_VALUE = 1e-3
+SAVE_INTERVAL = 60.0
+
+
+class QuantileSketch:
+    """
+    ================================================================================
+    Streaming quantile sketch with relative accuracy (DDSketch-style).
+    ================================================================================
+    """
+    __slots__ = ("accuracy", "gamma", "_log_gamma", "bins", "zeros", "count")
+
+    def __init__(self, accuracy=DEFAULT_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        if value < MIN_VALUE:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """
+        ================================================================================
+        Return the q-quantile (0 <= q <= 1) of the values added, or None when empty.
+        ================================================================================
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {"accuracy": self.accuracy, "zeros": self.zeros,
+                "bins": {str(k): v for k, v in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("accuracy", DEFAULT_ACCURACY))
+        sketch.zeros = int(data.get("zeros", 0))
+        sketch.bins = {int(k): int(v) for k, v in data.get("bins", {}).items()}
+        sketch.count = sketch.zeros + sum(sketch.bins.values())
+        return sketch
+
+
+class ScriptRunStats:
+    """
+    ================================================================================
+    Statistics of the finished runs of one script.
+    ================================================================================
+    """
+    __slots__ = ("runs", "failures", "total", "longest", "last_exit", "last_end",
+                 "peak_rss", "sketch")
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.last_exit = None
+        self.last_end = None
+        self.peak_rss = None
+        self.sketch = QuantileSketch()
+
+    def add(self, run):
+        duration = run.get("duration") or 0.0
+        self.runs += 1
+        self.total += duration
+        self.longest = max(self.longest, duration)
+        self.sketch.add(duration)
+        self.last_exit = run.get("exit_code")
+        self.last_end = run.get("end")
+        if self.last_exit not in (None, 0):
+            self.failures += 1
+        if run.get("peak_rss") is not None:
+            self.peak_rss = max(self.peak_rss or 0, run["peak_rss"])
+
+    def summary(self):
+        """
+        ================================================================================
+        Return the statistics as published with the snapshots, durations in seconds.
+        ================================================================================
+        """
+        summary = {
+            "runs": self.runs, "failures": self.failures,
+            "mean": round(self.total / self.runs, 3) if self.runs else None,
+            "max": round(self.longest, 3), "last_exit": self.last_exit,
+            "last_end": self.last_end, "peak_rss": self.peak_rss,
+        }
+        for q in QUANTILES:
+            value = self.sketch.quantile(q)
+            summary[f"p{round(q * 100)}"] = None if value is None else round(value, 3)
+        return summary
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__ if name != "sketch"}
+        data["sketch"] = self.sketch.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in cls.__slots__:
+            if name != "sketch" and name in data:
+                setattr(stats, name, data[name])
+        stats.sketch = QuantileSketch.from_dict(data.get("sketch", {}))
+        return stats
+
+
+class RunStatistics:
+    """
+    ================================================================================
+    ScriptRunStats of every script, optionally persisted to a JSON file (at most
+    every SAVE_INTERVAL seconds, and on save()). Summaries are cached until the
+    script has a new run.
+    ================================================================================
+    """
+
+    def __init__(self, path=None, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.scripts = {}
+        self._summaries = {}
+        self._saved = clock()
+        if path:
+            self.load()
+
+    def add(self, runs):
+        for run in runs:
+            stats = self.scripts.get(run["script"])
+            if stats is None:
+                stats = self.scripts[run["script"]] = ScriptRunStats()
+            stats.add(run)
+            self._summaries.pop(run["script"], None)
+        if runs and self.path and self.clock() - self._saved >= SAVE_INTERVAL:
+            self.save()
+
+    def summary(self):
+        for script, stats in self.scripts.items():
+            if script not in self._summaries:
+                self._summaries[script] = stats.summary()
+        return dict(self._summaries)
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.scripts = {script: ScriptRunStats.from_dict(value)
+                            for script, value in data.items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            self.scripts = {}
+        self._summaries = {}
+
+    def save(self):
+        if not self.path:
+            return
+        self._saved = self.clock()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({script: stats.to_dict() for script, stats in self.scripts.items()}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,500 @@
+"""
+===========================================================================================
+ScriptScope sampler
+-------------------------------------------------------------------------------------------
+In-process replacement for the `pgrep`/`ps`/`awk` pipeline of modules/monitor.sh. A tick
+walks /proc once, matches every command line against all configured scripts at once with
+a precompiled ScriptMatcher and reads stat, status and io only for the processes that
+matched. The resulting samples convert to the same records the GUI reads from stats.json,
+extended with the /proc/<pid>/io counters and their per-second rates.
+
+By default the cost of a script includes all of its descendants: the CPU, RSS and I/O of
+the processes it forked are rolled up into its record, and listed under "children".
+With cgroup accounting enabled (see cgroup.py), scripts that run in their own cgroup are
+read from it instead, in one record per script.
+
+With a ProcessWatcher (see procevents.py), the process table and the matches come from
+kernel process events instead of a scan of /proc on every tick.
+
+Scripts configured with a metric set (see config.ScriptConfig) skip the files they do
+not need: status without "mem", io without "io". sample() can be limited to the scripts
+that are due; the others keep their previous samples.
+===========================================================================================
+"""
+
+import os
+import time
+
+from . import procfs
+from .matcher import SUBSTRING, ScriptMatcher
+from .procevents import RunTracker
+from .proctree import ProcessTree
+from .snapshot import Snapshot
+
+NOT_RUNNING = "(not running)"
+
+# /proc/<pid>/io counters reported per process, and the record fields of their rates.
+IO_COUNTERS = ("read_bytes", "write_bytes", "syscr", "syscw", "cancelled_write_bytes")
+IO_RATES = ("read_rate", "write_rate", "syscr_rate", "syscw_rate", "cancelled_write_rate")
+
+
+def format_etime(seconds):
+    """
+    ================================================================================
+    Format an elapsed time like `ps -o etime`: [[dd-]hh:]mm:ss.
+    ================================================================================
+    """
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}"
+    if hours:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class ProcessSample:
+    """
+    ================================================================================
+    One sampled process of a monitored script. A sample with pid None stands for a
+    configured script that has no running process. When children are set, the
+    numbers include them.
+    ================================================================================
+    """
+    __slots__ = ("script_name", "pid", "cpu", "cpu_total", "mem", "etime", "cmd",
+                 "io", "io_rates", "ppid", "children", "extra")
+
+    def __init__(self, script_name, pid=None, cpu=0.0, cpu_total=0.0, mem=0.0, etime=0.0,
+                 cmd=NOT_RUNNING, io=None, io_rates=None, ppid=None, children=None,
+                 extra=None):
+        self.script_name = script_name
+        self.pid = pid
+        self.cpu = cpu
+        self.cpu_total = cpu_total
+        self.mem = mem
+        self.etime = etime
+        self.cmd = cmd
+        # Tuples ordered like IO_COUNTERS / IO_RATES, or None when io is not readable.
+        self.io = io
+        self.io_rates = io_rates
+        self.ppid = ppid
+        self.children = children
+        # Additional record fields, e.g. from cgroup accounting.
+        self.extra = extra
+
+    def with_children(self, script_name, children):
+        """
+        ================================================================================
+        Return a copy of this sample for script_name with the children's CPU, memory
+        and I/O added to its own.
+        ================================================================================
+        """
+        processes = [self] + children
+        return ProcessSample(
+            script_name, self.pid,
+            _total(p.cpu for p in processes), _total(p.cpu_total for p in processes),
+            _total(p.mem for p in processes), self.etime, self.cmd,
+            _sum_columns(p.io for p in processes),
+            _sum_columns(p.io_rates for p in processes),
+            self.ppid, children,
+        )
+
+    @property
+    def read_bytes(self):
+        return self.io[0] if self.io else None
+
+    @property
+    def write_bytes(self):
+        return self.io[1] if self.io else None
+
+    @property
+    def running(self):
+        return self.pid is not None
+
+    def to_record(self):
+        """
+        ================================================================================
+        Convert the sample to a stats.json record. Values are strings formatted like
+        the `ps` output monitor.sh used to write, with "-" for missing values.
+        ================================================================================
+        """
+        if not self.running:
+            record = {
+                "script_name": self.script_name, "pid": "-", "cpu": "-", "cpu_total": "-",
+                "mem": "-", "etime": "-", "cmd": self.cmd,
+            }
+            record.update(dict.fromkeys(IO_COUNTERS + IO_RATES, "-"))
+            return record
+        record = {
+            "script_name": self.script_name,
+            "pid": str(self.pid),
+            "cpu": "-" if self.cpu is None else f"{self.cpu:.1f}",
+            "cpu_total": "-" if self.cpu_total is None else f"{self.cpu_total:.2f}",
+            "mem": "-" if self.mem is None else f"{self.mem:.1f}",
+            "etime": format_etime(self.etime),
+            "cmd": self.cmd,
+        }
+        for name, value in zip(IO_COUNTERS, self.io or (None,) * len(IO_COUNTERS)):
+            record[name] = "-" if value is None else str(value)
+        for name, value in zip(IO_RATES, self.io_rates or (None,) * len(IO_RATES)):
+            record[name] = "-" if value is None else f"{value:.1f}"
+        if self.children is not None:
+            record["nprocs"] = str(len(self.children) + 1)
+            record["children"] = [dict(child.to_record(), script_name=self.script_name,
+                                       ppid=str(child.ppid))
+                                  for child in self.children]
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+
+def _total(values):
+    """
+    ================================================================================
+    Sum values, or None when one of them was not collected.
+    ================================================================================
+    """
+    total = 0.0
+    for value in values:
+        if value is None:
+            return None
+        total += value
+    return total
+
+
+def _sum_columns(rows):
+    """
+    ================================================================================
+    Sum tuples column by column, skipping None; None when every row is None.
+    ================================================================================
+    """
+    total = None
+    for row in rows:
+        if row is None:
+            continue
+        total = row if total is None else tuple(a + b for a, b in zip(total, row))
+    return total
+
+
+class Sampler:
+    """
+    ================================================================================
+    Samples the processes of the configured scripts from /proc.
+
+    CPU usage and I/O rates are measured over the interval between two calls to
+    sample(): the sampler remembers the utime + stime, the io counters and the time
+    of the last read of every process, keyed by (pid, starttime) so a recycled PID
+    starts from scratch. "cpu" is in percent of one core (like `ps`), "cpu_total"
+    is normalized to the whole machine; I/O rates are per second.
+
+    With children=True, each matched process is sampled together with its
+    descendants, found through a ProcessTree kept up to date across ticks. A
+    matched process whose ancestor matches the same script is folded into that
+    ancestor instead of being reported twice.
+
+    With a CgroupAccounting, matched processes are moved into their script's
+    group and every script whose group holds processes is read from the group.
+
+    With a Metrics registry (see metrics.py), the scan, match, parse and serialize
+    stages of every tick are timed into it.
+
+    The runs of every script are recorded in `runs`, a RunTracker: by the
+    ProcessWatcher events when one is given, from the difference between two
+    samples otherwise or once the watcher has failed.
+    ================================================================================
+    """
+
+    def __init__(self, scripts, proc_root=procfs.PROC_ROOT, match_mode=SUBSTRING,
+                 children=True, cgroups=None, metrics=None, events=None):
+        self.proc_root = proc_root
+        self.match_mode = match_mode
+        self.mem_total = procfs.read_mem_total(proc_root)
+        self.cpu_count = os.cpu_count() or 1
+        self._prev = {}
+        self.tree = ProcessTree(proc_root) if children else None
+        self.cgroups = cgroups
+        self.metrics = metrics
+        self.events = events
+        self.runs = events.runs if events is not None else RunTracker()
+        self._last = {}
+        self.set_scripts(scripts)
+
+    def set_scripts(self, scripts):
+        """
+        ================================================================================
+        Replace the monitored scripts (paths or ScriptConfig) and recompile the
+        matcher.
+        ================================================================================
+        """
+        self.scripts = [os.path.basename(getattr(script, "path", script))
+                        for script in scripts]
+        self.metric_sets = {script.name: script.metrics for script in scripts
+                            if getattr(script, "metrics", None) is not None}
+        self.matcher = ScriptMatcher(scripts, self.match_mode, self.proc_root)
+        if self.events is not None:
+            self.events.set_matcher(self.matcher)
+
+    def scan(self):
+        """
+        ================================================================================
+        Walk the process table once and match every command line against all the
+        configured scripts. Returns ({script_name: [pid, ...]}, {pid: cmdline}) with
+        pids in ascending order, skipping kernel threads and the sampler itself.
+        ================================================================================
+        """
+        started = time.perf_counter()
+        own_pid = os.getpid()
+        matches = {}
+        cmdlines = {}
+        watching = self.events is not None and not self.events.failed
+        if watching and not self.events.resync:
+            argvs, names = self.events.table()
+            if self.tree is not None:
+                self.tree.update(argvs)
+            scanned = time.perf_counter()
+            for pid in sorted(pid for pid, found in names.items() if found):
+                if pid != own_pid:
+                    cmdlines[pid] = " ".join(argvs[pid])
+                    for name in names[pid]:
+                        matches.setdefault(name, []).append(pid)
+        else:
+            if watching:
+                self.events.begin_resync()
+            pids = sorted(procfs.list_pids(self.proc_root))
+            if self.tree is not None:
+                self.tree.update(pids)
+            argvs = [(pid, procfs.read_cmdline(pid, self.proc_root))
+                     for pid in pids if pid != own_pid]
+            scanned = time.perf_counter()
+            for pid, argv in argvs:
+                names = self.matcher.match(argv, pid)
+                if names:
+                    cmdlines[pid] = " ".join(argv)
+                    for name in names:
+                        matches.setdefault(name, []).append(pid)
+            if watching:
+                self._seed_events(dict(argvs), cmdlines)
+        if self.metrics is not None:
+            self.metrics.observe("scan", scanned - started)
+            self.metrics.observe("match", time.perf_counter() - scanned)
+        return matches, cmdlines
+
+    def _seed_events(self, argvs, matched):
+        """
+        ================================================================================
+        Hand a full scan to the ProcessWatcher, with the parents and start times of
+        the matched processes.
+        ================================================================================
+        """
+        now = time.time()
+        boot = now - procfs.read_uptime(self.proc_root)
+        parents, starts = {}, {}
+        for pid in matched:
+            stat = procfs.read_stat(pid, self.proc_root)
+            if stat is not None:
+                parents[pid] = stat.ppid
+                starts[pid] = boot + stat.starttime / procfs.CLK_TCK
+        self.events.seed(argvs, parents, starts, now)
+
+    def sample(self, due=None):
+        """
+        ================================================================================
+        Take one sample. Returns a list of ProcessSample in configuration order, with
+        one "not running" sample for each script that has no process. When due is
+        a set of script names, only those are read; the other scripts repeat their
+        last samples.
+        ================================================================================
+        """
+        uptime = procfs.read_uptime(self.proc_root)
+        matches, cmdlines = self.scan()
+        started = time.perf_counter()
+        prev, self._prev = self._prev, {}
+        read = {}
+        samples = []
+        last, self._last = self._last, {}
+        for script_name in self.scripts:
+            if due is not None and script_name not in due and script_name in last:
+                kept = self._last[script_name] = last[script_name]
+                samples.extend(kept)
+                continue
+            first = len(samples)
+            self._sample_script(script_name, matches, cmdlines, uptime, prev, read, samples)
+            self._last[script_name] = samples[first:]
+        if due is not None:
+            # The processes of the scripts not read keep their previous counters.
+            for key, value in prev.items():
+                self._prev.setdefault(key, value)
+            self._prune_prev(matches)
+        if self.metrics is not None:
+            self.metrics.observe("parse", time.perf_counter() - started)
+        return samples
+
+    def _prune_prev(self, matches):
+        """
+        ================================================================================
+        Drop the counters of processes that are neither matched nor a descendant of
+        a matched process any more.
+        ================================================================================
+        """
+        alive = set()
+        for pids in matches.values():
+            alive.update(pids)
+            if self.tree is not None:
+                for pid in pids:
+                    alive.update(self.tree.descendants(pid))
+        for key in [key for key in self._prev if key[0] not in alive]:
+            del self._prev[key]
+
+    def _sample_script(self, script_name, matches, cmdlines, uptime, prev, read, samples):
+        """
+        ================================================================================
+        Append the samples of one script to samples. read caches the processes
+        already read this tick (a process matched by several scripts is read with
+        the metric set of the first one).
+        ================================================================================
+        """
+        metrics = self.metric_sets.get(script_name)
+        found = False
+        pids = matches.get(script_name, ())
+        if self.tree is not None:
+            matched = set(pids)
+            pids = [pid for pid in pids if not self.tree.has_ancestor_in(pid, matched)]
+        if self.cgroups is not None:
+            sample = self._sample_cgroup(script_name, pids, cmdlines, uptime)
+            if sample is not None:
+                samples.append(sample)
+                self._observe_runs(script_name, pids, read, cmdlines)
+                return
+        for pid in pids:
+            if pid not in read:
+                read[pid] = self._read_process(pid, cmdlines[pid], uptime, prev, metrics)
+            sample = read[pid]
+            if sample is None:
+                continue
+            found = True
+            children = None
+            if self.tree is not None:
+                children = []
+                for child in self.tree.descendants(pid):
+                    if child not in read:
+                        cmd = " ".join(procfs.read_cmdline(child, self.proc_root))
+                        read[child] = self._read_process(child, cmd, uptime, prev, metrics)
+                    if read[child] is not None:
+                        children.append(read[child])
+            samples.append(sample.with_children(script_name, children)
+                           if children is not None else
+                           ProcessSample(script_name, sample.pid, sample.cpu,
+                                         sample.cpu_total, sample.mem, sample.etime,
+                                         sample.cmd, sample.io, sample.io_rates,
+                                         sample.ppid))
+        if not found:
+            samples.append(ProcessSample(script_name))
+        self._observe_runs(script_name, pids, read, cmdlines)
+
+    def _observe_runs(self, script_name, pids, read, cmdlines):
+        if self.events is not None and not self.events.failed:
+            return
+        now = time.time()
+        starts = {pid: now - read[pid].etime for pid in pids if read.get(pid)}
+        # Processes sampled through their cgroup were not read: they count as seen.
+        self.runs.observe(script_name, [pid for pid in pids if read.get(pid, True)], starts,
+                          cmdlines, now)
+
+    def snapshot(self, due=None):
+        """
+        ================================================================================
+        Take one sample (of the scripts in due, or all) and return it as a Snapshot
+        of stats.json records.
+        ================================================================================
+        """
+        samples = self.sample(due)
+        started = time.perf_counter()
+        records = [sample.to_record() for sample in samples]
+        if self.metrics is not None:
+            self.metrics.observe("serialize", time.perf_counter() - started)
+        return Snapshot(records)
+
+    def _sample_cgroup(self, script_name, pids, cmdlines, uptime):
+        """
+        ================================================================================
+        Adopt the matched processes into the script's cgroup and read the group.
+        Returns None when the group holds no process.
+        ================================================================================
+        """
+        in_group = set(self.cgroups.procs(script_name))
+        for pid in pids:
+            if pid in in_group:
+                continue
+            self.cgroups.attach(script_name, pid)
+            if self.tree is not None:
+                for child in self.tree.descendants(pid):
+                    self.cgroups.attach(script_name, child)
+        data = self.cgroups.read(script_name, self.mem_total, self.cpu_count, self.proc_root)
+        if data is None:
+            return None
+        root = pids[0] if pids else min(data["pids"])
+        stat = procfs.read_stat(root, self.proc_root)
+        etime = max(uptime - stat.starttime / procfs.CLK_TCK, 0.0) if stat else 0.0
+        cmd = cmdlines.get(root) or " ".join(procfs.read_cmdline(root, self.proc_root))
+        extra = {"accounting": "cgroup", "nprocs": str(len(data["pids"]))}
+        if data["mem_peak"] is not None:
+            extra["mem_peak"] = str(data["mem_peak"])
+        return ProcessSample(
+            script_name, root, data["cpu"], data["cpu_total"], data["mem"], etime, cmd,
+            (data["read_bytes"], data["write_bytes"], None, None, None),
+            (data["read_rate"], data["write_rate"], None, None, None),
+            stat.ppid if stat else None, extra=extra,
+        )
+
+    def _read_process(self, pid, cmd, uptime, prev_reads, metrics=None):
+        """
+        ================================================================================
+        Read stat, status and io of a tracked process. CPU and I/O rates are computed
+        against the previous read of the same process; a process seen for the first
+        time gets its lifetime average, as `ps -o pcpu` reports for CPU. metrics is
+        the set of metrics to collect (all when None); the others are left None.
+        ================================================================================
+        """
+        stat = procfs.read_stat(pid, self.proc_root)
+        now = time.monotonic()
+        if stat is None:
+            return None
+        status = None
+        if metrics is None or "mem" in metrics:
+            status = procfs.read_status(pid, self.proc_root)
+            if status is None:
+                return None
+        if self.tree is not None:
+            self.tree.refresh(pid, stat.ppid, stat.starttime)
+        io = procfs.read_io(pid, self.proc_root) if metrics is None or "io" in metrics else None
+
+        etime = max(uptime - stat.starttime / procfs.CLK_TCK, 0.0)
+        ticks = stat.utime + stat.stime
+        counters = tuple(io.get(name, 0) for name in IO_COUNTERS) if io else None
+        key = (pid, stat.starttime)
+        prev = prev_reads.get(key)
+        self._prev[key] = (ticks, now, counters)
+        if prev is not None and now > prev[1]:
+            elapsed = now - prev[1]
+            cpu = (ticks - prev[0]) / procfs.CLK_TCK / elapsed * 100
+            base = prev[2]
+        else:
+            elapsed = etime
+            cpu = ticks / procfs.CLK_TCK / etime * 100 if etime > 0 else 0.0
+            base = (0,) * len(IO_COUNTERS)
+        rates = None
+        if counters is not None and base is not None:
+            rates = tuple(max(c - b, 0) / elapsed if elapsed > 0 else 0.0
+                          for c, b in zip(counters, base))
+        mem = None
+        if status is not None:
+            rss_kb = procfs.status_kb(status, "VmRSS")
+            mem = rss_kb / self.mem_total * 100 if self.mem_total else 0.0
+        if metrics is not None and "cpu" not in metrics:
+            return ProcessSample(None, pid, None, None, mem, etime, cmd, counters, rates,
+                                 stat.ppid)
+        return ProcessSample(
+            None, pid, cpu, cpu / self.cpu_count, mem, etime, cmd, counters, rates, stat.ppid,
+        )
@@ -0,0 +1,324 @@
+"""
+===========================================================================================
+ScriptScope shared snapshot map
+-------------------------------------------------------------------------------------------
+Optional publication of the latest snapshot into a fixed-layout memory-mapped file, so
+that local consumers read numbers instead of parsing JSON. Enabled with `daemon --map`.
+
+    header   64 bytes     magic, seqlock, seq, timestamp, record count and size,
+                          offset and size of the string table, flags
+    records  count * 112  one packed record per row (see RECORD_FIELDS)
+    strings               UTF-8 script names, commands and hosts, referenced by
+                          (offset, length) from the records
+
+Values are native numbers: float32 for the percentages and rates, int64 for the io
+counters, -1 / NaN when missing. The children of a script follow its record with the
+CHILD flag, and the daemon's own record comes last with the SELF flag.
+
+The header's lock is a seqlock: the writer makes it odd before touching the map and
+even again once done, and a reader retries whenever it saw an odd value or the value
+changed while it copied the records out. When a snapshot outgrows the file, the writer
+publishes a larger one under the same name and flags the old one MOVED, which makes
+readers reopen it.
+===========================================================================================
+"""
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+from .config import MAP_FILE
+from .export import etime_seconds
+from .sampler import IO_COUNTERS, IO_RATES
+
+MAGIC = b"SSMAP1\0\n"
+DEFAULT_SIZE = 1 << 20
+
+# Record flags.
+RUNNING = 1
+CHILD = 2
+SELF = 4
+# Header flags.
+MOVED = 1
+
+FLOAT_FIELDS = ("cpu", "cpu_total", "mem") + IO_RATES
+INT_FIELDS = IO_COUNTERS
+RECORD_FIELDS = (("flags", "nprocs", "pid", "ppid", "etime") + FLOAT_FIELDS + INT_FIELDS)
+
+_HEADER = struct.Struct("<8sQqdIIQQII")
+_LOCK = struct.Struct("<Q")
+_LOCK_OFFSET = 8
+# name, cmd and host as (offset, length), then RECORD_FIELDS.
+_RECORD = struct.Struct("<6IHHiii" + "f" * len(FLOAT_FIELDS) + "q" * len(INT_FIELDS))
+_STRINGS = 6
+_READ_RETRIES = 100
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+class _StringTable:
+    __slots__ = ("parts", "size", "index")
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.index = {}
+
+    def add(self, text):
+        text = text or ""
+        ref = self.index.get(text)
+        if ref is None:
+            data = text.encode("utf-8")
+            ref = self.index[text] = (self.size, len(data))
+            self.parts.append(data)
+            self.size += len(data)
+        return ref
+
+
+def _pack(records, own):
+    """
+    ================================================================================
+    Pack stats records (and the daemon's own record) into the records and string
+    table sections. Returns (count, bytes).
+    ================================================================================
+    """
+    strings = _StringTable()
+    rows = []
+
+    def add(record, flags):
+        pid = _int(record.get("pid"))
+        if pid >= 0:
+            flags |= RUNNING
+        etime = etime_seconds(record.get("etime"))
+        rows.append(_RECORD.pack(
+            *strings.add(record.get("script_name")), *strings.add(record.get("cmd")),
+            *strings.add(record.get("host")),
+            flags, min(max(_int(record.get("nprocs")), 0), 0xFFFF), pid,
+            _int(record.get("ppid")), -1 if etime is None else min(etime, 0x7FFFFFFF),
+            *(_float(record.get(name)) for name in FLOAT_FIELDS),
+            *(_int(record.get(name)) for name in INT_FIELDS),
+        ))
+
+    for record in records:
+        add(record, 0)
+        for child in record.get("children") or ():
+            add(child, CHILD)
+    if own:
+        add(own, SELF)
+    return len(rows), b"".join(rows) + b"".join(strings.parts)
+
+
+class SharedMapWriter:
+    """
+    ================================================================================
+    Publishes snapshots into the shared map at path, growing the file when a
+    snapshot does not fit.
+    ================================================================================
+    """
+
+    def __init__(self, path=MAP_FILE, size=DEFAULT_SIZE):
+        self.path = path
+        self.map = None
+        self.lock = 0
+        self._create(size)
+
+    def _create(self, size):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(self.path) + ".",
+                                        suffix=".tmp", dir=directory)
+        try:
+            os.fchmod(fd, 0o644)
+            os.ftruncate(fd, size)
+            new = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # Odd until the first snapshot is written into it.
+        _HEADER.pack_into(new, 0, MAGIC, self.lock | 1, -1, 0.0, 0, _RECORD.size,
+                          _HEADER.size, 0, 0, 0)
+        os.replace(tmp_path, self.path)
+        self._retire()
+        self.map = new
+
+    def _retire(self):
+        if self.map is not None:
+            flags_offset = _HEADER.size - 8
+            struct.pack_into("<I", self.map, flags_offset, MOVED)
+            self.map.close()
+            self.map = None
+
+    def publish(self, records, seq, timestamp, own=None):
+        count, body = _pack(records, own)
+        needed = _HEADER.size + len(body)
+        if needed > len(self.map):
+            size = len(self.map)
+            while size < needed:
+                size *= 2
+            self._create(size)
+        m = self.map
+        self.lock |= 1
+        _LOCK.pack_into(m, _LOCK_OFFSET, self.lock)
+        m[_HEADER.size:needed] = body
+        _HEADER.pack_into(m, 0, MAGIC, self.lock, seq, timestamp, count, _RECORD.size,
+                          _HEADER.size + count * _RECORD.size,
+                          len(body) - count * _RECORD.size, 0, 0)
+        self.lock += 1
+        _LOCK.pack_into(m, _LOCK_OFFSET, self.lock)
+
+    def close(self, unlink=True):
+        self._retire()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class SharedSnapshot:
+    """
+    ================================================================================
+    A consistent copy of the records section of the map. Fields are unpacked on
+    access: column() reads one field of every row, records() rebuilds the
+    stats records (with numbers instead of strings) and the daemon's own record.
+    ================================================================================
+    """
+    __slots__ = ("seq", "timestamp", "count", "_data", "_strings")
+
+    def __init__(self, seq, timestamp, count, data):
+        self.seq = None if seq < 0 else seq
+        self.timestamp = timestamp
+        self.count = count
+        self._data = memoryview(data)
+        self._strings = count * _RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def _rows(self):
+        return _RECORD.iter_unpack(self._data[:self._strings])
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return str(self._data[start:start + length], "utf-8", "replace")
+
+    def column(self, name):
+        """
+        ================================================================================
+        Return the values of one of RECORD_FIELDS for every row, in map order.
+        ================================================================================
+        """
+        index = _STRINGS + RECORD_FIELDS.index(name)
+        return [row[index] for row in self._rows()]
+
+    def records(self):
+        """
+        ================================================================================
+        Return (records, own): the script records with their children nested and
+        missing values as None, and the daemon's own record (or None).
+        ================================================================================
+        """
+        records = []
+        own = None
+        strings = {}
+        ints = _STRINGS + 5
+        floats = ints + len(FLOAT_FIELDS)
+        for row in self._rows():
+            flags, nprocs, pid, ppid, etime = row[_STRINGS:ints]
+            record = {
+                "script_name": strings.get(row[:2]) or strings.setdefault(
+                    row[:2], self._string(row[0], row[1])),
+                "cmd": self._string(row[2], row[3]),
+                "pid": pid if flags & RUNNING else "-",
+                "ppid": None if ppid < 0 else ppid,
+                "etime": None if etime < 0 else etime,
+            }
+            if row[5]:
+                record["host"] = self._string(row[4], row[5])
+            if nprocs:
+                record["nprocs"] = nprocs
+            record.update(zip(FLOAT_FIELDS, [None if v != v else v for v in row[ints:floats]]))
+            record.update(zip(INT_FIELDS, [None if v < 0 else v for v in row[floats:]]))
+            if flags & SELF:
+                own = record
+            elif flags & CHILD and records:
+                records[-1].setdefault("children", []).append(record)
+            else:
+                records.append(record)
+        return records, own
+
+
+class SharedMapReader:
+    """
+    ================================================================================
+    Reads the shared map published by the daemon. read() returns a SharedSnapshot
+    when a new one was published since the last call, None otherwise, and raises
+    OSError when the map is missing.
+    ================================================================================
+    """
+
+    def __init__(self, path=MAP_FILE):
+        self.path = path
+        self.map = None
+        self.lock = None
+        self._inode = None
+
+    def open(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise OSError(f"{self.path}: {e}") from None
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise OSError(f"{self.path}: not a ScriptScope map")
+        self._inode = st.st_ino
+        self.lock = None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def _replaced(self):
+        flags = struct.unpack_from("<I", self.map, _HEADER.size - 8)[0]
+        if flags & MOVED:
+            return True
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return True
+
+    def read(self):
+        if self.map is None or self._replaced():
+            self.open()
+        m = self.map
+        for _ in range(_READ_RETRIES):
+            lock = _LOCK.unpack_from(m, _LOCK_OFFSET)[0]
+            if lock == self.lock:
+                return None
+            if lock & 1:
+                continue
+            (_, _, seq, timestamp, count, record_size, strings_offset, strings_size,
+             _, _) = _HEADER.unpack_from(m, 0)
+            if record_size != _RECORD.size:
+                raise OSError(f"{self.path}: unsupported record size {record_size}")
+            data = m[_HEADER.size:strings_offset + strings_size]
+            if _LOCK.unpack_from(m, _LOCK_OFFSET)[0] == lock:
+                self.lock = lock
+                return SharedSnapshot(seq, timestamp, count, data)
+        return None
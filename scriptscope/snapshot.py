@@ -0,0 +1,147 @@
+"""
+===========================================================================================
+ScriptScope snapshots
+-------------------------------------------------------------------------------------------
+The Snapshot type shared by every consumer of the engine (GUI, terminal tools, exporters),
+and the helpers that turn the string values of stats.json records back into numbers.
+Records stay the plain dicts written by ProcessSample.to_record(), so a snapshot read
+from stats.json, the stream socket or an export wraps the same data without copying it.
+===========================================================================================
+"""
+
+import time
+
+
+def safe_float(value):
+    """
+    ================================================================================
+    Safe float conversion.
+    ================================================================================
+    """
+    try:
+        return float(value)
+    except Exception:
+        return 0.0
+
+
+def safe_div(num, denom):
+    """
+    ================================================================================
+    Safe division.
+    ================================================================================
+    """
+    try:
+        return round(num / denom, 2) if denom else 0.0
+    except Exception:
+        return 0.0
+
+
+def time_to_seconds(time_str):
+    """
+    ================================================================================
+    Convert time string ([dd-]hh:mm:ss or mm:ss, as `ps -o etime`) to seconds.
+    ================================================================================
+    """
+    days, _, clock = time_str.rpartition('-')
+    parts = clock.split(':')
+    try:
+        days = int(days) if days else 0
+        if len(parts) == 2:  # mm:ss
+            return days * 86400 + int(parts[0]) * 60 + int(parts[1])
+        elif len(parts) == 3:  # hh:mm:ss
+            return days * 86400 + int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+    except ValueError:
+        pass
+    return 0
+
+
+def format_rate(value):
+    """
+    ================================================================================
+    Format a bytes-per-second rate with a binary prefix ("1.5 MiB"), or "-" when
+    the value is missing.
+    ================================================================================
+    """
+    if value in (None, "", "-"):
+        return "-"
+    rate = safe_float(value)
+    for prefix in ("", "Ki", "Mi", "Gi"):
+        if abs(rate) < 1024 or prefix == "Gi":
+            break
+        rate /= 1024
+    return f"{rate:.0f} B" if not prefix else f"{rate:.1f} {prefix}B"
+
+
+def display_name(record):
+    """
+    ================================================================================
+    Script name of a record, prefixed with its host ("worker-3/backup.sh") when
+    it comes from a collector.
+    ================================================================================
+    """
+    name = record.get("script_name", "")
+    host = record.get("host")
+    return f"{host}/{name}" if host else name
+
+
+class Snapshot:
+    """
+    ================================================================================
+    One published sample of every monitored script: its sequence number (None for
+    the legacy stats.json list), timestamp, records and the alerts firing.
+    ================================================================================
+    """
+    __slots__ = ("seq", "timestamp", "records", "alerts")
+
+    def __init__(self, records, seq=None, timestamp=None, alerts=None):
+        self.records = records
+        self.seq = seq
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.alerts = alerts
+
+    @classmethod
+    def from_payload(cls, payload):
+        """
+        ================================================================================
+        Wrap a payload as published in stats.json or on the stream. The legacy
+        plain list of records is accepted too.
+        ================================================================================
+        """
+        if isinstance(payload, list):
+            return cls(payload)
+        return cls(payload.get("scripts", []), payload.get("seq"), payload.get("timestamp"),
+                   payload.get("alerts"))
+
+    def to_payload(self):
+        payload = {"seq": self.seq, "timestamp": self.timestamp, "scripts": self.records}
+        if self.alerts is not None:
+            payload["alerts"] = self.alerts
+        return payload
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def running(self):
+        """
+        ================================================================================
+        Return the records of the processes that are running.
+        ================================================================================
+        """
+        return [r for r in self.records if r.get("pid") not in (None, "", "-")]
+
+    def by_script(self):
+        """
+        ================================================================================
+        Group the records by script name, keeping their order.
+        ================================================================================
+        """
+        groups = {}
+        for r in self.records:
+            groups.setdefault(r.get("script_name", ""), []).append(r)
+        return groups
+
+    def __repr__(self):
+        return f"Snapshot(seq={self.seq}, records={len(self.records)})"
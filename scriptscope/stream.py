@@ -0,0 +1,385 @@
+"""
+===========================================================================================
+ScriptScope stream
+-------------------------------------------------------------------------------------------
+Local Unix domain socket that pushes every snapshot of the daemon to its subscribers, so
+the GUI and tools share one sampling pass without reading stats.json. The protocol is
+newline-delimited JSON in both directions.
+
+Client requests:
+    {"op": "subscribe"}                                  every script
+    {"op": "subscribe", "scripts": ["cpu_stress.sh"]}    only these scripts
+    {"op": "unsubscribe"}                                stop receiving snapshots
+
+Server messages are snapshots shaped like stats.json:
+    {"seq": 42, "timestamp": 1719057861.25, "scripts": [{...}, ...]}
+
+A new subscriber immediately receives the latest snapshot. A subscriber that reads more
+slowly than snapshots are published only gets the most recent one once it catches up, so
+a stalled client never makes the daemon buffer without bound.
+===========================================================================================
+"""
+
+import json
+import os
+import queue
+import select
+import selectors
+import socket
+import sys
+import threading
+
+from .config import SOCKET_FILE
+
+RECV_SIZE = 65536
+MAX_REQUEST_SIZE = 65536
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def filter_snapshot(payload, scripts):
+    """
+    ================================================================================
+    Return a copy of the snapshot restricted to the given script names.
+    ================================================================================
+    """
+    filtered = dict(payload, scripts=[r for r in payload["scripts"]
+                                      if r.get("script_name") in scripts])
+    if "alerts" in payload:
+        filtered["alerts"] = [a for a in payload["alerts"] if a.get("script") in scripts]
+    return filtered
+
+
+class _Subscriber:
+    __slots__ = ("sock", "inbuf", "sending", "pending", "subscribed", "scripts")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b""
+        self.sending = None
+        self.pending = None
+        self.subscribed = False
+        self.scripts = None
+
+
+class StreamServer:
+    """
+    ================================================================================
+    Serves snapshots on a Unix socket from a background thread. publish() may be
+    called from any thread; all socket work happens on the server thread.
+    ================================================================================
+    """
+
+    def __init__(self, path=SOCKET_FILE):
+        self.path = path
+        self._latest = None
+        self._queue = queue.SimpleQueue()
+        self._selector = selectors.DefaultSelector()
+        self._subscribers = {}
+        self._listener = None
+        self._thread = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._closing = False
+
+    def start(self):
+        """
+        ================================================================================
+        Bind the socket, replacing a stale socket file, and start serving.
+        ================================================================================
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(16)
+        listener.setblocking(False)
+        self._listener = listener
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._serve, name="scriptscope-stream",
+                                        daemon=True)
+        self._thread.start()
+
+    def publish(self, payload):
+        self._queue.put(payload)
+        self._wake()
+
+    def close(self):
+        self._closing = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    @property
+    def subscriber_count(self):
+        return sum(1 for s in self._subscribers.values() if s.subscribed)
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _serve(self):
+        try:
+            while not self._closing:
+                for key, events in self._selector.select():
+                    if key.fileobj is self._listener:
+                        self._accept()
+                    elif key.fileobj == self._wake_r:
+                        self._drain_wake()
+                    else:
+                        sub = self._subscribers.get(key.fileobj)
+                        if sub is None:
+                            continue
+                        if events & selectors.EVENT_READ:
+                            self._receive(sub)
+                        if events & selectors.EVENT_WRITE and sub.sock in self._subscribers:
+                            self._flush(sub)
+        finally:
+            for sub in list(self._subscribers.values()):
+                self._drop(sub)
+            self._selector.close()
+            self._listener.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self._subscribers[sock] = _Subscriber(sock)
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _drain_wake(self):
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        payload = None
+        while True:
+            try:
+                payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if payload is not None:
+            self._latest = payload
+            self._broadcast(payload)
+
+    def _broadcast(self, payload):
+        encoded = {}
+        for sub in list(self._subscribers.values()):
+            if not sub.subscribed:
+                continue
+            if sub.scripts not in encoded:
+                encoded[sub.scripts] = encode(
+                    payload if sub.scripts is None else filter_snapshot(payload, sub.scripts)
+                )
+            self._send(sub, encoded[sub.scripts])
+
+    def _send(self, sub, data):
+        if sub.sending is None:
+            sub.sending = memoryview(data)
+        else:
+            # Still busy with an older snapshot: only the newest one is kept.
+            sub.pending = data
+        self._flush(sub)
+
+    def _flush(self, sub):
+        while sub.sending is not None:
+            try:
+                sent = sub.sock.send(sub.sending)
+            except BlockingIOError:
+                break
+            except OSError:
+                self._drop(sub)
+                return
+            sub.sending = sub.sending[sent:]
+            if not sub.sending:
+                sub.sending = memoryview(sub.pending) if sub.pending else None
+                sub.pending = None
+        events = selectors.EVENT_READ
+        if sub.sending is not None:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(sub.sock, events)
+
+    def _receive(self, sub):
+        try:
+            data = sub.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(sub)
+            return
+        sub.inbuf += data
+        *lines, sub.inbuf = sub.inbuf.split(b"\n")
+        if len(sub.inbuf) > MAX_REQUEST_SIZE:
+            self._drop(sub)
+            return
+        for line in lines:
+            if line.strip():
+                self._handle(sub, line)
+
+    def _handle(self, sub, line):
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+        except (ValueError, AttributeError):
+            return
+        if op == "subscribe":
+            scripts = request.get("scripts")
+            if scripts is not None and not (isinstance(scripts, list)
+                                            and all(isinstance(s, str) for s in scripts)):
+                # A malformed filter only costs that client its connection.
+                self._drop(sub)
+                return
+            sub.scripts = frozenset(scripts) if scripts else None
+            sub.subscribed = True
+            if self._latest is not None:
+                latest = self._latest
+                if sub.scripts is not None:
+                    latest = filter_snapshot(latest, sub.scripts)
+                self._send(sub, encode(latest))
+        elif op == "unsubscribe":
+            sub.subscribed = False
+            sub.pending = None
+
+    def _drop(self, sub):
+        self._subscribers.pop(sub.sock, None)
+        try:
+            self._selector.unregister(sub.sock)
+        except (KeyError, ValueError):
+            pass
+        sub.sock.close()
+
+
+class StreamClient:
+    """
+    ================================================================================
+    Client side of the stream. The socket is non-blocking once connected: use
+    fileno() with select() or a QSocketNotifier and call read_available() when it
+    becomes readable, or iterate over messages() to block for each snapshot.
+    ================================================================================
+    """
+
+    def __init__(self, path=SOCKET_FILE):
+        self.path = path
+        self.sock = None
+        self._buf = b""
+
+    def connect(self):
+        """
+        ================================================================================
+        Connect to the daemon. Raises OSError when no daemon is listening.
+        ================================================================================
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        self.sock = sock
+        return self
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def subscribe(self, scripts=None):
+        request = {"op": "subscribe"}
+        if scripts:
+            request["scripts"] = list(scripts)
+        self._request(request)
+
+    def unsubscribe(self):
+        self._request({"op": "unsubscribe"})
+
+    def _request(self, request):
+        self.sock.setblocking(True)
+        try:
+            self.sock.sendall(encode(request))
+        finally:
+            self.sock.setblocking(False)
+
+    def read_available(self):
+        """
+        ================================================================================
+        Return the snapshots received so far, without blocking. Raises
+        ConnectionError when the daemon has closed the connection.
+        ================================================================================
+        """
+        while True:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                raise ConnectionError("scriptscope stream closed")
+            self._buf += data
+        *lines, self._buf = self._buf.split(b"\n")
+        messages = []
+        for line in lines:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue
+        return messages
+
+    def messages(self):
+        """
+        ================================================================================
+        Yield snapshots as they arrive, blocking between them.
+        ================================================================================
+        """
+        while True:
+            select.select([self.sock], [], [])
+            for message in self.read_available():
+                yield message
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def print_stream(path=SOCKET_FILE, scripts=None, out=sys.stdout):
+    """
+    ================================================================================
+    Subscribe and print every snapshot as one JSON line until the daemon stops.
+    Returns 1 when no daemon is listening.
+    ================================================================================
+    """
+    client = StreamClient(path)
+    try:
+        client.connect()
+    except OSError as e:
+        print(f"scriptscope: cannot connect to {path}: {e}", file=sys.stderr)
+        return 1
+    client.subscribe(scripts)
+    try:
+        for message in client.messages():
+            out.write(json.dumps(message, separators=(",", ":")) + "\n")
+            out.flush()
+    except (ConnectionError, KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        client.close()
+    return 0
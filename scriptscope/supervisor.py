@@ -0,0 +1,226 @@
+"""
+===========================================================================================
+ScriptScope supervisor
+-------------------------------------------------------------------------------------------
+Launches the scripts of scripts.conf from the daemon (`daemon --supervise`) and restarts
+them when they fail. Each script runs in its own session, with its output appended to
+logs/scripts/<name>.log. A failed run is restarted after an exponential backoff (1 s,
+2 s, 4 s, ... up to 5 min), which resets once a run has lasted STABLE_AFTER seconds. A
+script that fails CRASH_LOOP_LIMIT times within CRASH_LOOP_WINDOW seconds is left in the
+"crash-loop" state and not restarted again until the configuration is reloaded (SIGHUP).
+With --restart always, scripts that exit successfully are restarted too.
+
+Every run is recorded in the RunTracker shared with the sampler, with its exit status
+and its peak RSS from wait4().
+===========================================================================================
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import deque
+
+from .config import PROJECT_ROOT, SCRIPT_LOG_DIR
+from .procevents import exit_status
+
+ON_FAILURE = "on-failure"
+ALWAYS = "always"
+RESTART_POLICIES = (ON_FAILURE, ALWAYS)
+
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 300.0
+STABLE_AFTER = 60.0
+CRASH_LOOP_LIMIT = 5
+CRASH_LOOP_WINDOW = 300.0
+STOP_TIMEOUT = 5.0
+
+RUNNING = "running"
+BACKOFF = "backoff"
+EXITED = "exited"
+CRASH_LOOP = "crash-loop"
+
+
+class SupervisedScript:
+    """
+    ================================================================================
+    Restart state of one supervised script.
+    ================================================================================
+    """
+    __slots__ = ("path", "name", "proc", "started", "state", "next_start", "backoff",
+                 "restarts", "failures")
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.proc = None
+        self.started = None
+        self.state = BACKOFF
+        self.next_start = 0.0
+        self.backoff = 0.0
+        self.restarts = 0
+        self.failures = deque()
+
+
+class Supervisor:
+    """
+    ================================================================================
+    Starts, reaps and restarts the configured scripts. poll() is called from the
+    daemon's tick (and on SIGCHLD); runs are recorded into runs, the RunTracker
+    of the daemon's sampler (set by MonitorDaemon when None).
+    ================================================================================
+    """
+
+    def __init__(self, restart=ON_FAILURE, runs=None, log_dir=SCRIPT_LOG_DIR,
+                 cwd=PROJECT_ROOT, clock=time.monotonic):
+        if restart not in RESTART_POLICIES:
+            raise ValueError(f"unknown restart policy: {restart!r}")
+        self.runs = runs
+        self.restart = restart
+        self.log_dir = log_dir
+        self.cwd = cwd
+        self.clock = clock
+        self.scripts = {}
+
+    def set_scripts(self, paths):
+        """
+        ================================================================================
+        Supervise exactly the given scripts: new ones are started on the next poll,
+        removed ones are stopped.
+        ================================================================================
+        """
+        wanted = dict.fromkeys(paths)
+        for path in list(self.scripts):
+            if path not in wanted:
+                self._stop(self.scripts.pop(path))
+        for path in wanted:
+            if path not in self.scripts:
+                self.scripts[path] = SupervisedScript(path)
+
+    def reset(self):
+        """
+        ================================================================================
+        Give the scripts in crash loop (or waiting for a restart) a fresh start.
+        ================================================================================
+        """
+        for script in self.scripts.values():
+            script.failures.clear()
+            script.backoff = 0.0
+            if script.state in (CRASH_LOOP, BACKOFF):
+                script.state = BACKOFF
+                script.next_start = 0.0
+
+    def poll(self):
+        """
+        ================================================================================
+        Reap the scripts that exited and start the ones that are due.
+        ================================================================================
+        """
+        now = self.clock()
+        for script in self.scripts.values():
+            if script.proc is not None:
+                self._reap(script, now)
+            if script.state == BACKOFF and now >= script.next_start:
+                self._start(script, now)
+
+    def _start(self, script, now):
+        path = os.path.join(self.cwd, script.path)
+        argv = [path] if os.access(path, os.X_OK) else ["/bin/sh", path]
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(os.path.join(self.log_dir, script.name + ".log"), "ab") as log:
+                proc = subprocess.Popen(argv, cwd=self.cwd, stdin=subprocess.DEVNULL,
+                                        stdout=log, stderr=subprocess.STDOUT,
+                                        start_new_session=True)
+        except OSError as e:
+            print(f"scriptscope: cannot start {script.path}: {e}", file=sys.stderr)
+            self._failed(script, now)
+            return
+        if script.started is not None:
+            script.restarts += 1
+        script.proc = proc
+        script.started = now
+        script.state = RUNNING
+        self.runs.start(script.name, proc.pid, time.time(), " ".join(argv), supervised=True)
+
+    def _reap(self, script, now):
+        try:
+            pid, status, usage = os.wait4(script.proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, status, usage = script.proc.pid, 0, None
+        if pid == 0:
+            return
+        exit_code, signum = exit_status(status)
+        script.proc.returncode = exit_code
+        script.proc = None
+        self.runs.end(pid, time.time(), exit_code, signum, supervised=True,
+                      peak_rss=usage.ru_maxrss * 1024 if usage else None)
+        if now - script.started >= STABLE_AFTER:
+            script.backoff = 0.0
+        if exit_code != 0:
+            self._failed(script, now)
+        elif self.restart == ALWAYS:
+            script.state = BACKOFF
+            script.next_start = now + max(script.backoff, BACKOFF_MIN)
+        else:
+            script.state = EXITED
+
+    def _failed(self, script, now):
+        script.failures.append(now)
+        while script.failures and script.failures[0] < now - CRASH_LOOP_WINDOW:
+            script.failures.popleft()
+        if len(script.failures) >= CRASH_LOOP_LIMIT:
+            script.state = CRASH_LOOP
+            print(f"scriptscope: {script.path} failed {len(script.failures)} times in "
+                  f"{CRASH_LOOP_WINDOW:.0f}s, not restarting it", file=sys.stderr)
+            return
+        script.backoff = min(max(script.backoff * 2, BACKOFF_MIN), BACKOFF_MAX)
+        script.state = BACKOFF
+        script.next_start = now + script.backoff
+
+    def _stop(self, script, timeout=STOP_TIMEOUT):
+        proc = script.proc
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
+        deadline = self.clock() + timeout
+        while self.clock() < deadline:
+            self._reap(script, self.clock())
+            if script.proc is None:
+                script.state = EXITED
+                return
+            time.sleep(0.05)
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        while script.proc is not None:
+            self._reap(script, self.clock())
+            time.sleep(0.01)
+        script.state = EXITED
+
+    def status(self):
+        """
+        ================================================================================
+        Return {script name: {"state", "pid", "restarts", "retry_in"}}.
+        ================================================================================
+        """
+        now = self.clock()
+        return {
+            script.name: {
+                "state": script.state,
+                "pid": script.proc.pid if script.proc else None,
+                "restarts": script.restarts,
+                "retry_in": round(max(script.next_start - now, 0.0), 1)
+                if script.state == BACKOFF else None,
+            }
+            for script in self.scripts.values()
+        }
+
+    def close(self):
+        for script in self.scripts.values():
+            self._stop(script)
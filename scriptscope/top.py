@@ -0,0 +1,412 @@
+"""
+===========================================================================================
+ScriptScope terminal dashboard
+-------------------------------------------------------------------------------------------
+Curses replacement for the clear-and-respawn loop of modules/ui.sh. Snapshots come from
+the daemon's stream socket, or from a Sampler kept alive in this process when no daemon
+is listening, so a refresh costs no fork either way.
+
+Only the screen lines whose text changed since the previous frame are rewritten, and
+curses itself only transmits the changed cells, which keeps the output over SSH to the
+few characters that actually moved. The table is virtualized: rows are filtered and
+sorted as plain records and only the visible window is ever formatted, so thousands of
+rows scroll as cheaply as ten.
+
+Keys: up/down/j/k, PgUp/PgDn, Home/End (g/G) scroll; 1-9 sort by that column (again to
+reverse); / filters on script name and command (Esc clears); q quits.
+===========================================================================================
+"""
+
+import curses
+import locale
+import os
+import time
+
+from .config import CONFIG_FILE, SOCKET_FILE, load_config
+from .history import RingBuffer
+from .matcher import SUBSTRING
+from .snapshot import Snapshot, display_name, format_rate, safe_float, time_to_seconds
+
+SPARK_WIDTH = 20
+HISTORY_SIZE = 120
+INPUT_TIMEOUT_MS = 100
+_BLOCKS = "▁▂▃▄▅▆▇█"
+_ASCII_BLOCKS = "_.-=+*#@"
+
+# Title, width, record field (None: the sparkline) and sort kind.
+COLUMNS = (
+    ("Script", 18, "script_name", "text"),
+    ("PID", 7, "pid", "number"),
+    ("CPU%", 6, "cpu", "number"),
+    ("MEM%", 6, "mem", "number"),
+    ("Read/s", 10, "read_rate", "number"),
+    ("Write/s", 10, "write_rate", "number"),
+    ("Elapsed", 11, "etime", "time"),
+    ("CPU trend", SPARK_WIDTH, None, None),
+    ("Command", 0, "cmd", "text"),
+)
+
+
+def sparkline(values, width=SPARK_WIDTH, top=None, blocks=_BLOCKS):
+    """
+    ================================================================================
+    Render the last `width` values as a bar string, right-aligned. Bars are scaled
+    to top (or the largest value, at least 1).
+    ================================================================================
+    """
+    values = list(values)[-width:]
+    if not values:
+        return " " * width
+    top = max(top or max(values), 1.0)
+    steps = len(blocks) - 1
+    bars = "".join(blocks[min(int(max(v, 0.0) / top * steps + 0.5), steps)] for v in values)
+    return bars.rjust(width)
+
+
+def _sort_key(kind, value):
+    if kind == "text":
+        return str(value or "")
+    if value in (None, "", "-"):
+        # Scripts that are not running sort below every running one.
+        return -1.0
+    if kind == "time":
+        return float(time_to_seconds(value)) if isinstance(value, str) else float(value)
+    return safe_float(value)
+
+
+class Dashboard:
+    """
+    ================================================================================
+    Terminal-independent state of the dashboard: the latest records, the CPU
+    history of each script, the sort column and the filter. view() returns the
+    filtered, sorted records; format_row() formats one of them for the screen.
+    ================================================================================
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, blocks=_BLOCKS):
+        self.blocks = blocks
+        self.history_size = history_size
+        self.snapshot = Snapshot([], timestamp=0.0)
+        self.history = {}
+        self.sort_column = 2
+        self.reverse = True
+        self.filter = ""
+        self._view = None
+
+    def update(self, snapshot):
+        """
+        ================================================================================
+        Take a new snapshot and append each script's total CPU to its history.
+        ================================================================================
+        """
+        self.snapshot = snapshot
+        totals = {}
+        for r in snapshot.records:
+            name = display_name(r)
+            totals[name] = totals.get(name, 0.0) + safe_float(r.get("cpu"))
+        for name in [n for n in self.history if n not in totals]:
+            del self.history[name]
+        for name, cpu in totals.items():
+            ring = self.history.get(name)
+            if ring is None:
+                ring = self.history[name] = RingBuffer(self.history_size)
+            ring.append(snapshot.timestamp, cpu)
+        self._view = None
+
+    def sort_by(self, column):
+        """
+        ================================================================================
+        Sort by a column; selecting the current sort column again reverses it.
+        ================================================================================
+        """
+        if COLUMNS[column][3] is None:
+            return
+        if column == self.sort_column:
+            self.reverse = not self.reverse
+        else:
+            self.sort_column = column
+            self.reverse = COLUMNS[column][3] != "text"
+        self._view = None
+
+    def set_filter(self, text):
+        self.filter = text
+        self._view = None
+
+    def view(self):
+        if self._view is None:
+            records = self.snapshot.records
+            if self.filter:
+                needle = self.filter.lower()
+                records = [r for r in records
+                           if needle in display_name(r).lower()
+                           or needle in r.get("cmd", "").lower()]
+            _, _, field, kind = COLUMNS[self.sort_column]
+            self._view = sorted(records, key=lambda r: _sort_key(kind, r.get(field)),
+                                reverse=self.reverse)
+        return self._view
+
+    def format_row(self, record, width):
+        cells = []
+        for title, size, field, kind in COLUMNS:
+            if field is None:
+                ring = self.history.get(display_name(record))
+                text = sparkline(ring.tail(size) if ring else (), size, blocks=self.blocks)
+            elif field == "script_name":
+                text = display_name(record)
+            else:
+                value = record.get(field, "")
+                text = format_rate(value) if field.endswith("_rate") else str(value)
+            if size:
+                text = text[:size].rjust(size) if kind == "number" else text[:size].ljust(size)
+            cells.append(text)
+        return " ".join(cells)[:width].ljust(width)
+
+    def format_header(self, width):
+        cells = []
+        for index, (title, size, _, kind) in enumerate(COLUMNS):
+            if index == self.sort_column:
+                arrows = "▼▲" if self.blocks == _BLOCKS else "v^"
+                title += " " + arrows[0 if self.reverse else 1]
+            title = f"{index + 1}:{title}" if kind else title
+            cells.append(title[:size].ljust(size) if size else title)
+        return " ".join(cells)[:width].ljust(width)
+
+
+class _StreamSource:
+    def __init__(self, socket_path):
+        from .stream import StreamClient
+        self.client = StreamClient(socket_path).connect()
+        self.client.subscribe()
+
+    def poll(self):
+        messages = self.client.read_available()
+        return Snapshot.from_payload(messages[-1]) if messages else None
+
+    def close(self):
+        self.client.close()
+
+
+class _SamplerSource:
+    def __init__(self, config_path, interval, match_mode):
+        from .sampler import Sampler
+        self.sampler = Sampler(load_config(config_path), match_mode=match_mode)
+        self.interval = interval
+        self.next = 0.0
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self.next:
+            return None
+        self.next = now + self.interval
+        return self.sampler.snapshot()
+
+    def close(self):
+        pass
+
+
+class _Screen:
+    """
+    ================================================================================
+    Writes lines to a curses window, skipping the ones unchanged since the last
+    frame.
+    ================================================================================
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.lines = {}
+
+    def reset(self):
+        self.lines = {}
+        self.window.erase()
+
+    def put(self, y, text, attr=0):
+        if self.lines.get(y) == (text, attr):
+            return
+        self.lines[y] = (text, attr)
+        height, width = self.window.getmaxyx()
+        try:
+            # The bottom-right cell cannot be written without scrolling.
+            self.window.addnstr(y, 0, text, width - 1 if y == height - 1 else width, attr)
+            self.window.clrtoeol()
+        except curses.error:
+            pass
+
+
+class TerminalDashboard:
+    """
+    ================================================================================
+    Curses front end of a Dashboard. When the stream source goes away (daemon
+    stopped), fallback() provides the source to continue with.
+    ================================================================================
+    """
+
+    def __init__(self, window, source, dashboard, fallback=None):
+        self.window = window
+        self.source = source
+        self.fallback = fallback
+        self.dashboard = dashboard
+        self.screen = _Screen(window)
+        self.cursor = 0
+        self.top = 0
+        self.editing = None
+        self.alert_attr = curses.A_BOLD
+        if curses.has_colors():
+            curses.use_default_colors()
+            curses.init_pair(1, curses.COLOR_RED, -1)
+            self.alert_attr = curses.color_pair(1)
+
+    def run(self):
+        curses.curs_set(0)
+        self.window.timeout(INPUT_TIMEOUT_MS)
+        self.window.keypad(True)
+        dirty = True
+        while True:
+            try:
+                snapshot = self.source.poll()
+            except ConnectionError:
+                if self.fallback is None:
+                    raise
+                self.source.close()
+                self.source, self.fallback = self.fallback(), None
+                continue
+            if snapshot is not None:
+                self.dashboard.update(snapshot)
+                dirty = True
+            if dirty:
+                self.draw()
+                dirty = False
+            key = self.window.getch()
+            if key == -1:
+                continue
+            if not self.handle_key(key):
+                return
+            dirty = True
+
+    def handle_key(self, key):
+        """
+        ================================================================================
+        Apply a key press. Returns False to quit.
+        ================================================================================
+        """
+        page = max(self.window.getmaxyx()[0] - 3, 1)
+        if self.editing is not None:
+            if key == 27:
+                self.editing = None
+                self.dashboard.set_filter("")
+            elif key in (10, 13, curses.KEY_ENTER):
+                self.editing = None
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                self.editing = self.editing[:-1]
+                self.dashboard.set_filter(self.editing)
+            elif 32 <= key < 127:
+                self.editing += chr(key)
+                self.dashboard.set_filter(self.editing)
+            return True
+        if key in (ord("q"), ord("Q")):
+            return False
+        if key == ord("/"):
+            self.editing = self.dashboard.filter
+        elif key == 27:
+            self.dashboard.set_filter("")
+        elif ord("1") <= key <= ord("9") and key - ord("1") < len(COLUMNS):
+            self.dashboard.sort_by(key - ord("1"))
+        elif key in (curses.KEY_DOWN, ord("j")):
+            self.cursor += 1
+        elif key in (curses.KEY_UP, ord("k")):
+            self.cursor -= 1
+        elif key == curses.KEY_NPAGE:
+            self.cursor += page
+        elif key == curses.KEY_PPAGE:
+            self.cursor -= page
+        elif key in (curses.KEY_HOME, ord("g")):
+            self.cursor = 0
+        elif key in (curses.KEY_END, ord("G")):
+            self.cursor = len(self.dashboard.view()) - 1
+        elif key == curses.KEY_RESIZE:
+            self.screen.reset()
+        return True
+
+    def draw(self):
+        height, width = self.window.getmaxyx()
+        dashboard = self.dashboard
+        rows = dashboard.view()
+        body = max(height - 3, 0)
+
+        # Keep the cursor inside the rows and the window around the cursor.
+        self.cursor = max(min(self.cursor, len(rows) - 1), 0)
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + body:
+            self.top = self.cursor - body + 1
+        self.top = max(min(self.top, len(rows) - body), 0)
+
+        snapshot = dashboard.snapshot
+        running = len(snapshot.running())
+        status = f" ScriptScope  {len(snapshot)} processes, {running} running"
+        if snapshot.alerts:
+            status += f", {len(snapshot.alerts)} alerts"
+        if dashboard.filter:
+            status += f"  filter: {dashboard.filter} ({len(rows)} shown)"
+        self.screen.put(0, status[:width].ljust(width), curses.A_BOLD)
+        self.screen.put(1, dashboard.format_header(width), curses.A_UNDERLINE)
+
+        for y in range(body):
+            index = self.top + y
+            if index >= len(rows):
+                self.screen.put(2 + y, " " * width)
+                continue
+            record = rows[index]
+            attr = 0
+            if safe_float(record.get("cpu")) >= 10 or safe_float(record.get("mem")) >= 10:
+                attr = self.alert_attr
+            if index == self.cursor:
+                attr |= curses.A_REVERSE
+            self.screen.put(2 + y, dashboard.format_row(record, width), attr)
+
+        if self.editing is not None:
+            footer = f"/{self.editing}"
+        else:
+            footer = " q quit  1-9 sort  / filter  arrows/PgUp/PgDn scroll"
+            if rows:
+                footer += f"  [{self.cursor + 1}/{len(rows)}]"
+        self.screen.put(height - 1, footer[:width].ljust(width), curses.A_DIM)
+        self.window.noutrefresh()
+        curses.doupdate()
+
+
+def run_dashboard(socket_path=SOCKET_FILE, config_path=CONFIG_FILE, interval=1.0,
+                  match_mode=SUBSTRING):
+    """
+    ================================================================================
+    Run the terminal dashboard until 'q'. Reads the daemon's stream when it is
+    listening, otherwise samples in this process every `interval` seconds.
+    ================================================================================
+    """
+    locale.setlocale(locale.LC_ALL, "")
+    utf8 = locale.getpreferredencoding(False).lower().replace("-", "") == "utf8"
+    # Esc clears the filter: do not wait a whole second for an escape sequence.
+    os.environ.setdefault("ESCDELAY", "25")
+
+    def fallback():
+        return _SamplerSource(config_path, interval, match_mode)
+
+    try:
+        source = _StreamSource(socket_path)
+    except OSError:
+        source = fallback()
+    dashboard = Dashboard(blocks=_BLOCKS if utf8 else _ASCII_BLOCKS)
+    ui = None
+
+    def main(window):
+        nonlocal ui
+        ui = TerminalDashboard(window, source, dashboard, fallback)
+        ui.run()
+
+    try:
+        curses.wrapper(main)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        (ui.source if ui else source).close()
+    return 0
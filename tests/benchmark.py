@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+===========================================================================================
+ScriptScope benchmark
+-------------------------------------------------------------------------------------------
+Load test of the monitor. For each size N it spawns N synthetic scripts (idle shell
+scripts blocked on a shared pipe, like example/sleep_script.sh but without a child, plus
+a few busy ones like example/cpu_stress.sh), then measures:
+
+    tick        sampler wall time per tick (mean, p50, p95, max, in ms)
+    cpu         CPU time the sampler uses per tick (user + system, in ms)
+    rss         resident memory of this process after the ticks (KiB)
+    gui         sample -> published -> main window updated latency (ms), through the
+                real stream server, loader thread and window on the offscreen Qt
+                platform (skipped without PyQt5)
+    chart       one CPU chart with a series per script, backfilled with an hour of
+                history: time to add a snapshot and repaint, and to redraw every
+                series as when one is hidden (ms, skipped without PyQt5)
+    export      rows per second and bytes per row of each export format
+    read        time for a local reader to get a snapshot's records from stats.json
+                (JSON) and from the shared map, and one numeric column from the map
+
+Results are printed as JSON (or written with --output). With --baseline, every metric
+is compared against the stored results: times and memory that grew, or throughput that
+shrank, by more than --tolerance are listed as regressions. The numbers depend on the
+machine, so this is a report, not a test: the run only exits with status 1 on
+regressions with --strict, for a baseline recorded on the same machine. The behavior
+tests are the test_*.py files next to this one, run by pytest.
+
+    python3 tests/benchmark.py --sizes 10,100,1000 --baseline tests/benchmark_baseline.json
+    python3 tests/benchmark.py --sizes 10,100,1000 --output tests/benchmark_baseline.json
+===========================================================================================
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from scriptscope.export import RotatingWriter  # noqa: E402
+from scriptscope.procfs import status_kb, read_status  # noqa: E402
+from scriptscope.sampler import Sampler  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_TICKS = 20
+DEFAULT_TOLERANCE = 0.5
+IDLE_SCRIPT = "#!/bin/sh\n# ScriptScope benchmark: idle until the harness closes stdin.\nread _line\n"
+BUSY_SCRIPT = "#!/bin/sh\n# ScriptScope benchmark: busy loop.\nwhile :; do :; done\n"
+EXPORT_SNAPSHOTS = 200
+
+# Metrics where a higher value is better; every other metric is lower-is-better.
+HIGHER_IS_BETTER = ("rows_per_s",)
+# Timings within this many milliseconds of the baseline are noise, whatever the ratio.
+NOISE_FLOOR_MS = 2.0
+# Reported but never compared: a count, and a single worst sample.
+REPORT_ONLY = ("records", "max")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(values):
+    """
+    ================================================================================
+    Mean, p50, p95 and max of a list of milliseconds, rounded for the report.
+    ================================================================================
+    """
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "max": round(max(values), 3),
+    }
+
+
+class SyntheticScripts:
+    """
+    ================================================================================
+    Spawns N benchmark scripts in a temporary directory. The idle ones all read
+    the same pipe, so closing its write end stops them all at once.
+    ================================================================================
+    """
+
+    def __init__(self, count, busy=0):
+        self.count = count
+        self.busy = min(busy, count)
+        self.directory = tempfile.mkdtemp(prefix="scriptscope-bench-")
+        self.names = [f"ssbench_{i:05d}.sh" for i in range(count)]
+        self.processes = []
+        self._pipe = None
+
+    def __enter__(self):
+        read_fd, self._pipe = os.pipe()
+        try:
+            for i, name in enumerate(self.names):
+                path = os.path.join(self.directory, name)
+                with open(path, "w") as f:
+                    f.write(BUSY_SCRIPT if i < self.busy else IDLE_SCRIPT)
+                os.chmod(path, 0o755)
+                self.processes.append(subprocess.Popen(
+                    [path], stdin=read_fd, stdout=subprocess.DEVNULL, close_fds=True,
+                ))
+        finally:
+            os.close(read_fd)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self._pipe)
+        for process in self.processes[:self.busy]:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        for name in self.names:
+            os.unlink(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+
+def bench_sampler(sampler, ticks):
+    """
+    ================================================================================
+    Time `ticks` back-to-back samples. Returns the report and the last snapshot.
+    ================================================================================
+    """
+    sampler.snapshot()  # Warm-up: fills the process tree and the CPU baselines.
+    wall, cpu = [], []
+    snapshot = None
+    for _ in range(ticks):
+        t0, c0 = time.perf_counter(), time.process_time()
+        snapshot = sampler.snapshot()
+        c1, t1 = time.process_time(), time.perf_counter()
+        wall.append((t1 - t0) * 1000)
+        cpu.append((c1 - c0) * 1000)
+    status = read_status("self") or {}
+    return {
+        "tick_ms": summarize(wall),
+        "cpu_ms": round(sum(cpu) / len(cpu), 3),
+        "rss_kb": status_kb(status, "VmRSS"),
+        "records": len(snapshot.records),
+    }, snapshot
+
+
+def bench_gui(sampler, ticks):
+    """
+    ================================================================================
+    Latency from a published snapshot to the main window having rendered it, with
+    the window, its loader thread and a stream server running in this process.
+    ================================================================================
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtCore import QEventLoop, QTimer
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return {"skipped": "PyQt5 is not installed"}
+    import gui.widgets
+    from scriptscope.stream import StreamServer
+
+    directory = tempfile.mkdtemp(prefix="scriptscope-bench-")
+    socket_path = os.path.join(directory, "bench.sock")
+    app = QApplication.instance() or QApplication([])
+    server = StreamServer(socket_path)
+    server.start()
+    gui.widgets.SOCKET_FILE = socket_path
+    gui.widgets.STATS_FILE = os.path.join(directory, "stats.json")
+    gui.widgets.MAP_FILE = os.path.join(directory, "bench.map")
+    gui.widgets.HISTORY_DIR = os.path.join(directory, "history")
+    window = gui.widgets.ScriptScopeMainWindow()
+    window.show()
+
+    loop = QEventLoop()
+    rendered = []
+    # Connected after refresh_table, so it runs once the window is updated.
+    window.loader.ready.connect(lambda: (rendered.append(time.perf_counter()), loop.quit()))
+
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            QTimer.singleShot(20, loop.quit)
+            loop.exec_()
+            app.processEvents()
+        return condition()
+
+    latencies = []
+    try:
+        if not wait(lambda: server.subscriber_count > 0):
+            return {"skipped": "the loader did not subscribe to the stream"}
+        for seq in range(1, ticks + 1):
+            snapshot = sampler.snapshot()
+            count = len(rendered)
+            t0 = time.perf_counter()
+            server.publish({"seq": seq, "timestamp": snapshot.timestamp,
+                            "scripts": snapshot.records})
+            if wait(lambda: len(rendered) > count):
+                latencies.append((rendered[-1] - t0) * 1000)
+    finally:
+        window.close()
+        server.close()
+        for name in os.listdir(directory):
+            os.unlink(os.path.join(directory, name))
+        os.rmdir(directory)
+    if not latencies:
+        return {"skipped": "no snapshot reached the window"}
+    return {"latency_ms": summarize(latencies)}
+
+
+def bench_chart(snapshot, ticks):
+    """
+    ================================================================================
+    Cost of the CPU chart of the main window with one series per script of the
+    snapshot, after backfilling an hour of 10 s history buckets.
+    ================================================================================
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return {"skipped": "PyQt5 is not installed"}
+    from gui.charts import LiveChart
+
+    app = QApplication.instance() or QApplication([])
+    rng = random.Random(0)
+    names = sorted({r["script_name"] for r in snapshot.records})
+    if not names:
+        return {"skipped": "no script was sampled"}
+    now = snapshot.timestamp
+    chart = LiveChart("%", 100.0)
+    chart.resize(252, 300)
+    chart.show()
+    app.processEvents()
+    history = {}
+    for name in names:
+        rows = []
+        for t in range(int(now) - 3600, int(now), 10):
+            low = rng.uniform(0, 40)
+            rows.append((t * 1000, low + 5, low, low + rng.uniform(0, 20)))
+        history[name] = rows
+    chart.backfill(history)
+    ticks_ms = []
+    for i in range(ticks):
+        values = {name: rng.uniform(0, 60) for name in names}
+        t0 = time.perf_counter()
+        chart.add_samples(now + i + 1, values)
+        chart.repaint()
+        ticks_ms.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    chart.set_visible(names[0], False)
+    chart.repaint()
+    redraw_ms = (time.perf_counter() - t0) * 1000
+    chart.close()
+    return {"tick_ms": summarize(ticks_ms), "redraw_ms": round(redraw_ms, 3)}
+
+
+def bench_read(snapshot, ticks):
+    """
+    ================================================================================
+    Reader-side cost of one snapshot: parsing stats.json against copying it out
+    of the shared map and rebuilding its records, or reading the cpu column.
+    ================================================================================
+    """
+    from scriptscope.publish import SnapshotWriter, load_snapshot
+    from scriptscope.sharedmap import SharedMapReader, SharedMapWriter
+
+    directory = tempfile.mkdtemp(prefix="scriptscope-bench-")
+    stats_path = os.path.join(directory, "stats.json")
+    map_path = os.path.join(directory, "bench.map")
+    writer, shared = SnapshotWriter(stats_path, fsync=False), SharedMapWriter(map_path)
+    reader = SharedMapReader(map_path)
+    timings = {"json_ms": [], "map_ms": [], "map_column_ms": []}
+    try:
+        for seq in range(1, ticks + 1):
+            writer.publish(snapshot.records, snapshot.timestamp)
+            shared.publish(snapshot.records, seq, snapshot.timestamp)
+            t0 = time.perf_counter()
+            load_snapshot(stats_path)
+            t1 = time.perf_counter()
+            reader.read().records()
+            t2 = time.perf_counter()
+            shared.publish(snapshot.records, seq, snapshot.timestamp)
+            t3 = time.perf_counter()
+            reader.read().column("cpu")
+            t4 = time.perf_counter()
+            timings["json_ms"].append((t1 - t0) * 1000)
+            timings["map_ms"].append((t2 - t1) * 1000)
+            timings["map_column_ms"].append((t4 - t3) * 1000)
+    finally:
+        reader.close()
+        shared.close()
+        os.unlink(stats_path)
+        os.rmdir(directory)
+    return {name: summarize(values) for name, values in timings.items()}
+
+
+def bench_export(snapshot):
+    """
+    ================================================================================
+    Throughput of every export format on copies of a sampled snapshot, with
+    jittered metrics so that compression sees realistic data.
+    ================================================================================
+    """
+    rng = random.Random(0)
+    batch = []
+    for i in range(EXPORT_SNAPSHOTS):
+        records = [dict(r, cpu=f"{rng.uniform(0, 100):.1f}", mem=f"{rng.uniform(0, 5):.1f}",
+                        read_rate=f"{rng.expovariate(1e-4):.1f}")
+                   for r in snapshot.records]
+        batch.append({"seq": i, "timestamp": snapshot.timestamp + i, "scripts": records})
+    rows = len(snapshot.records) * EXPORT_SNAPSHOTS
+    results = {}
+    for fmt in ("csv", "jsonl", "columnar"):
+        for compress in ("none", "gzip"):
+            with tempfile.TemporaryDirectory(prefix="scriptscope-bench-") as directory:
+                writer = RotatingWriter(directory, fmt, compress, rotate_bytes=1 << 40,
+                                        rotate_seconds=1e9, max_bytes=1 << 40)
+                t0 = time.perf_counter()
+                writer.write(batch)
+                writer.close()
+                elapsed = time.perf_counter() - t0
+                size = os.path.getsize(writer.path)
+            results[f"{fmt}+{compress}"] = {
+                "rows_per_s": round(rows / elapsed),
+                "bytes_per_row": round(size / rows, 1),
+            }
+    return results
+
+
+def run(sizes, ticks, busy, gui):
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "ticks": ticks,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for size in sizes:
+        print(f"benchmark: {size} scripts", file=sys.stderr)
+        with SyntheticScripts(size, busy) as scripts:
+            # Exact matching: the harness and the shells have the names in argv too.
+            sampler = Sampler(scripts.names, match_mode="exact", children=True)
+            result, snapshot = bench_sampler(sampler, ticks)
+            if gui:
+                result["gui"] = bench_gui(sampler, ticks)
+                result["chart"] = bench_chart(snapshot, ticks)
+            result["export"] = bench_export(snapshot)
+            result["read"] = bench_read(snapshot, ticks)
+        report["results"][str(size)] = result
+    return report
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(report, baseline, tolerance):
+    """
+    ================================================================================
+    Return the regressions of report against baseline, as readable strings.
+    Metrics missing on either side (other sizes, skipped GUI) are ignored, and
+    so are the REPORT_ONLY ones.
+    ================================================================================
+    """
+    current = dict(_flatten(report["results"]))
+    regressions = []
+    for name, expected in _flatten(baseline["results"]):
+        value = current.get(name)
+        if value is None or name.rsplit(".", 1)[-1] in REPORT_ONLY or not expected:
+            continue
+        if name.rsplit(".", 1)[-1] in HIGHER_IS_BETTER:
+            if value < expected * (1 - tolerance):
+                regressions.append(f"{name}: {value} < {expected} (-{tolerance:.0%})")
+        elif value > expected * (1 + tolerance):
+            if "_ms" in name and value - expected < NOISE_FLOOR_MS:
+                continue
+            regressions.append(f"{name}: {value} > {expected} (+{tolerance:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ScriptScope load test")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated numbers of synthetic scripts")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS, help="ticks per size")
+    parser.add_argument("--busy", type=int, default=2, help="busy-looping scripts per size")
+    parser.add_argument("--no-gui", action="store_true", help="skip the GUI latency test")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="report regressions against this report")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative change before reporting (0.5 = 50%%)")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit with status 1 on regressions against the baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    report = run(sizes, args.ticks, args.busy, not args.no_gui)
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("benchmark: REGRESSIONS against " + args.baseline, file=sys.stderr)
+            for line in regressions:
+                print("  " + line, file=sys.stderr)
+            return 1 if args.strict else 0
+        print("benchmark: no regression against " + args.baseline, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+import pytest
+
+from scriptscope.alerts import AlertEngine, parse_rules
+
+
+def _records(cpu, running=True):
+    return [{"script_name": "a.sh", "pid": "10" if running else "-", "cpu": str(cpu)},
+            {"script_name": "b.sh", "pid": "11", "cpu": "1.0"}]
+
+
+def _states(notifications):
+    return [(n["state"], n["script"]) for n in notifications]
+
+
+def test_parse_rules():
+    rules = parse_rules(["# comment", "*  mem > 30", "a.sh cpu >= 80 for 30s clear 60",
+                         "a.sh write_rate > 1e6 for 500ms"])
+    assert [(r.script, r.metric, r.op, r.threshold, r.duration, r.clear) for r in rules] == [
+        ("*", "mem", ">", 30.0, 0.0, 30.0),
+        ("a.sh", "cpu", ">=", 80.0, 30.0, 60.0),
+        ("a.sh", "write_rate", ">", 1e6, 0.5, 1e6),
+    ]
+
+
+@pytest.mark.parametrize("line, message", [
+    ("a.sh cpu >> 80", "line 1: cannot parse rule"),
+    ("a.sh cpu_totl > 80 for 30s", "line 1: unknown metric 'cpu_totl'"),
+])
+def test_parse_errors(line, message):
+    with pytest.raises(ValueError, match=message):
+        parse_rules([line])
+
+
+def test_fires_after_the_duration_only():
+    engine = AlertEngine(parse_rules(["a.sh cpu > 80 for 10s"]))
+    assert engine.evaluate(_records(90), now=0) == []
+    assert engine.evaluate(_records(90), now=5) == []
+    # A dip restarts the duration.
+    assert engine.evaluate(_records(50), now=6) == []
+    assert engine.evaluate(_records(90), now=7) == []
+    assert engine.evaluate(_records(90), now=16) == []
+    assert _states(engine.evaluate(_records(90), now=17)) == [("firing", "a.sh")]
+    assert engine.active == [{"script": "a.sh", "rule": "cpu > 80 for 10s"}]
+
+
+def test_hysteresis_and_cooldown():
+    engine = AlertEngine(parse_rules(["a.sh cpu > 80 clear 60"]), cooldown=60)
+    assert _states(engine.evaluate(_records(90), now=0)) == [("firing", "a.sh")]
+    # Below the threshold but above the clear value: still firing, not reminded yet.
+    assert engine.evaluate(_records(70), now=30) == []
+    assert _states(engine.evaluate(_records(70), now=60)) == [("firing", "a.sh")]
+    assert engine.evaluate(_records(70), now=90) == []
+    assert _states(engine.evaluate(_records(50), now=91)) == [("resolved", "a.sh")]
+    assert engine.active == []
+
+
+def test_wildcard_and_stopped_scripts():
+    engine = AlertEngine(parse_rules(["* cpu > 0.5"]))
+    assert sorted(_states(engine.evaluate(_records(90), now=0))) == [
+        ("firing", "a.sh"), ("firing", "b.sh")]
+    # A script that is not running never fires and resolves.
+    assert _states(engine.evaluate(_records(0, running=False), now=1)) == [
+        ("resolved", "a.sh")]
+
+
+def test_reload_keeps_unchanged_rules():
+    engine = AlertEngine(parse_rules(["a.sh cpu > 80"]))
+    engine.evaluate(_records(90), now=0)
+    engine.set_rules(parse_rules(["a.sh mem > 50", "a.sh cpu > 80"]))
+    assert engine.evaluate(_records(90), now=1) == []
+    assert engine.active == [{"script": "a.sh", "rule": "cpu > 80"}]
+
+
+def test_scripts_not_sampled_keep_their_state():
+    engine = AlertEngine(parse_rules(["* cpu > 50"]))
+    assert sorted(_states(engine.evaluate(_records(90), now=0))) == [("firing", "a.sh")]
+    # Only b.sh was sampled: a.sh keeps firing instead of resolving.
+    assert engine.evaluate(_records(90)[1:], now=1, keep={"a.sh"}) == []
+    assert engine.active == [{"script": "a.sh", "rule": "cpu > 50"}]
+    assert _states(engine.evaluate(_records(90)[1:], now=2)) == [("resolved", "a.sh")]
@@ -0,0 +1,88 @@
+import json
+import socket
+
+import pytest
+
+from scriptscope.cluster import Collector, DeltaDecoder, DeltaEncoder, parse_address
+
+
+def _snapshot(seq, records):
+    return {"seq": seq, "timestamp": 100.0 + seq, "scripts": records}
+
+
+def _record(name, pid, cpu, **extra):
+    return dict({"script_name": name, "pid": pid, "cpu": cpu, "cmd": f"bash {name}"}, **extra)
+
+
+def test_parse_address():
+    assert parse_address("10.0.0.1:9000") == ("10.0.0.1", 9000)
+    assert parse_address(":9000") == ("127.0.0.1", 9000)
+    assert parse_address("9000") == ("127.0.0.1", 9000)
+    assert parse_address("[::1]:9000") == ("::1", 9000)
+    assert parse_address("collector", default_port=7878) == ("collector", 7878)
+    with pytest.raises(ValueError):
+        parse_address("host:port")
+
+
+def test_delta_round_trip():
+    snapshots = [
+        _snapshot(1, [_record("a.sh", "10", "1.0"), _record("b.sh", "-", "-")]),
+        # Only the CPU of a.sh changes.
+        _snapshot(2, [_record("a.sh", "10", "2.0"), _record("b.sh", "-", "-")]),
+        # b.sh starts, a.sh gains a field, then loses it.
+        _snapshot(3, [_record("a.sh", "10", "2.0", nprocs="2"), _record("b.sh", "20", "5.0")]),
+        _snapshot(4, [_record("a.sh", "10", "2.0"), _record("b.sh", "20", "5.0")]),
+        # Reordered, with a new process of a.sh.
+        _snapshot(5, [_record("b.sh", "20", "5.0"), _record("a.sh", "10", "2.0"),
+                      _record("a.sh", "11", "0.5")]),
+        # Everything but one process gone.
+        _snapshot(6, [_record("a.sh", "11", "0.5")]),
+    ]
+    snapshots[4]["alerts"] = [{"script": "b.sh", "rule": "cpu > 1"}]
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    deltas = []
+    for snapshot in snapshots:
+        delta = encoder.encode(snapshot)
+        deltas.append(delta)
+        assert decoder.apply(delta) == snapshot
+    assert deltas[1]["set"] and "new" not in deltas[1] and "order" not in deltas[1]
+    assert "order" in deltas[4]
+    assert deltas[5]["del"]
+
+
+def test_reset_starts_over():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    first = _snapshot(1, [_record("a.sh", "10", "1.0")])
+    decoder.apply(encoder.encode(first))
+    encoder.reset()
+    decoder = DeltaDecoder()
+    delta = encoder.encode(_snapshot(2, [_record("a.sh", "10", "1.0")]))
+    assert "new" in delta
+    assert decoder.apply(delta)["scripts"] == first["scripts"]
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+@pytest.mark.parametrize("snapshots", [[1], ["delta"], [{"set": [["x", 5]]}], 7])
+def test_malformed_batch_only_drops_that_agent(snapshots):
+    collector = Collector(("127.0.0.1", 0))
+    collector.start()
+    try:
+        bad = socket.create_connection(collector.address, timeout=5)
+        _send(bad, {"op": "hello", "host": "bad"})
+        _send(bad, {"op": "batch", "snapshots": snapshots})
+        assert bad.recv(4096) == b""
+        bad.close()
+        good = socket.create_connection(collector.address, timeout=5)
+        encoder = DeltaEncoder()
+        _send(good, {"op": "hello", "host": "good"})
+        _send(good, {"op": "batch", "snapshots": [
+            encoder.encode(_snapshot(1, [_record("a.sh", "10", "1.0")]))]})
+        assert json.loads(good.recv(4096)) == {"ack": 1}
+        good.close()
+        assert collector.hosts == ["good"]
+        assert [r["script_name"] for r in collector.merged()["scripts"]] == ["a.sh"]
+    finally:
+        collector.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from scriptscope.config import parse_config, parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration("100ms") == pytest.approx(0.1)
+    assert parse_duration("10s") == 10
+    assert parse_duration("5m") == 300
+    assert parse_duration("2") == 2
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_plain_list_of_paths():
+    scripts = parse_config(["# comment", "", "./example/a.sh", "/srv/b.sh", "./example/a.sh"])
+    assert [s.path for s in scripts] == ["./example/a.sh", "/srv/b.sh"]
+    assert [s.name for s in scripts] == ["a.sh", "b.sh"]
+    assert scripts[0].interval is None and scripts[0].metrics is None
+
+
+def test_sections_apply_by_precedence():
+    scripts = parse_config("""
+./a.sh
+
+[defaults]
+interval = 1s
+
+[group critical]
+scripts = ./b.sh ./c.sh
+interval = 100ms
+alert = cpu > 80 for 5s
+
+[./c.sh]
+interval = 10s
+metrics = io, cpu
+argv = 1
+cwd = /srv/jobs/
+""".splitlines())
+    by_name = {s.name: s for s in scripts}
+    assert [s.name for s in scripts] == ["a.sh", "b.sh", "c.sh"]
+    assert by_name["a.sh"].interval == 1
+    assert by_name["b.sh"].interval == pytest.approx(0.1)
+    assert by_name["c.sh"].interval == 10
+    assert by_name["c.sh"].metrics == {"io", "cpu"}
+    assert by_name["c.sh"].argv == 1
+    assert by_name["c.sh"].cwd == "/srv/jobs"
+    assert by_name["a.sh"].alerts == []
+    rules = by_name["b.sh"].alerts
+    assert [(r.script, r.metric, r.threshold, r.duration) for r in rules] == [
+        ("b.sh", "cpu", 80.0, 5.0)]
+
+
+@pytest.mark.parametrize("lines, message", [
+    (["[a.sh]", "interval"], "line 2: expected key = value"),
+    (["[a.sh]", "colour = red"], "line 2: unknown key"),
+    (["[a.sh]", "interval = 0s"], "line 2: interval must be positive"),
+    (["[a.sh]", "cwd = relative"], "line 2: cwd must be an absolute path"),
+    (["[a.sh]", "metrics = cpu disk"], "line 2: unknown metrics: disk"),
+    (["[a.sh]", "match = ("], "line 2: "),
+    (["[a.sh]", "scripts = b.sh"], "line 2: scripts is only valid in a [group]"),
+    (["[]"], "line 1: empty section name"),
+])
+def test_errors_carry_the_line_number(lines, message):
+    with pytest.raises(ValueError, match="^" + message.replace("[", r"\[")):
+        parse_config(lines)
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from scriptscope.alerts import AlertEngine, parse_rules
+from scriptscope.daemon import MonitorDaemon
+
+
+class FakeSampler:
+    scripts = ["a.sh", "b.sh"]
+    mem_total = 1 << 30
+
+    def __init__(self):
+        self.runs = SimpleNamespace(drain=lambda: [])
+        self.cpu = {"a.sh": "90.0", "b.sh": "1.0"}
+        self.calls = []
+
+    def snapshot(self, due=None):
+        self.calls.append(due)
+        records = [{"script_name": name, "pid": "10", "cpu": self.cpu[name]}
+                   for name in self.scripts]
+        return SimpleNamespace(records=records, timestamp=100.0 + len(self.calls))
+
+
+class FakeHistory:
+    def __init__(self):
+        self.recorded = []
+
+    def record(self, timestamp, records):
+        self.recorded.append((timestamp, [r["script_name"] for r in records]))
+
+
+def test_partial_tick_only_feeds_the_sampled_scripts(tmp_path):
+    history = FakeHistory()
+    alerts = AlertEngine(parse_rules(["* cpu > 50"]))
+    daemon = MonitorDaemon(config_path=str(tmp_path / "scripts.conf"), stats_path=None,
+                           history=history, alerts=alerts)
+    daemon.sampler = FakeSampler()
+    daemon.scheduler = SimpleNamespace(interval=1.0, missed=0)
+    daemon.schedule.due = lambda slack: {"a.sh", "b.sh"}
+    assert len(daemon.tick(scheduled=True)) == 2
+    assert alerts.active == [{"script": "a.sh", "rule": "cpu > 50"}]
+    # Only b.sh is due: a.sh's repeated record is published but neither recorded
+    # again nor allowed to resolve its alert.
+    daemon.schedule.due = lambda slack: {"b.sh"}
+    assert len(daemon.tick(scheduled=True)) == 2
+    assert history.recorded == [(101.0, ["a.sh", "b.sh"]), (102.0, ["b.sh"])]
+    assert alerts.active == [{"script": "a.sh", "rule": "cpu > 50"}]
+    # A wake between ticks reads every script.
+    daemon.sampler.cpu["a.sh"] = "5.0"
+    daemon.tick()
+    assert daemon.sampler.calls[-1] is None
+    assert history.recorded[-1] == (103.0, ["a.sh", "b.sh"])
+    assert alerts.active == []
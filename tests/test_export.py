@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+
+from scriptscope.export import (
+    FORMATS, RotatingWriter, etime_seconds, open_export, parse_size, read_columnar,
+)
+
+BASE = 1_790_000_000.0
+
+
+def _snapshots(count, start=0):
+    for i in range(start, start + count):
+        yield {"seq": i + 1, "timestamp": BASE + 2 * i, "scripts": [
+            {"script_name": f"job{j}.sh", "pid": str(100 + j), "cpu": f"{i % 7 + j:.1f}",
+             "cpu_total": "-", "mem": "1.5", "etime": "00:10", "cmd": f"bash job{j}.sh"}
+            for j in range(3)] + [
+            {"script_name": "idle.sh", "pid": "-", "cpu": "-", "mem": "-", "etime": "-",
+             "cmd": ""}]}
+
+
+def test_parse_size_and_etime():
+    assert parse_size("512") == 512
+    assert parse_size("64M") == 64 << 20
+    assert parse_size("1.5GiB") == 3 << 29
+    with pytest.raises(ValueError):
+        parse_size("lots")
+    assert etime_seconds("01:02") == 62
+    assert etime_seconds("1-02:03:04") == 93784
+    assert etime_seconds("-") is None
+
+
+def test_unknown_format_or_compression(tmp_path):
+    with pytest.raises(ValueError):
+        RotatingWriter(str(tmp_path), "xml")
+    with pytest.raises(ValueError):
+        RotatingWriter(str(tmp_path), "csv", "bzip2")
+
+
+@pytest.mark.parametrize("compress", ["none", "gzip", "zstd"])
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_written_files_decode(tmp_path, fmt, compress):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    writer = RotatingWriter(str(tmp_path), fmt, compress)
+    batch = list(_snapshots(20))
+    writer.write(batch[:10])
+    writer.write(batch[10:])
+    writer.close()
+    assert writer.path.endswith(writer.extension)
+    with open_export(writer.path) as f:
+        data = f.read()
+    if fmt == "csv":
+        rows = list(csv.reader(io.StringIO(data.decode())))
+        assert rows[0][:3] == ["timestamp", "seq", "host"]
+        assert len(rows) == 1 + 20 * 4
+        assert float(rows[1][0]) == BASE and rows[1][1] == "1"
+    elif fmt == "jsonl":
+        assert [json.loads(line) for line in data.splitlines()] == batch
+    else:
+        snapshots = list(read_columnar(io.BytesIO(data)))
+        assert [s["seq"] for s in snapshots] == list(range(1, 21))
+        first = snapshots[0]["scripts"]
+        assert [r["script_name"] for r in first] == ["job0.sh", "job1.sh", "job2.sh",
+                                                     "idle.sh"]
+        assert (first[1]["pid"], first[1]["cpu"], first[1]["etime"]) == (101, 1.0, 10)
+        assert first[3]["pid"] is None and first[3]["cpu"] is None
+
+
+def test_rotation_and_pruning(tmp_path):
+    clock = [BASE]
+    writer = RotatingWriter(str(tmp_path), "jsonl", rotate_seconds=60, max_bytes=1 << 40,
+                            max_age=300, clock=lambda: clock[0])
+    paths = []
+    for i in range(8):
+        writer.write(list(_snapshots(1, start=i)))
+        paths.append(writer.path)
+        os.utime(writer.path, (clock[0], clock[0]))
+        clock[0] += 61
+    writer.close()
+    assert len(set(paths)) == 8
+    writer.prune()
+    # Files older than max_age (written at or before clock - 300) are gone.
+    kept = sorted(os.listdir(tmp_path))
+    assert kept == sorted(os.path.basename(p) for p in paths[-4:])
+
+    # The file written last is never pruned; one older file fits in max_bytes.
+    writer.max_bytes = os.path.getsize(paths[-2])
+    writer.prune()
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths[-2:])
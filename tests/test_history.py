@@ -0,0 +1,44 @@
+from scriptscope.history import HistoryStore, RingBuffer
+
+
+def _record(store, timestamp, cpu):
+    store.record(timestamp, [{"script_name": "job.sh", "cpu": cpu, "mem": 1.0}])
+
+
+def test_ring_buffer_range_wraps():
+    ring = RingBuffer(4)
+    for t in range(6):
+        ring.append(float(t), t * 10.0)
+    assert len(ring) == 4
+    assert ring.oldest() == 2.0
+    assert ring.latest() == 50.0
+    assert ring.range(3, 5) == [(3.0, 30.0), (4.0, 40.0)]
+    assert ring.tail(2) == [40.0, 50.0]
+
+
+def test_rollup_buckets(tmp_path):
+    store = HistoryStore(str(tmp_path), resolutions=(10,), max_bytes=1 << 16)
+    for t, cpu in ((100, 1.0), (105, 3.0), (110, 5.0)):
+        _record(store, t, cpu)
+    store.close()
+    reader = HistoryStore(str(tmp_path), resolutions=(10,), readonly=True)
+    assert reader.query("job.sh", "cpu", 0, 200_000, 10_000) == [
+        (100_000, 2.0, 1.0, 3.0), (110_000, 5.0, 5.0, 5.0)]
+    reader.close()
+
+
+def test_restart_within_bucket_merges_rows(tmp_path):
+    store = HistoryStore(str(tmp_path), resolutions=(10,), max_bytes=1 << 16)
+    _record(store, 100, 1.0)
+    _record(store, 102, 3.0)
+    store.close()
+    # Restarted within the same 10 s bucket.
+    store = HistoryStore(str(tmp_path), resolutions=(10,), max_bytes=1 << 16)
+    _record(store, 105, 8.0)
+    _record(store, 111, 0.0)
+    store.close()
+    reader = HistoryStore(str(tmp_path), resolutions=(10,), readonly=True)
+    rows = reader.query("job.sh", "cpu", 0, 200_000, 10_000)
+    reader.close()
+    assert [row[0] for row in rows] == [100_000, 110_000]
+    assert rows[0] == (100_000, 4.0, 1.0, 8.0)
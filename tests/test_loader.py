@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from gui import loader as loader_module  # noqa: E402
+from gui.loader import SnapshotLoader  # noqa: E402
+from scriptscope.publish import SnapshotWriter  # noqa: E402
+from scriptscope.sharedmap import SharedMapWriter  # noqa: E402
+
+
+def _record(name):
+    return {"script_name": name, "pid": "10", "cpu": "1.0", "mem": "0.5", "etime": "00:05",
+            "cmd": f"bash {name}"}
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_stale_map_falls_back_to_stats_json(app, tmp_path, monkeypatch):
+    clock = Clock(990.0)
+    monkeypatch.setattr(loader_module, "time", clock)
+    SnapshotWriter(str(tmp_path / "stats.json")).publish([_record("file.sh")], 999.0)
+    shared = SharedMapWriter(str(tmp_path / "scriptscope.map"))
+    loader = SnapshotLoader(str(tmp_path / "stats.json"), str(tmp_path / "none.sock"),
+                            map_path=str(tmp_path / "scriptscope.map"))
+    try:
+        clock.now = 990.0
+        shared.publish([_record("map.sh")], 1, 990.0)
+        loader.start()
+        assert [r["script_name"] for r in loader.take().records] == ["map.sh"]
+        # Published every 10 seconds.
+        clock.now = 1000.0
+        shared.publish([_record("map.sh")], 2, 1000.0)
+        loader.poll()
+        assert [r["script_name"] for r in loader.take().records] == ["map.sh"]
+        # Two intervals without a snapshot: still the daemon's publishing pace.
+        clock.now = 1020.0
+        loader.poll()
+        assert loader.take() is None
+        # The daemon was killed: the map stops changing and stats.json takes over.
+        clock.now = 1031.0
+        loader.poll()
+        assert [r["script_name"] for r in loader.take().records] == ["file.sh"]
+        assert loader.timer.interval() == loader_module.POLL_INTERVAL_MS
+        # A snapshot in the map again switches back to it.
+        shared.publish([_record("map.sh")], 3, 1032.0)
+        clock.now = 1032.0
+        loader.poll()
+        assert [r["script_name"] for r in loader.take().records] == ["map.sh"]
+        assert loader.timer.interval() == loader_module.MAP_POLL_INTERVAL_MS
+    finally:
+        loader.stop()
+        shared.close()
@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+from scriptscope.config import ScriptConfig
+from scriptscope.matcher import EXACT, SUBSTRING, ScriptMatcher, _trie_pattern
+
+
+def test_trie_pattern_matches_every_word_and_nothing_else():
+    words = ["backup.sh", "back.sh", "bar.py", "cpu_stress.sh"]
+    regex = re.compile(_trie_pattern(words))
+    for word in words:
+        assert regex.fullmatch(word)
+    for other in ("backup", "ba.sh", "bar.pyc", ""):
+        assert not regex.fullmatch(other)
+
+
+def test_substring_finds_overlapping_names():
+    matcher = ScriptMatcher(["job.sh", "big_job.sh", "other.sh"], SUBSTRING)
+    assert matcher.match(["bash", "/srv/big_job.sh"]) == {"big_job.sh", "job.sh"}
+    assert matcher.match(["tail", "-f", "other.sh.log"]) == {"other.sh"}
+    assert matcher.match(["bash", "unrelated.sh"]) == set()
+    assert matcher.match([]) == set()
+
+
+def test_prefix_names_are_all_reported():
+    matcher = ScriptMatcher(["run", "run.sh"], SUBSTRING)
+    assert matcher.match(["./run.sh"]) == {"run", "run.sh"}
+
+
+def test_exact_needs_the_program_or_an_interpreter():
+    matcher = ScriptMatcher(["a.sh", "b.sh", "c.py"], EXACT)
+    assert matcher.match(["/opt/a.sh", "--flag"]) == {"a.sh"}
+    assert matcher.match(["/bin/bash", "./b.sh"]) == {"b.sh"}
+    assert matcher.match(["python3.11", "/srv/c.py"]) == {"c.py"}
+    assert matcher.match(["vim", "b.sh"]) == set()
+    assert matcher.match(["tail", "-f", "a.sh"]) == set()
+    assert matcher.match(["bash", "-c", "a.sh"]) == set()
+
+
+def test_regex_and_argv_rules():
+    scripts = [ScriptConfig("fast.sh", match=re.compile(r"io_stress\.sh --fast")),
+               ScriptConfig("second.sh", argv=2)]
+    matcher = ScriptMatcher(scripts, SUBSTRING)
+    assert matcher.match(["bash", "io_stress.sh", "--fast"]) == {"fast.sh"}
+    assert matcher.match(["bash", "fast.sh"]) == set()
+    assert matcher.match(["env", "x", "/srv/second.sh"]) == {"second.sh"}
+    assert matcher.match(["second.sh"]) == set()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        ScriptMatcher(["a.sh"], "fuzzy")
@@ -0,0 +1,120 @@
+import errno
+import os
+import socket
+import struct
+
+import pytest
+
+from scriptscope import procevents
+from scriptscope.matcher import ScriptMatcher
+from scriptscope.procevents import (
+    PROC_EVENT_EXEC, PROC_EVENT_EXIT, PROC_EVENT_FORK, ProcConnector, ProcessWatcher,
+    RunTracker,
+)
+
+
+class FakeConnector:
+    """
+    ================================================================================
+    Stands in for ProcConnector: hands out one list of events, then stops the
+    watcher.
+    ================================================================================
+    """
+
+    def __init__(self, watcher, events):
+        self.watcher = watcher
+        self.events = events
+        self.read_fd, self.write_fd = os.pipe()
+        os.write(self.write_fd, b"x")
+
+    def fileno(self):
+        return self.read_fd
+
+    def read(self):
+        events, self.events = self.events, []
+        self.watcher._closing = True
+        return events
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+def _watcher(tmp_path, argvs):
+    for pid, argv in argvs.items():
+        (tmp_path / str(pid)).mkdir()
+        (tmp_path / str(pid) / "cmdline").write_bytes("\0".join(argv).encode() + b"\0")
+    watcher = ProcessWatcher(RunTracker(), proc_root=str(tmp_path))
+    watcher.set_matcher(ScriptMatcher(["job.sh"]))
+    wakes = []
+    watcher.on_change = lambda: wakes.append(True)
+    return watcher, wakes
+
+
+def _run(watcher, events):
+    watcher._connector = FakeConnector(watcher, events)
+    watcher._closing = False
+    watcher._run()
+    watcher._connector.close()
+    watcher._connector = None
+
+
+def _fork(parent, child):
+    return (PROC_EVENT_FORK, 0, (parent, parent, child, child))
+
+
+def _exec(pid):
+    return (PROC_EVENT_EXEC, 0, (pid, pid, 0, 0))
+
+
+def _exit(pid, status=0):
+    return (PROC_EVENT_EXIT, 0, (pid, pid, status, 0))
+
+
+def test_script_start_and_exit_wake_the_daemon(tmp_path):
+    watcher, wakes = _watcher(tmp_path, {100: ["bash", "job.sh"]})
+    _run(watcher, [_fork(1, 100), _exec(100)])
+    assert wakes == [True]
+    assert watcher.runs.running("job.sh", 100)
+    _run(watcher, [_exit(100, 1 << 8)])
+    assert wakes == [True, True]
+    [run] = watcher.runs.drain()
+    assert (run["script"], run["pid"], run["exit_code"]) == ("job.sh", 100, 1)
+
+
+def test_child_exec_of_another_program_does_not_wake(tmp_path):
+    watcher, wakes = _watcher(tmp_path, {100: ["bash", "job.sh"], 101: ["sleep", "0.05"]})
+    _run(watcher, [_fork(1, 100), _exec(100)])
+    wakes.clear()
+    # The script forks, the child execs sleep and exits: no run of its own.
+    _run(watcher, [_fork(100, 101), _exec(101), _exit(101)])
+    assert wakes == []
+    assert watcher.runs.running("job.sh", 100)
+    assert watcher.table()[1].get(101) is None
+
+
+def _ack(err):
+    data = struct.pack("<4i", err, 0, 0, 0)
+    event = procevents._EVENT.pack(procevents.PROC_EVENT_NONE, 0, 0) + data
+    cn = procevents._CN_MSG.pack(procevents.CN_IDX_PROC, procevents.CN_VAL_PROC, 0, 0,
+                                 len(event), 0)
+    header = procevents._NLMSGHDR.pack(procevents._NLMSGHDR.size + len(cn) + len(event),
+                                       procevents.NLMSG_DONE, 0, 0, 0)
+    return header + cn + event
+
+
+@pytest.mark.parametrize("err", [0, errno.EPERM])
+def test_subscription_ack(err):
+    connector = ProcConnector.__new__(ProcConnector)
+    connector.sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    peer.send(_ack(err))
+    try:
+        if err:
+            with pytest.raises(OSError) as info:
+                connector._wait_ack(1.0)
+            assert info.value.errno == err
+        else:
+            connector._wait_ack(1.0)
+    finally:
+        connector.sock.close()
+        peer.close()
@@ -0,0 +1,95 @@
+import glob
+import json
+import os
+
+import pytest
+
+from scriptscope import recording
+from scriptscope.export import FORMATS, RotatingWriter
+from scriptscope.recording import Recording, parse_position
+
+BASE = 1_790_000_000.0
+
+
+def _snapshots(count, start=0):
+    for i in range(start, start + count):
+        yield {"seq": i + 1, "timestamp": BASE + 2 * i, "scripts": [
+            {"script_name": f"job{j}.sh", "pid": str(100 + j), "cpu": f"{i % 7 + j:.1f}",
+             "cpu_total": "-", "mem": "1.5", "etime": "00:10", "cmd": f"bash job{j}.sh"}
+            for j in range(3)] + [
+            {"script_name": "idle.sh", "pid": "-", "cpu": "-", "mem": "-", "etime": "-",
+             "cmd": ""}]}
+
+
+def _export(directory, fmt, compress, count=600, start=0):
+    writer = RotatingWriter(str(directory), fmt, compress, rotate_bytes=1 << 40)
+    batch = list(_snapshots(count, start))
+    for i in range(0, len(batch), 50):
+        writer.write(batch[i:i + 50])
+    writer.close()
+    return writer.path
+
+
+@pytest.mark.parametrize("compress", ["none", "gzip", "zstd"])
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_round_trip_and_seek(tmp_path, monkeypatch, fmt, compress):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    monkeypatch.setattr(recording, "INDEX_STEP", 2048)
+    path = _export(tmp_path, fmt, compress)
+    rec = Recording(path)
+    assert (rec.format, rec.first, rec.last) == (fmt, BASE, BASE + 2 * 599)
+    assert len(rec.index["entries"]) > 10
+    snapshots = list(rec.snapshots())
+    assert [s["seq"] for s in snapshots] == list(range(1, 601))
+    expected = list(_snapshots(600))
+    for got, want in zip(snapshots[::97], expected[::97]):
+        assert got["timestamp"] == want["timestamp"]
+        assert [r["script_name"] for r in got["scripts"]] == [
+            r["script_name"] for r in want["scripts"]]
+        assert [float(r["cpu"]) for r in got["scripts"][:3]] == [
+            float(r["cpu"]) for r in want["scripts"][:3]]
+        assert got["scripts"][3]["pid"] in ("-", None)
+
+    window = list(rec.snapshots(BASE + 501, BASE + 521))
+    assert [s["timestamp"] for s in window] == [BASE + 502 + 2 * i for i in range(10)]
+
+
+def test_index_is_reused_then_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "INDEX_STEP", 2048)
+    path = _export(tmp_path, "jsonl", "none", count=100)
+    Recording(path)
+    assert os.path.exists(path + ".idx")
+    # A stale index (the recording grew) is ignored and rebuilt.
+    with open(path, "ab") as f:
+        for snapshot in _snapshots(1, start=100):
+            f.write((json.dumps(snapshot) + "\n").encode())
+    rec = Recording(path)
+    assert rec.last == BASE + 200
+    assert sum(1 for _ in rec.snapshots()) == 101
+    monkeypatch.setattr(Recording, "_build_index", lambda self: pytest.fail("rebuilt"))
+    assert Recording(path).last == BASE + 200
+
+
+def test_single_snapshot_csv_uses_mtime(tmp_path):
+    path = tmp_path / "stats.csv"
+    path.write_text("script_name,pid,cpu,mem,elapsed_time,command\n"
+                    "a.sh,10,5.0,1.0,00:10,bash a.sh\n")
+    os.utime(path, (BASE, BASE))
+    rec = Recording(str(path))
+    [snapshot] = rec.snapshots()
+    assert snapshot["timestamp"] == BASE
+    assert snapshot["scripts"] == [{"script_name": "a.sh", "pid": 10, "cpu": 5.0, "mem": 1.0,
+                                    "etime": "00:10", "cmd": "bash a.sh"}]
+    assert not glob.glob(str(tmp_path / "*.tmp"))
+
+
+def test_parse_position():
+    first = BASE
+    assert parse_position("+30s", first) == first + 30
+    assert parse_position("-1m", first, current=first + 600) == first + 540
+    assert parse_position("10m", first) == first + 600
+    assert parse_position("90", first) == first + 90
+    assert parse_position(str(BASE + 5), first) == BASE + 5
+    with pytest.raises(ValueError):
+        parse_position("yesterday", first)
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from scriptscope.runstats import QuantileSketch
+
+
+def test_empty():
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_quantiles_within_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(0, 1) for _ in range(20000))
+    sketch = QuantileSketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    assert sketch.count == len(values)
+    for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_small_values_count_as_zero():
+    sketch = QuantileSketch()
+    for value in (0.0, 0.0, 0.0, 5.0):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(5.0, rel=0.01)
+
+
+def test_merge_and_serialization():
+    a, b, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(1, 1001):
+        (a if i % 2 else b).add(i / 10)
+        both.add(i / 10)
+    a.merge(b)
+    restored = QuantileSketch.from_dict(a.to_dict())
+    assert restored.count == both.count == 1000
+    for q in (0.5, 0.9, 0.99):
+        assert restored.quantile(q) == both.quantile(q)
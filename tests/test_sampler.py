@@ -0,0 +1,65 @@
+import types
+
+import pytest
+
+from scriptscope import procfs, sampler
+from scriptscope.sampler import Sampler
+
+PID = 4_000_001
+TCK = procfs.CLK_TCK
+
+
+def _write_proc(root, uptime, pid, starttime, ticks, argv=("bash", "job.sh")):
+    (root / "uptime").write_text(f"{uptime:.2f} 0.00\n")
+    (root / "meminfo").write_text("MemTotal:        1000000 kB\n")
+    proc = root / str(pid)
+    proc.mkdir(exist_ok=True)
+    # state ppid pgrp session tty tpgid flags minflt cminflt majflt cmajflt utime stime
+    # cutime cstime priority nice num_threads itrealvalue starttime vsize rss
+    fields = ["S", "1"] + ["0"] * 9 + [str(ticks), "0", "0", "0", "20", "0", "1", "0",
+                                       str(starttime), "0", "256"]
+    (proc / "stat").write_text(f"{pid} (bash) " + " ".join(fields) + "\n")
+    (proc / "status").write_text("Name:\tbash\nVmRSS:\t   10000 kB\n")
+    (proc / "cmdline").write_bytes(b"\0".join(a.encode() for a in argv) + b"\0")
+
+
+def _sampler(root, monkeypatch, clock):
+    monkeypatch.setattr(sampler, "time", types.SimpleNamespace(
+        monotonic=lambda: clock[0], time=lambda: clock[0], perf_counter=lambda: clock[0]))
+    return Sampler(["job.sh"], proc_root=str(root), children=False)
+
+
+def _cpu(s):
+    samples = [sample for sample in s.sample() if sample.pid == PID]
+    assert len(samples) == 1
+    return samples[0].cpu
+
+
+def test_cpu_is_a_delta_between_reads(tmp_path, monkeypatch):
+    clock = [50.0]
+    _write_proc(tmp_path, 1000.0, PID, 900 * TCK, 10 * TCK)
+    s = _sampler(tmp_path, monkeypatch, clock)
+    # First read: lifetime average, 10 s of CPU over 100 s.
+    assert _cpu(s) == pytest.approx(10.0)
+    clock[0] += 2.0
+    _write_proc(tmp_path, 1002.0, PID, 900 * TCK, 11 * TCK)
+    assert _cpu(s) == pytest.approx(50.0)
+
+
+def test_recycled_pid_does_not_reuse_counters(tmp_path, monkeypatch):
+    clock = [50.0]
+    _write_proc(tmp_path, 1000.0, PID, 900 * TCK, 10 * TCK)
+    s = _sampler(tmp_path, monkeypatch, clock)
+    _cpu(s)
+    clock[0] += 2.0
+    # Same pid, new process started 1 s ago: its 0.2 s of CPU is not compared with
+    # the 10 s of the previous one.
+    _write_proc(tmp_path, 1002.0, PID, 1001 * TCK, TCK // 5)
+    assert _cpu(s) == pytest.approx(20.0)
+
+
+def test_script_without_process_is_not_running(tmp_path, monkeypatch):
+    _write_proc(tmp_path, 1000.0, PID, 900 * TCK, 10 * TCK, argv=("vim", "notes.txt"))
+    s = _sampler(tmp_path, monkeypatch, [50.0])
+    records = s.snapshot().records
+    assert [(r["script_name"], r["pid"]) for r in records] == [("job.sh", "-")]
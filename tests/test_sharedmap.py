@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+from scriptscope import sharedmap
+from scriptscope.sharedmap import SharedMapReader, SharedMapWriter
+
+
+def _records(count=2):
+    return [{"script_name": f"job{i}.sh", "pid": str(100 + i), "ppid": "1", "cpu": "12.5",
+             "mem": "1.5", "etime": "01:02", "cmd": f"bash job{i}.sh", "read_bytes": "4096",
+             "write_rate": "-"} for i in range(count)]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "scriptscope.map")
+    writer = SharedMapWriter(path)
+    records = _records()
+    records[0]["children"] = [{"script_name": "job0.sh", "pid": "200", "cpu": "1.0",
+                               "cmd": "sleep 1"}]
+    records.append({"script_name": "idle.sh", "pid": "-", "cpu": "-", "cmd": ""})
+    writer.publish(records, 7, 123.5, own={"script_name": "scriptscope", "pid": "1",
+                                            "cpu": "0.5"})
+    reader = SharedMapReader(path)
+    snapshot = reader.read()
+    assert (snapshot.seq, snapshot.timestamp, len(snapshot)) == (7, 123.5, 5)
+    decoded, own = snapshot.records()
+    assert [r["script_name"] for r in decoded] == ["job0.sh", "job1.sh", "idle.sh"]
+    first = decoded[0]
+    assert (first["pid"], first["ppid"], first["etime"]) == (100, 1, 62)
+    assert first["cpu"] == 12.5 and first["read_bytes"] == 4096
+    assert first["write_rate"] is None
+    assert [c["pid"] for c in first["children"]] == [200]
+    assert decoded[2]["pid"] == "-" and decoded[2]["cpu"] is None
+    assert own["script_name"] == "scriptscope"
+    assert snapshot.column("pid") == [100, 200, 101, -1, 1]
+    # Nothing new since the last read.
+    assert reader.read() is None
+    writer.close()
+
+
+def test_reader_skips_a_snapshot_being_written(tmp_path):
+    path = str(tmp_path / "scriptscope.map")
+    writer = SharedMapWriter(path)
+    writer.publish(_records(), 1, 1.0)
+    reader = SharedMapReader(path)
+    assert reader.read().seq == 1
+    # Writer halfway through the next snapshot: the lock is odd.
+    sharedmap._LOCK.pack_into(writer.map, sharedmap._LOCK_OFFSET, writer.lock | 1)
+    assert reader.read() is None
+    sharedmap._LOCK.pack_into(writer.map, sharedmap._LOCK_OFFSET, writer.lock)
+    writer.publish(_records(), 2, 2.0)
+    assert reader.read().seq == 2
+    writer.close()
+
+
+def test_grows_and_readers_follow(tmp_path):
+    path = str(tmp_path / "scriptscope.map")
+    writer = SharedMapWriter(path, size=4096)
+    writer.publish(_records(1), 1, 1.0)
+    reader = SharedMapReader(path)
+    assert len(reader.read()) == 1
+    writer.publish(_records(200), 2, 2.0)
+    snapshot = reader.read()
+    assert (snapshot.seq, len(snapshot)) == (2, 200)
+    assert math.isclose(snapshot.column("cpu")[-1], 12.5)
+    writer.close()
+    with pytest.raises(OSError):
+        SharedMapReader(path).read()
@@ -0,0 +1,66 @@
+import json
+import select
+import socket
+import time
+
+import pytest
+
+from scriptscope.stream import StreamClient, StreamServer
+
+
+def _snapshot(seq):
+    return {"seq": seq, "timestamp": 100.0 + seq,
+            "scripts": [{"script_name": "job.sh", "pid": "10"},
+                        {"script_name": "other.sh", "pid": "11"}]}
+
+
+def _next(client, timeout=5):
+    while True:
+        ready, _, _ = select.select([client.sock], [], [], timeout)
+        assert ready, "no snapshot received"
+        messages = client.read_available()
+        if messages:
+            return messages[-1]
+
+
+def _wait_subscribers(server, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while server.subscriber_count != count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = StreamServer(str(tmp_path / "scriptscope.sock"))
+    server.start()
+    yield server
+    server.close()
+
+
+def test_filtered_subscription(server):
+    client = StreamClient(server.path).connect()
+    client.subscribe(["job.sh"])
+    _wait_subscribers(server, 1)
+    server.publish(_snapshot(1))
+    message = _next(client)
+    assert message["seq"] == 1
+    assert [r["script_name"] for r in message["scripts"]] == ["job.sh"]
+    client.close()
+
+
+@pytest.mark.parametrize("scripts", [5, "job.sh", [{"name": "job.sh"}], [1, 2]])
+def test_malformed_subscribe_only_drops_that_client(server, scripts):
+    good = StreamClient(server.path).connect()
+    good.subscribe()
+    _wait_subscribers(server, 1)
+    bad = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    bad.connect(server.path)
+    bad.sendall(json.dumps({"op": "subscribe", "scripts": scripts}).encode() + b"\n")
+    bad.settimeout(5)
+    assert bad.recv(4096) == b""
+    bad.close()
+    for seq in (1, 2):
+        server.publish(_snapshot(seq))
+        assert _next(good)["seq"] == seq
+    good.close()